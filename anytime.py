@@ -0,0 +1,95 @@
+"""Anytime mode: the solutions improving the plate height of an instance are streamed as soon as they are found"""
+import time
+from contextlib import ExitStack
+
+from budget import Budget
+import profiling
+from search import tighten
+from utils import Instance, save_solution
+from verify import checked
+
+
+class Stream:
+    """Keeps the lowest valid solution of an instance, writes it, prints its height, its gap from the lower bound and
+    the elapsed time, and calls callback(ins_num, solution, gap, elapsed) when given"""
+
+    def __init__(self, output_dir, instance, rotation, lower_bound, callback=None):
+        self.output_dir = output_dir
+        self.instance = instance
+        self.rotation = rotation
+        self.ins_num = instance.num
+        self.lower_bound = lower_bound
+        self.callback = callback
+        self.start_time = time.time()
+        self.best = None
+
+    def __call__(self, solution):
+        """Streams the solution when it is valid and lower than the best one, returns whether it is"""
+        solution = tighten(solution)
+        height = solution[0][1]
+        if self.best is not None and height >= self.best[0][1]:
+            return False
+        if checked(self.instance, solution, self.rotation) is None:
+            return False
+        self.best = solution
+        elapsed = time.time() - self.start_time
+        gap = (height - self.lower_bound) / height
+        print(f'{self.ins_num}) plate height {height}, gap {gap:.2%}, after {elapsed:.3f}s')
+        save_solution(self.output_dir, self.ins_num, solution)
+        if self.callback is not None:
+            self.callback(self.ins_num, solution, gap, elapsed)
+        return True
+
+
+def open_stream(anytime, output_dir, instance, rotation, lower_bound):
+    """Returns the stream of the instance for the anytime option of a solver: False, True or a function called with
+    each improving solution. None when the anytime mode is disabled"""
+    if not anytime:
+        return None
+    return Stream(output_dir, instance, rotation, lower_bound, anytime if callable(anytime) else None)
+
+
+def returns_unproven(anytime):
+    """Whether a solver returns its best solution even when it is not proven to be optimal, not when the anytime function
+    has proven_only set and only listens to the improving solutions, see the portfolio solver"""
+    return bool(anytime) and not getattr(anytime, "proven_only", False)
+
+
+class Run:
+    """One instance solved by a solver. Inside its with block the time is profiled for the instance, which gets a Budget
+    of at most timeout seconds of the budget of the whole run, its bounds, the heuristic incumbent and the stream of the
+    anytime mode. Where the budget went is printed at the end"""
+
+    def __init__(self, instance, rotation, timeout, budget=None, anytime=False, output_dir=""):
+        self.instance = Instance.of(instance)
+        self.rotation = rotation
+        self.timeout = timeout
+        self.parent = budget
+        self.anytime = anytime
+        self.output_dir = output_dir
+        self.scope = ExitStack()
+        self.budget = None
+        self.lower_bound = None
+        self.incumbent = None
+        self.upper_bound = None
+        self.stream = None
+
+    def __enter__(self):
+        self.scope.enter_context(profiling.instance(self.instance.num))
+        self.budget = Budget(self.timeout, self.parent)
+        self.lower_bound = self.instance.lower_bound(self.rotation)
+        # The heuristic solution is the starting point, only lower plates are searched
+        self.incumbent = self.instance.heuristic(self.rotation)
+        self.upper_bound = self.incumbent[0][1] - 1
+        self.stream = open_stream(self.anytime, self.output_dir, self.instance, self.rotation, self.lower_bound)
+        return self
+
+    def __exit__(self, *exc_info):
+        print(self.budget.report(self.instance.num))
+        return self.scope.__exit__(*exc_info)
+
+    def result(self, solution, optimal):
+        """Returns the solution to report: only a valid solution proven to be optimal, unless in anytime mode"""
+        if solution is None or not (optimal or returns_unproven(self.anytime)):
+            return None
+        return checked(self.instance, solution, self.rotation)
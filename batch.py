@@ -0,0 +1,35 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import profiling
+from utils import write_solution
+
+
+def solve_copy(solver, instance):
+    """Solves a single instance with a copy of the solver, the solution file is written by the solver itself.
+    Returns the solutions and the profiling records of the instance, which stay in the worker process otherwise"""
+    solver = copy.copy(solver)
+    solver.data = [instance]
+    recorded = len(profiling.profiler.records)
+    return solver.solve(), profiling.profiler.records[recorded:]
+
+
+def solve_batch(solver, workers):
+    """Solves all the instances of the solver spreading them over a pool of worker processes.
+    Returns the solutions in the same order of the instances, as solver.solve() would do"""
+    results = [[] for _ in solver.data]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(solve_copy, solver, instance): i for i, instance in enumerate(solver.data)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i], records = future.result()
+                profiling.profiler.records.extend(records)
+            except Exception as e:
+                # The instance is reported as unsolved, as a solver does when it finds no solution
+                num = solver.data[i][0]
+                print(f'{num}) failed:', e)
+                write_solution(solver.output_dir, num, None, 0)
+                results[i] = [(num, None, 0)]
+            print(f'Completed {sum(1 for f in futures if f.done())}/{len(futures)} instances')
+    return [solution for result in results for solution in result]
@@ -0,0 +1,317 @@
+"""Benchmark suite: runs a matrix of solvers, rotation flags and search strategies over a set of instances and records
+the results in a CSV file, which is then used to print comparison tables and plots.
+
+    python benchmark.py run -s sat,smt -r both -sc linear,binary -n 1-10 -t 60 --run baseline
+    python benchmark.py table --run baseline
+    python benchmark.py compare baseline optimized
+    python benchmark.py plot --run baseline
+
+Each instance is solved in its own process, so that the peak memory of a run is not affected by the previous ones and
+a run exceeding the timeout can be killed.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import time
+from collections import defaultdict
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from decomposition.src.solve import DecompositionSolver
+from generator import load_known
+from lns.src.solve import LNSsolver
+from portfolio.src.solve import PortfolioSolver, kill
+from sat.src.symmetry import RULES, parse_rules
+from search import STRATEGIES, OPTIMIZE
+from solvers import SOLVERS, build_solver
+from utils import Instance, load_data
+from verify import violations
+
+RESULTS_FILE = "./benchmark/results.csv"
+FIELDS = ["run", "solver", "rotation", "strategy", "instance", "status", "height", "lower_bound", "gap", "wall_time",
+          "encode_time", "solve_time", "peak_rss_mb"]
+# Solvers whose search strategy can be selected, the others are run once
+STRATEGY_SOLVERS = ["sat", "smt", "smtlib"]
+# Solvers which can minimize the plate height with the optimize strategy
+OPTIMIZE_SOLVERS = ["smt", "smtlib"]
+# Time given to a run after its timeout before being killed
+GRACE_TIME = 30
+
+
+def make_solver(name, data, rotation, output_dir, timeout, strategy, symmetry=tuple(RULES)):
+    if name == "portfolio":
+        return PortfolioSolver(data=data, rotation=rotation, output_dir=output_dir, timeout=timeout)
+    if name == "decomposition":
+        return DecompositionSolver(data=data, rotation=rotation, output_dir=output_dir, timeout=timeout)
+    if name == "lns":
+        return LNSsolver(data=data, rotation=rotation, output_dir=output_dir, timeout=timeout)
+    return build_solver(name, data, rotation, output_dir, timeout, strategy=strategy or "linear", symmetry=symmetry)
+
+
+def run_instance(name, instance, rotation, strategy, timeout, results, symmetry=tuple(RULES)):
+    """Solves one instance and sends back its solution, the time spent encoding and solving it if the solver has these
+    phases and the peak memory of the process"""
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+    with tempfile.TemporaryDirectory() as output_dir:
+        try:
+            solver = make_solver(name, [instance], rotation, output_dir, timeout, strategy, symmetry)
+            start_time = time.time()
+            solutions = solver.solve()
+            wall_time = time.time() - start_time
+            solution = solutions[0][1] if solutions else None
+            if solution is None:
+                status = "unknown"
+            else:
+                # The heuristic, the decomposition and the lns do not prove their solutions to be optimal
+                status = "feasible" if name in ("heuristic", "decomposition", "lns") else "optimal"
+        except Exception as e:
+            print(f'{instance.num}) {name} failed:', e)
+            solver, solution, status, wall_time = None, None, "error", 0
+
+    # Spans of the budget of the instance, empty for the solvers without an encode and a solve phase, e.g. the lns
+    budget = getattr(solver, "instance_budget", None)
+    spent = budget.spent if budget is not None else {}
+    encode_time, solve_time = spent.get("encode"), spent.get("solve")
+    # ru_maxrss is in kilobytes on Linux, the children are the external solvers which have been waited for, e.g. the z3
+    # and minizinc processes, and count with the biggest one
+    peak_rss = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) / 1024
+    results.put((status, solution, wall_time, encode_time, solve_time, peak_rss))
+
+
+def run_config(name, instance, rotation, strategy, timeout, symmetry=tuple(RULES)):
+    """Runs one solver configuration on one instance in a child process, returns the row of the results"""
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_instance,
+                                      args=(name, instance, rotation, strategy, timeout, results, symmetry))
+    start_time = time.time()
+    process.start()
+    try:
+        status, solution, wall_time, encode_time, solve_time, peak_rss = results.get(timeout=timeout + GRACE_TIME)
+    except queue.Empty:
+        status, solution, wall_time, encode_time, solve_time, peak_rss = \
+            "killed", None, time.time() - start_time, None, None, None
+    kill(process)
+
+    if solution is not None and violations(instance, solution, rotation):
+        status = "invalid"
+    lower_bound = instance.lower_bound(rotation)
+    height = solution[0][1] if solution is not None else None
+    return {
+        "solver": name,
+        "rotation": int(rotation),
+        "strategy": strategy,
+        "instance": instance.num,
+        "status": status,
+        "height": height,
+        "lower_bound": lower_bound,
+        "gap": round((height - lower_bound) / height, 4) if height else None,
+        "wall_time": round(wall_time, 3),
+        "encode_time": None if encode_time is None else round(encode_time, 3),
+        "solve_time": None if solve_time is None else round(solve_time, 3),
+        "peak_rss_mb": None if peak_rss is None else round(peak_rss, 1),
+    }
+
+
+def configurations(solvers, rotations, strategies):
+    for name in solvers:
+        for rotation in rotations:
+            for strategy in (strategies if name in STRATEGY_SOLVERS else [""]):
+                if strategy != OPTIMIZE or name in OPTIMIZE_SOLVERS:
+                    yield name, rotation, strategy
+
+
+def run_benchmark(run, instances, solvers, rotations, strategies, timeout, results_file=RESULTS_FILE, known=None,
+                  symmetry=tuple(RULES)):
+    """Runs every configuration on every instance, appending a row to the results file as soon as a run ends. known are
+    the optimal heights of some instances by instance number, e.g. of the generated ones: a solution lower than the
+    optimal height, or claimed to be optimal and higher, gets the status wrong. A solution which is not a valid packing
+    gets the status invalid. symmetry are the symmetry breaking rules of the sat solver"""
+    known = known or {}
+    os.makedirs(os.path.dirname(results_file) or ".", exist_ok=True)
+    new_file = not os.path.exists(results_file)
+    with open(results_file, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+        for name, rotation, strategy in configurations(solvers, rotations, strategies):
+            for instance in instances:
+                row = run_config(name, instance, rotation, strategy, timeout, symmetry)
+                row["run"] = run
+                optimal = known.get(str(instance.num))
+                if optimal is not None and row["height"] is not None and row["status"] != "invalid" and \
+                        (row["height"] < optimal or row["status"] == "optimal" and row["height"] != optimal):
+                    row["status"] = "wrong"
+                writer.writerow(row)
+                f.flush()
+                print(f'{run} {config_name(row)} ins-{row["instance"]}: {row["status"]} height {row["height"]} '
+                      f'in {row["wall_time"]}s')
+
+
+def load_results(results_file=RESULTS_FILE, run=None):
+    """Returns the rows of the results file, only the ones of the given run if any. Numbers are converted back"""
+    with open(results_file, newline="") as f:
+        rows = [row for row in csv.DictReader(f) if run is None or row["run"] == run]
+    for row in rows:
+        for field in ["height", "lower_bound", "rotation"]:
+            row[field] = int(row[field]) if row[field] else None
+        for field in ["gap", "wall_time", "encode_time", "solve_time", "peak_rss_mb"]:
+            row[field] = float(row[field]) if row[field] else None
+    return rows
+
+
+def config_name(row):
+    name = row["solver"] + ("-rot" if row["rotation"] else "")
+    return f'{name}-{row["strategy"]}' if row["strategy"] else name
+
+
+def summary_table(rows):
+    """Returns the lines of a table with, for each run and configuration, the instances solved, not counting the invalid
+    and wrong solutions, the total and mean time of the solved ones, the mean gap of their heights from the lower bound
+    and the maximum peak memory"""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[(row["run"], config_name(row))].append(row)
+
+    lines = [f'{"run":<16}{"config":<24}{"solved":>10}{"total s":>10}{"mean s":>10}{"gap":>8}{"rss MB":>10}']
+    for (run, config), group in sorted(groups.items()):
+        solved = [r for r in group if r["height"] is not None and r["status"] not in ("invalid", "wrong")]
+        times = [r["wall_time"] for r in solved]
+        gaps = [r["gap"] for r in solved]
+        rss = [r["peak_rss_mb"] for r in group if r["peak_rss_mb"] is not None]
+        lines.append(f'{run:<16}{config:<24}{f"{len(solved)}/{len(group)}":>10}{sum(times):>10.2f}'
+                     f'{np.mean(times) if times else 0:>10.2f}{np.mean(gaps) if gaps else 0:>8.3f}'
+                     f'{max(rss) if rss else 0:>10.1f}')
+    return lines
+
+
+def compare_table(rows, base, new):
+    """Returns the lines of a table comparing the wall times of two runs on the same configurations and instances,
+    marking the unsolved instances with * and the regressions, i.e. instances solved by the base run but not by the new
+    one or with a higher plate"""
+    by_key = defaultdict(dict)
+    for row in rows:
+        by_key[(config_name(row), row["instance"])][row["run"]] = row
+
+    lines = [f'{"config":<24}{"instance":>10}{base:>16}{new:>16}{"speedup":>10}']
+    for (config, instance), runs in sorted(by_key.items(), key=lambda item: (item[0][0], int(item[0][1]))):
+        if base not in runs or new not in runs:
+            continue
+        old_row, new_row = runs[base], runs[new]
+        old_height, new_height = old_row["height"], new_row["height"]
+        if old_height is not None and (new_height is None or new_height > old_height):
+            change = "REGRESSION"
+        elif old_height is not None:
+            change = f'{old_row["wall_time"] / max(new_row["wall_time"], 1e-3):.2f}x'
+        else:
+            change = "-"
+        lines.append(f'{config:<24}{instance:>10}'
+                     f'{old_row["wall_time"]:>15.2f}{"*" if old_height is None else " "}'
+                     f'{new_row["wall_time"]:>15.2f}{"*" if new_height is None else " "}{change:>10}')
+    return lines
+
+
+def plot_results(rows, output_file=None):
+    """Bar plot of the solving times of each configuration for each instance, the unsolved instances are left empty"""
+    configs = sorted({config_name(row) for row in rows})
+    instances = sorted({int(row["instance"]) for row in rows})
+    times = np.zeros((len(configs), len(instances)))
+    for row in rows:
+        if row["height"] is not None:
+            times[configs.index(config_name(row)), instances.index(int(row["instance"]))] = row["wall_time"]
+
+    x_axis = np.arange(len(instances))
+    width = 0.8 / len(configs)
+    plt.figure(figsize=(12, 6))
+    for i, config in enumerate(configs):
+        plt.bar(x=x_axis - 0.4 + width * (i + 0.5), height=times[i], width=width, label=config)
+    plt.xlabel('Instance')
+    plt.ylabel('Time (s)')
+    plt.yscale("log")
+    plt.xticks(x_axis, instances)
+    plt.legend()
+    if output_file is not None:
+        plt.savefig(output_file)
+    plt.show()
+
+
+def parse_instances(text):
+    """Parses a list of instance numbers as 1,3,5-10, None selects all the instances"""
+    if text is None:
+        return None
+    numbers = set()
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        numbers.update(range(int(first), int(last or first) + 1))
+    return numbers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", help="CSV file of the results", default=RESULTS_FILE, type=str)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmark and append its results")
+    run_parser.add_argument("--run", help="Name of the run, e.g. the commit being measured", required=True, type=str)
+    run_parser.add_argument("-s", "--solvers", help="Comma separated solvers", default="sat", type=str)
+    run_parser.add_argument("-r", "--rotation", help="Rotation flags to run between no, yes and both", default="no",
+                            choices=["no", "yes", "both"], type=str)
+    run_parser.add_argument("-sc", "--search", help="Comma separated search strategies for sat, smt and smtlib, "
+                            "optimize only runs smt and smtlib",
+                            default="linear", type=str)
+    run_parser.add_argument("-i", "--input_dir", help="Directory where the instance txt files can be found",
+                            default="./input", type=str)
+    run_parser.add_argument("-n", "--instances", help="Instances to run as 1,3,5-10, default all", default=None,
+                            type=str)
+    run_parser.add_argument("-t", "--timeout", help="Timeout in seconds of each run", default=300, type=int)
+    run_parser.add_argument("-sy", "--symmetry", help="Comma separated symmetry breaking rules of sat, or none",
+                            default=",".join(RULES), type=str)
+
+    table_parser = commands.add_parser("table", help="Print a summary of the results")
+    table_parser.add_argument("--run", help="Only the given run", default=None, type=str)
+
+    compare_parser = commands.add_parser("compare", help="Compare the times of two runs instance by instance")
+    compare_parser.add_argument("base", type=str)
+    compare_parser.add_argument("new", type=str)
+
+    plot_parser = commands.add_parser("plot", help="Plot the solving times of a run")
+    plot_parser.add_argument("--run", help="Only the given run", default=None, type=str)
+    plot_parser.add_argument("-o", "--output", help="File where the plot is saved", default=None, type=str)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        solvers = args.solvers.split(",")
+        for name in solvers:
+            if name not in SOLVERS + ["portfolio", "decomposition", "lns"]:
+                parser.error(f"Unknown solver {name}")
+        strategies = args.search.split(",")
+        for strategy in strategies:
+            if strategy not in STRATEGIES and strategy != OPTIMIZE:
+                parser.error(f"Unknown search strategy {strategy}")
+        try:
+            symmetry = parse_rules(args.symmetry)
+        except ValueError as e:
+            parser.error(str(e))
+        rotations = {"no": [False], "yes": [True], "both": [False, True]}[args.rotation]
+        numbers = parse_instances(args.instances)
+        instances = [Instance.of(d) for d in load_data(0, args.input_dir)
+                     if numbers is None or int(d[0]) in numbers]
+        run_benchmark(args.run, instances, solvers, rotations, strategies, args.timeout, args.results,
+                      load_known(args.input_dir), symmetry)
+        print("\n".join(summary_table(load_results(args.results, args.run))))
+    elif args.command == "table":
+        print("\n".join(summary_table(load_results(args.results, args.run))))
+    elif args.command == "compare":
+        rows = load_results(args.results, args.base) + load_results(args.results, args.new)
+        print("\n".join(compare_table(rows, args.base, args.new)))
+    elif args.command == "plot":
+        plot_results(load_results(args.results, args.run), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Lower bounds of the plate height shared by all the solvers.
+
+Each bound receives the plate width, the list of circuits (w, h) and whether the circuits can be rotated. When rotation
+is allowed every circuit is counted in the orientation giving the weakest bound, so that the bound holds whatever
+orientation the solver chooses.
+"""
+
+
+def orientations(max_width, circuit, rotation):
+    """Returns the shapes (w, h) in which the circuit fits in the width of the plate"""
+    w, h = circuit
+    shapes = [(w, h), (h, w)] if rotation and w != h else [(w, h)]
+    return [(cw, ch) for cw, ch in shapes if cw <= max_width]
+
+
+def dff_sum(max_width, circuits, rotation, f):
+    """Returns the sum of the heights times the widths transformed by the dual feasible function f"""
+    return sum(min(ch * f(cw) for cw, ch in orientations(max_width, c, rotation)) for c in circuits)
+
+
+def area_bound(max_width, circuits, rotation=False):
+    """The area of the plate must be at least the total area of the circuits"""
+    return -(-sum(w * h for w, h in circuits) // max_width)
+
+
+def tallest_bound(max_width, circuits, rotation=False):
+    """The plate must be at least as high as every circuit"""
+    return max(min(ch for _, ch in orientations(max_width, c, rotation)) for c in circuits)
+
+
+def wide_bound(max_width, circuits, rotation=False):
+    """Circuits wider than half of the plate cannot be side by side, so they must be stacked"""
+    return sum(min((ch if 2 * cw > max_width else 0) for cw, ch in orientations(max_width, c, rotation))
+               for c in circuits)
+
+
+def dff_bound(max_width, circuits, rotation=False):
+    """Area bounds after transforming the widths with the dual feasible functions f0 (Carlier et al.) and u (Fekete
+    and Schepers), which never map widths fitting side by side to widths exceeding the plate"""
+    bound = 0
+    for threshold in range(1, max_width // 2 + 1):
+        def f0(x):
+            if x > max_width - threshold:
+                return max_width
+            return x if x >= threshold else 0
+
+        bound = max(bound, -(-dff_sum(max_width, circuits, rotation, f0) // max_width))
+
+    for k in range(1, 11):
+        # u(x) = x when (k + 1) x / W is integer, floor((k + 1) x / W) W / k otherwise, scaled by k to stay integer
+        def u(x):
+            if (k + 1) * x % max_width == 0:
+                return k * x
+            return (k + 1) * x // max_width * max_width
+
+        bound = max(bound, -(-dff_sum(max_width, circuits, rotation, u) // (max_width * k)))
+    return bound
+
+
+BOUNDS = [area_bound, tallest_bound, wide_bound, dff_bound]
+
+
+def lower_bound(max_width, circuits, rotation=False):
+    """Returns the strongest of the lower bounds of the plate height"""
+    return max(bound(max_width, circuits, rotation) for bound in BOUNDS)
@@ -0,0 +1,55 @@
+"""Time budget of the solvers: a wall clock deadline shared by all the solver calls of an instance"""
+import math
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import profiling
+
+
+class Budget:
+    """Deadline of at most timeout seconds, never after the one of the parent budget, e.g. of the whole run. It is an
+    absolute time so that a budget can be sent to the worker processes of a batch"""
+
+    def __init__(self, timeout=None, parent=None):
+        self.start_time = time.time()
+        self.deadline = math.inf if timeout is None else self.start_time + timeout
+        if parent is not None:
+            self.deadline = min(self.deadline, parent.deadline)
+        # Seconds spent in each span
+        self.spent = defaultdict(float)
+
+    def remaining(self):
+        """Seconds left before the deadline"""
+        return max(self.deadline - time.time(), 0)
+
+    def milliseconds(self):
+        """Milliseconds left before the deadline, e.g. for the timeout of z3 where 0 means no timeout"""
+        return int(self.remaining() * 1000)
+
+    def expired(self):
+        return self.milliseconds() < 1
+
+    def check(self):
+        """Raises TimeoutError when the deadline has passed, e.g. to stop a long encoding"""
+        if self.expired():
+            raise TimeoutError("The time budget is over.")
+
+    @contextmanager
+    def span(self, name):
+        """Records the time spent in a phase of the instance"""
+        start_time = time.perf_counter()
+        try:
+            with profiling.span(name):
+                yield
+        finally:
+            self.spent[name] += time.perf_counter() - start_time
+
+    def report(self, ins_num):
+        """Returns the line reporting where the budget of the instance was spent"""
+        elapsed = time.time() - self.start_time
+        spent = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in
+                          sorted(self.spent.items(), key=lambda item: -item[1]))
+        other = elapsed - sum(self.spent.values())
+        left = "" if math.isinf(self.deadline) else f", left {self.remaining():.3f}s"
+        return f'{ins_num}) budget spent {elapsed:.3f}s: {spent + ", " if spent else ""}other {other:.3f}s{left}'
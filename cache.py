@@ -0,0 +1,131 @@
+"""On disk cache of the optimal solutions, shared by all the solvers.
+
+An instance is identified by a fingerprint of its canonical form: the plate width, the rotation flag and the sorted
+multiset of the circuits, so that the same circuits listed in another order share the entry. With rotation a circuit
+and its rotation are the same shape. Each entry is a json file, the least recently used ones are evicted when the
+cache grows beyond its size.
+Entries of instances with the same width and a subset or a superset of the circuits also give bounds: removing
+circuits from a packing keeps it feasible, so the optimum of a superset is an upper bound and the one of a subset is a
+lower bound.
+Each entry records the solver and the encoding which proved it optimal.
+"""
+import hashlib
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from glob import glob
+
+from search import tighten
+from utils import Instance
+
+
+def shape(w, h, rotation):
+    return (min(w, h), max(w, h)) if rotation else (w, h)
+
+
+def canonical(instance, rotation):
+    """Returns the sorted shapes of the circuits of the instance"""
+    return sorted(shape(w, h, rotation) for w, h in instance.circuits)
+
+
+def fingerprint(instance, rotation):
+    key = json.dumps([instance.width, bool(rotation), canonical(instance, rotation)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def place(instance, rotation, circuits_pos):
+    """Assigns the placements of a cached solution to the circuits of the instance, in their order. Placements of
+    circuits missing from the instance are dropped"""
+    placements = defaultdict(list)
+    for w, h, x, y in circuits_pos:
+        placements[shape(w, h, rotation)].append((w, h, x, y))
+    return [placements[shape(w, h, rotation)].pop() for w, h in instance.circuits]
+
+
+class SolutionCache:
+
+    def __init__(self, cache_dir="./cache", max_entries=1000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_file(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, instance, rotation):
+        """Returns the cached optimal solution of the instance, None if it is not cached"""
+        instance = Instance.of(instance)
+        filename = self.entry_file(fingerprint(instance, rotation))
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as f:
+            entry = json.load(f)
+        # The access time of an entry is its modification time, used by the eviction
+        os.utime(filename)
+        return (instance.width, entry["height"]), place(instance, rotation, entry["solution"])
+
+    def put(self, instance, rotation, solution, solver, encoding=""):
+        """Stores the optimal solution of the instance proved by the solver with the given encoding"""
+        instance = Instance.of(instance)
+        (_, plate_height), circuits_pos = solution
+        entry = {
+            "width": instance.width,
+            "rotation": bool(rotation),
+            "circuits": canonical(instance, rotation),
+            "height": plate_height,
+            "solution": [list(c) for c in circuits_pos],
+            "solver": solver,
+            "encoding": encoding,
+        }
+        with open(self.entry_file(fingerprint(instance, rotation)), "w") as f:
+            json.dump(entry, f)
+        self.evict()
+
+    def evict(self):
+        entries = sorted(glob(os.path.join(self.cache_dir, "*.json")), key=os.path.getmtime)
+        for filename in entries[:max(0, len(entries) - self.max_entries)]:
+            os.remove(filename)
+
+    def index(self, rotation):
+        """Returns the cached entries with the given rotation flag grouped by plate width, each as (circuits, height,
+        solution) with the circuits counted by shape. Every entry file is read once"""
+        entries = defaultdict(list)
+        for filename in glob(os.path.join(self.cache_dir, "*.json")):
+            with open(filename) as f:
+                entry = json.load(f)
+            if entry["rotation"] == bool(rotation):
+                circuits = Counter(tuple(c) for c in entry["circuits"])
+                entries[entry["width"]].append((circuits, entry["height"], entry["solution"]))
+        return entries
+
+    def seed(self, instance, rotation, entries=None):
+        """Tightens the bounds of the instance with the cached instances having the same width and a subset or a
+        superset of its circuits, taken from the entries returned by index when given"""
+        instance = Instance.of(instance)
+        if entries is None:
+            entries = self.index(rotation)
+        circuits = Counter(canonical(instance, rotation))
+        for cached, height, circuits_pos in entries.get(instance.width, []):
+            if not cached - circuits:
+                instance.seed(rotation, lower_bound=height)
+            if not circuits - cached:
+                incumbent = tighten(((instance.width, height), place(instance, rotation, circuits_pos)))
+                instance.seed(rotation, incumbent=incumbent)
+
+    def split(self, data, rotation):
+        """Returns the solutions of the cached instances, as returned by the solvers, and the instances to solve, whose
+        bounds are seeded by the cache"""
+        solutions = []
+        remaining = []
+        entries = self.index(rotation)
+        for instance in data:
+            start_time = time.time()
+            instance = Instance.of(instance)
+            solution = self.get(instance, rotation)
+            if solution is not None:
+                solutions.append((instance.num, solution, time.time() - start_time))
+            else:
+                self.seed(instance, rotation, entries)
+                remaining.append(instance)
+        return solutions, remaining
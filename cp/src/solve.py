@@ -1,19 +1,27 @@
+import asyncio
 import datetime
+import time
 
-from minizinc import Model, Solver, Status, Instance
+from minizinc import Model, Solver, Status
+from minizinc import Instance as MiniZincInstance
 
+from anytime import Run
 from utils import write_solution
 
 
 class CPsolver:
 
-    def __init__(self, data, rotation, output_dir, timeout):
+    def __init__(self, data, rotation, output_dir, timeout, threads=10, anytime=False, budget=None):
         self.data = data
         self.rotation = rotation
         if output_dir == "":
             output_dir = "./cp/out/rot" if rotation else "./cp/out/no_rot"
         self.output_dir = output_dir
         self.timeout = timeout
+        self.threads = threads
+        self.anytime = anytime
+        self.budget = budget
+        self.instance_budget = None
         if rotation:
             self.solver_path = "./cp/src/models/model_with_rotations.mzn"
         else:
@@ -26,34 +34,68 @@ class CPsolver:
         solutions = []
 
         for d in self.data:
-            try:
-                ins_num, plate_width, circuits = d
-                instance = Instance(solver, model)
-                instance["N"] = len(circuits)
-                instance["W"] = plate_width
-                instance["w"] = [x for (x, _) in circuits]
-                instance["h"] = [y for (_, y) in circuits]
-
-                result = instance.solve(timeout=datetime.timedelta(seconds=self.timeout), processes=10, random_seed=42,
-                                        free_search=True)
-
-                if result.status is Status.OPTIMAL_SOLUTION:
-                    if self.rotation:
-                        circuits_pos = [(w, h, x, y) if not r else (h, w, x, y) for (w, h), x, y, r in
-                                        zip(circuits, result["x"], result["y"], result["rotation"])]
-                    else:
-                        circuits_pos = [(w, h, x, y) for (w, h), x, y in
-                                        zip(circuits, result["x"], result["y"])]
-                    plate_height = result.objective
+            with Run(d, self.rotation, self.timeout, self.budget, self.anytime, self.output_dir) as run:
+                budget = self.instance_budget = run.budget
+                try:
+                    d = run.instance
+                    ins_num, plate_width, circuits = d
+                    with budget.span("encode"):
+                        instance = MiniZincInstance(solver, model)
+                        instance["N"] = len(circuits)
+                        instance["W"] = plate_width
+                        instance["w"] = d.w.tolist()
+                        instance["h"] = d.h.tolist()
+                        instance["lb"] = run.lower_bound
+                        instance["ub"] = run.incumbent[0][1]
 
-                    write_solution(self.output_dir, ins_num, ((plate_width, plate_height), circuits_pos),
-                                   result.statistics['time'].total_seconds())
+                    if budget.expired():
+                        raise TimeoutError()
+                    # Only the time left by the encoding
+                    options = dict(timeout=datetime.timedelta(seconds=budget.remaining()), processes=self.threads,
+                                   random_seed=42, free_search=True)
+                    stream = run.stream
+                    solution = None
+                    if stream is None:
+                        with budget.span("solve"):
+                            result = instance.solve(**options)
+                        if result.status is Status.OPTIMAL_SOLUTION:
+                            solution = run.result(self.placement(result, circuits, plate_width), True)
+                            spent_time = result.statistics['time'].total_seconds()
+                    else:
+                        # The heuristic solution is streamed first, then every one improving it
+                        stream(run.incumbent)
+                        start_time = time.time()
+                        with budget.span("solve"):
+                            status = asyncio.run(self.stream_solutions(instance, circuits, plate_width, stream,
+                                                                       options))
+                        solution = run.result(stream.best, status is Status.OPTIMAL_SOLUTION)
+                        spent_time = time.time() - start_time
 
-                    solutions.append((ins_num, ((plate_width, plate_height), circuits_pos),
-                                      result.statistics['time'].total_seconds()))
-            except:
-                # If no solution is found in timeout seconds,
-                # do nothing and pass to the next instance.
-                pass
+                    if solution is not None:
+                        write_solution(self.output_dir, ins_num, solution, spent_time)
+                        solutions.append((ins_num, solution, spent_time))
+                except:
+                    # If no solution is found in timeout seconds,
+                    # do nothing and pass to the next instance.
+                    pass
 
         return solutions
+
+    def placement(self, result, circuits, plate_width):
+        """Returns the solution ((plate_width, plate_height), circuits_pos) of a MiniZinc result"""
+        if self.rotation:
+            circuits_pos = [(w, h, x, y) if not r else (h, w, x, y) for (w, h), x, y, r in
+                            zip(circuits, result["x"], result["y"], result["rotation"])]
+        else:
+            circuits_pos = [(w, h, x, y) for (w, h), x, y in zip(circuits, result["x"], result["y"])]
+        return (plate_width, result.objective), circuits_pos
+
+    async def stream_solutions(self, instance, circuits, plate_width, stream, options):
+        """Solves the instance streaming every intermediate solution, the last result only carries the final status,
+        which is returned"""
+        status = None
+        async for result in instance.solutions(intermediate_solutions=True, **options):
+            if result.solution is not None:
+                stream(self.placement(result, circuits, plate_width))
+            status = result.status
+        return status
@@ -0,0 +1,209 @@
+"""Decomposition solver for the instances too large for the monolithic models.
+
+The circuits are partitioned into strips of about the same area, each one as wide as the plate, taking them by
+decreasing height so that each strip packs circuits of similar heights. Every strip is a small instance solved by a
+backend in its own process, in parallel, and the strips are stacked one above the other. A bounded repair pass then
+merges adjacent strips two by two and solves each merged pair, starting from the stacked pair: the pair is kept merged
+only when its backend finds a lower packing. The stacked strips replace the heuristic packing of the whole instance when
+they are lower, the result is not proven to be optimal.
+"""
+import multiprocessing
+import os
+import queue
+import tempfile
+import time
+
+import numpy as np
+
+from anytime import Run
+from portfolio.src.solve import kill
+from search import tighten
+from solvers import build_solver
+from utils import Instance, write_solution
+from verify import checked
+
+# Share of the timeout given to the strips, the rest goes to the repair pass
+STRIPS_SHARE = 0.5
+# Rounds of the repair pass, the first one merges the strips (0, 1), (2, 3), ..., the second one (1, 2), (3, 4), ...
+REPAIR_ROUNDS = 2
+# Seconds a backend can run over its timeout before it is killed
+GRACE = 5
+
+
+def run_strip(backend, key, instance, rotation, output_dir, timeout, threads, options, budget, results):
+    """Solves a strip with the backend and sends back (key, solution), the best solution found within the timeout and
+    the budget. options are further arguments of build_solver, e.g. the lp engine"""
+    if hasattr(os, "setpgrp"):
+        # Own process group, so that the external processes started by the backend are killed together with it
+        os.setpgrp()
+    try:
+        # The descending search improves the packing of the strip even when it cannot prove the optimum in time
+        solutions = build_solver(backend, [instance], rotation, output_dir, timeout, strategy="descending",
+                                 threads=threads, anytime=True, budget=budget, **options).solve()
+        results.put((key, solutions[0][1] if solutions else None))
+    except Exception as e:
+        print(f'{instance.num}) {backend} failed:', e)
+        results.put((key, None))
+
+
+def stack(width, solutions):
+    """Returns the solution stacking the solutions of the strips from the bottom, with the circuits in their order"""
+    circuits_pos = []
+    y = 0
+    for solution in solutions:
+        (_, height), strip_pos = tighten(solution)
+        circuits_pos.extend((w, h, x, strip_y + y) for w, h, x, strip_y in strip_pos)
+        y += height
+    return (width, y), circuits_pos
+
+
+class DecompositionSolver:
+
+    def __init__(self, data, rotation, output_dir, timeout, backend="sat", strip_size=30, workers=None, threads=None,
+                 anytime=False, backend_options=None, budget=None):
+        self.data = data
+        self.rotation = rotation
+        if output_dir == "":
+            output_dir = "./decomposition/out/rot" if rotation else "./decomposition/out/no_rot"
+        self.output_dir = output_dir
+        self.timeout = timeout
+        self.backend = backend
+        # Further arguments of build_solver for the backend, e.g. {"lp_engine": "cpsat"}
+        self.backend_options = backend_options or {}
+        # Number of circuits of each strip
+        self.strip_size = strip_size
+        # Number of strips solved in parallel
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.anytime = anytime
+        self.budget = budget
+        self.instance_budget = None
+        self.best = None
+
+    def solve(self):
+        solutions = []
+        for d in self.data:
+            with Run(d, self.rotation, self.timeout, self.budget, self.anytime, self.output_dir) as run:
+                self.instance_budget = run.budget
+                solutions.append(self.solve_instance(run))
+        return solutions
+
+    def solve_instance(self, run):
+        start_time = time.time()
+        instance, lower_bound, stream = run.instance, run.lower_bound, run.stream
+        # The stacked strips are kept only when they are lower than the heuristic packing of the whole instance
+        self.best = tighten(run.incumbent)
+        if stream is not None:
+            stream(self.best)
+
+        strips = self.partition(instance)
+        seconds = self.instance_budget.remaining()
+        if len(strips) > 1:
+            seconds = min(seconds, self.timeout * STRIPS_SHARE)
+        with self.instance_budget.span("strips"):
+            solutions = self.solve_strips([self.strip(instance, indices, k) for k, indices in enumerate(strips)],
+                                          seconds)
+        self.keep(instance, strips, solutions, stream)
+
+        with self.instance_budget.span("repair"):
+            for repair_round in range(REPAIR_ROUNDS):
+                remaining = self.instance_budget.remaining()
+                if remaining < 1 or stack(instance.width, solutions)[0][1] <= lower_bound:
+                    break
+                if self.repair(instance, strips, solutions, repair_round, remaining / (REPAIR_ROUNDS - repair_round)):
+                    self.keep(instance, strips, solutions, stream)
+
+        solution = checked(instance, self.best, self.rotation)
+        spent_time = time.time() - start_time
+        write_solution(self.output_dir, instance.num, solution, spent_time)
+        return instance.num, solution, spent_time
+
+    def keep(self, instance, strips, solutions, stream):
+        """Keeps the stacked strips, with the circuits back in the order of the instance, when they are the lowest
+        packing found"""
+        (plate_width, plate_height), stacked_pos = stack(instance.width, solutions)
+        if plate_height >= self.best[0][1]:
+            return
+        circuits_pos = [None] * instance.n
+        for i, pos in zip((i for indices in strips for i in indices), stacked_pos):
+            circuits_pos[i] = pos
+        self.best = (plate_width, plate_height), circuits_pos
+        if stream is not None:
+            stream(self.best)
+
+    def partition(self, instance):
+        """Returns the indices of the circuits of each strip, from the bottom"""
+        count = -(-instance.n // self.strip_size)
+        heights = np.minimum(instance.w, instance.h) if self.rotation else instance.h
+        area = instance.areas.sum() / count
+        strips, used = [[]], 0
+        for i in np.argsort(-heights, kind="stable").tolist():
+            if used >= area * len(strips) and len(strips) < count:
+                strips.append([])
+            strips[-1].append(i)
+            used += int(instance.areas[i])
+        return strips
+
+    def strip(self, instance, indices, key):
+        return Instance(f"{instance.num}.{key}", instance.width, instance.w[indices], instance.h[indices])
+
+    def solve_strips(self, strips, seconds):
+        """Solves the strips with the backend, at most workers at a time, within the given seconds overall. Returns
+        their solutions, the heuristic one of the strips whose backend fails or does not answer in time"""
+        waves = -(-len(strips) // self.workers)
+        timeout = max(int(seconds / waves), 1)
+        results = multiprocessing.Queue()
+        found = {}
+        pending = list(enumerate(strips))
+        running = {}
+        # The solutions are sent back by the backends, their own output files are thrown away
+        with tempfile.TemporaryDirectory() as strips_dir:
+            while pending or running:
+                # The strips left when the budget of the instance is over keep their heuristic packing
+                while pending and len(running) < self.workers and not self.instance_budget.expired():
+                    key, strip = pending.pop(0)
+                    process = multiprocessing.Process(target=run_strip,
+                                                      args=(self.backend, key, strip, self.rotation, strips_dir,
+                                                            timeout, self.threads, self.backend_options,
+                                                            self.instance_budget, results))
+                    process.start()
+                    running[key] = process, time.time()
+                if not running:
+                    break
+                oldest = min(running, key=lambda k: running[k][1])
+                wait = min(running[oldest][1] + timeout + GRACE - time.time(), self.instance_budget.remaining())
+                try:
+                    key, solution = results.get(timeout=max(wait, 0))
+                except queue.Empty:
+                    # The oldest backend overran its timeout, or the budget of the instance is over
+                    key, solution = oldest, None
+                if key in running:
+                    kill(running.pop(key)[0])
+                    found[key] = solution
+        return [found.get(k) or strip.heuristic(self.rotation) for k, strip in enumerate(strips)]
+
+    def repair(self, instance, strips, solutions, repair_round, seconds):
+        """Merges the pairs of adjacent strips of the round whose merged packing is lower than the stacked one, updates
+        strips and solutions in place. Returns whether any pair was merged"""
+        pairs = []
+        for k in range(repair_round % 2, len(strips) - 1, 2):
+            if len(strips[k]) + len(strips[k + 1]) > 2 * self.strip_size:
+                continue
+            merged = self.strip(instance, strips[k] + strips[k + 1], f"{k}-{k + 1}")
+            incumbent = stack(instance.width, solutions[k:k + 2])
+            if incumbent[0][1] > merged.lower_bound(self.rotation):
+                # The backend starts from the stacked pair, its solution is never higher
+                merged.seed(self.rotation, incumbent=incumbent)
+                pairs.append((k, merged))
+        if not pairs:
+            return False
+
+        improved = False
+        merged_solutions = self.solve_strips([merged for _, merged in pairs], seconds)
+        # From the top, so that the indices of the pairs below stay valid
+        for (k, _), solution in reversed(list(zip(pairs, merged_solutions))):
+            if tighten(solution)[0][1] < stack(instance.width, solutions[k:k + 2])[0][1]:
+                strips[k:k + 2] = [strips[k] + strips[k + 1]]
+                solutions[k:k + 2] = [solution]
+                improved = True
+        return improved
@@ -0,0 +1,165 @@
+"""Instance generator for the scaling benchmarks: writes ins-N.txt files in the format read by utils.load_instance.
+
+    python generator.py guillotine -n 20,40,80 -W 20,40 -a 0.5,1,2 -c 3 -o ./generated
+    python generator.py random -n 100 -W 30 --max_width 0.5 -a 4 -o ./generated
+    python generator.py duplicates -n 60 -W 20 --shapes 4 -o ./generated
+    python benchmark.py run --run scaling -i ./generated -s sat,lp -t 60
+
+Three families of instances are generated:
+- guillotine: a plate of width W and height W * aspect is cut in two, at a random position of its longer side, until
+  there are n circuits. The circuits fill the plate exactly, so its height is the known optimal height, with and
+  without rotation;
+- random: the widths of the circuits are uniform up to a fraction of the plate width and their aspect ratio is log
+  uniform up to a maximum, so the area of the circuits is controlled by both;
+- duplicates: n circuits drawn among a few random shapes, the high duplicate sets where symmetry breaking matters.
+
+The instances are numbered after the ones already in the output directory, so that the sweeps can be accumulated, and
+each one is described by a row of known.csv with its family, seed and optimal height when it is known.
+"""
+import argparse
+import csv
+import math
+import os
+import random
+from glob import glob
+
+from utils import instance_number
+
+KNOWN_FILE = "known.csv"
+KNOWN_FIELDS = ["instance", "family", "width", "circuits", "optimal", "seed"]
+
+
+def guillotine(width, height, n, rng):
+    """Returns n circuits filling exactly a plate width x height, cut by random guillotine cuts"""
+    if n > width * height:
+        raise ValueError(f"A plate {width}x{height} cannot be cut in {n} circuits.")
+    pieces = [(width, height)]
+    while len(pieces) < n:
+        # The largest piece which can still be cut
+        k = max((k for k, (w, h) in enumerate(pieces) if max(w, h) > 1), key=lambda k: pieces[k][0] * pieces[k][1])
+        w, h = pieces.pop(k)
+        if w >= h:
+            cut = rng.randint(1, w - 1)
+            pieces += [(cut, h), (w - cut, h)]
+        else:
+            cut = rng.randint(1, h - 1)
+            pieces += [(w, cut), (w, h - cut)]
+    rng.shuffle(pieces)
+    return pieces
+
+
+def random_circuits(width, n, rng, max_width=0.5, max_aspect=2.0):
+    """Returns n random circuits whose widths are at most max_width times the plate width and whose ratios h / w are
+    log uniform between 1 / max_aspect and max_aspect"""
+    largest = max(int(width * max_width), 1)
+    circuits = []
+    for _ in range(n):
+        w = rng.randint(1, largest)
+        aspect = math.exp(rng.uniform(-math.log(max_aspect), math.log(max_aspect)))
+        circuits.append((w, max(int(round(w * aspect)), 1)))
+    return circuits
+
+
+def duplicate_circuits(width, n, rng, shapes=4, max_width=0.5, max_aspect=2.0):
+    """Returns n circuits drawn among a few random shapes"""
+    kinds = random_circuits(width, shapes, rng, max_width, max_aspect)
+    return [rng.choice(kinds) for _ in range(n)]
+
+
+def write_instance(filename, width, circuits):
+    """Writes an instance file: the width, the number of circuits and then a line w h for each circuit"""
+    with open(filename, 'w') as f:
+        f.write(f"{width}\n{len(circuits)}\n")
+        for w, h in circuits:
+            f.write(f"{w} {h}\n")
+
+
+def load_known(input_dir):
+    """Returns the known optimal heights of the instances of a directory by instance number, empty without known.csv"""
+    filename = os.path.join(input_dir, KNOWN_FILE)
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, newline="") as f:
+        return {row["instance"]: int(row["optimal"]) for row in csv.DictReader(f) if row["optimal"]}
+
+
+def generate(family, output_dir, sizes, widths, aspects, count, seed, max_width=0.5, shapes=4):
+    """Writes count instances of the family for each number of circuits, plate width and aspect ratio, the aspect of
+    the plate for guillotine and the maximum one of the circuits for the others. Returns the written files"""
+    if family == "guillotine":
+        for n in sizes:
+            for width in widths:
+                for aspect in aspects:
+                    if n > width * max(int(round(width * aspect)), 1):
+                        raise ValueError(f"A plate of width {width} and aspect {aspect} cannot be cut in {n} circuits.")
+    os.makedirs(output_dir, exist_ok=True)
+    numbers = [instance_number(f) for f in glob(os.path.join(output_dir, "*"))]
+    num = max((n for n in numbers if n is not None), default=0)
+    known_file = os.path.join(output_dir, KNOWN_FILE)
+    new_file = not os.path.exists(known_file)
+    written = []
+    with open(known_file, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=KNOWN_FIELDS)
+        if new_file:
+            writer.writeheader()
+        for n in sizes:
+            for width in widths:
+                for aspect in aspects:
+                    for _ in range(count):
+                        num += 1
+                        # Each instance has its own seed, so that it can be generated again alone
+                        instance_seed = seed * 1000003 + num
+                        rng = random.Random(instance_seed)
+                        optimal = None
+                        if family == "guillotine":
+                            optimal = max(int(round(width * aspect)), 1)
+                            circuits = guillotine(width, optimal, n, rng)
+                        elif family == "random":
+                            circuits = random_circuits(width, n, rng, max_width, aspect)
+                        else:
+                            circuits = duplicate_circuits(width, n, rng, shapes, max_width, aspect)
+                        filename = os.path.join(output_dir, f"ins-{num}.txt")
+                        write_instance(filename, width, circuits)
+                        writer.writerow({"instance": num, "family": family, "width": width, "circuits": n,
+                                         "optimal": optimal, "seed": instance_seed})
+                        written.append(filename)
+    return written
+
+
+def numbers(text, kind=int):
+    return [kind(part) for part in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("family", help="Family of the instances", choices=["guillotine", "random", "duplicates"],
+                        type=str)
+    parser.add_argument("-n", "--circuits", help="Comma separated numbers of circuits", default="20,40,80", type=str)
+    parser.add_argument("-W", "--width", help="Comma separated plate widths", default="20", type=str)
+    parser.add_argument("-a", "--aspect",
+                        help="Comma separated aspect ratios: height / width of the plate for guillotine, maximum ratio "
+                             "between the sides of the circuits for the others, default = 1 for guillotine and 2 for "
+                             "the others", default=None, type=str)
+    parser.add_argument("-c", "--count", help="Number of instances of each configuration", default=1, type=int)
+    parser.add_argument("-mw", "--max_width", help="Maximum width of the random circuits as a fraction of the plate",
+                        default=0.5, type=float)
+    parser.add_argument("--shapes", help="Number of distinct shapes of the duplicates family", default=4, type=int)
+    parser.add_argument("--seed", help="Seed of the generator", default=0, type=int)
+    parser.add_argument("-o", "--output_dir", help="Directory where the instances are written", default="./generated",
+                        type=str)
+    args = parser.parse_args()
+
+    if args.aspect is None:
+        aspects = [1.0] if args.family == "guillotine" else [2.0]
+    else:
+        aspects = numbers(args.aspect, float)
+    try:
+        written = generate(args.family, args.output_dir, numbers(args.circuits), numbers(args.width), aspects,
+                           args.count, args.seed, args.max_width, args.shapes)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Written {len(written)} instances in {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Orderings tried by the heuristic, each one is a sorting key over the shape (w, h) of a circuit, largest first
+ORDERINGS = [
+    lambda w, h: (h, w),
+    lambda w, h: (w, h),
+    lambda w, h: (w * h, h),
+    lambda w, h: (max(w, h), min(w, h)),
+    lambda w, h: (w + h, h),
+]
+
+# Placement rules, each one is a key over (x, y, w, h) of a candidate position, the minimum is chosen
+RULES = [
+    # Lowest top edge
+    lambda x, y, w, h: (y + h, y, x),
+    # Bottom left
+    lambda x, y, w, h: (y, x),
+]
+
+
+def skyline_pack(max_width, circuits, order, rule, rotation=False):
+    """Places the circuits one at a time, following the given order, at the position of the skyline minimizing the
+    placement rule. The skyline is the list of segments [x, width, y] of the upper profile of the circuits already placed.
+    Returns the solution ((max_width, plate_height), circuits_pos)"""
+    skyline = [[0, max_width, 0]]
+    circuits_pos = [None] * len(circuits)
+
+    for i in order:
+        w, h = circuits[i]
+        shapes = [(w, h), (h, w)] if rotation and w != h else [(w, h)]
+        best = None
+        for cw, ch in shapes:
+            for s in range(len(skyline)):
+                x = skyline[s][0]
+                if x + cw > max_width:
+                    break
+                # The circuit lies on the highest segment below it
+                y, covered, e = 0, 0, s
+                while covered < cw:
+                    y = max(y, skyline[e][2])
+                    covered += skyline[e][1]
+                    e += 1
+                key = rule(x, y, cw, ch)
+                if best is None or key < best[0]:
+                    best = (key, x, y, cw, ch)
+        if best is None:
+            # The circuit is wider than the plate in every orientation
+            return None
+        _, x, y, cw, ch = best
+        circuits_pos[i] = (cw, ch, x, y)
+        skyline = raise_skyline(skyline, x, cw, y + ch)
+
+    plate_height = max(y + ch for _, ch, _, y in circuits_pos)
+    return (max_width, plate_height), circuits_pos
+
+
+def raise_skyline(skyline, x, w, top):
+    """Returns the skyline after placing a circuit of width w at x whose top edge is at height top"""
+    updated = []
+    for sx, sw, sy in skyline:
+        # Keep the parts of the segment on the left and on the right of the new circuit
+        if sx < x:
+            updated.append([sx, min(sw, x - sx), sy])
+        if sx + sw > x + w:
+            start = max(sx, x + w)
+            updated.append([start, sx + sw - start, sy])
+    updated.append([x, w, top])
+    updated.sort()
+
+    merged = [updated[0]]
+    for segment in updated[1:]:
+        if segment[2] == merged[-1][2]:
+            merged[-1][1] += segment[1]
+        else:
+            merged.append(segment)
+    return merged
+
+
+def pack(max_width, circuits, rotation=False):
+    """Runs the skyline heuristic with every ordering and placement rule and returns the lowest solution found.
+    When rotation is allowed the packings without rotations are tried as well, since they are sometimes lower"""
+    best = None
+    for rotate in ([False, True] if rotation else [False]):
+        for ordering in ORDERINGS:
+            if rotate:
+                order = sorted(range(len(circuits)), key=lambda i: ordering(max(circuits[i]), min(circuits[i])),
+                               reverse=True)
+            else:
+                order = sorted(range(len(circuits)), key=lambda i: ordering(*circuits[i]), reverse=True)
+            for rule in RULES:
+                solution = skyline_pack(max_width, circuits, order, rule, rotate)
+                if solution is not None and (best is None or solution[0][1] < best[0][1]):
+                    best = solution
+    return best
@@ -0,0 +1,28 @@
+import time
+
+import profiling
+from utils import Instance, write_solution
+from verify import checked
+
+
+class HeuristicSolver:
+
+    def __init__(self, data, rotation, output_dir, timeout):
+        self.data = data
+        self.rotation = rotation
+        if output_dir == "":
+            output_dir = "./heuristic/out/rot" if rotation else "./heuristic/out/no_rot"
+        self.output_dir = output_dir
+        self.timeout = timeout
+
+    def solve(self):
+        solutions = []
+        for d in self.data:
+            d = Instance.of(d)
+            with profiling.instance(d.num):
+                start_time = time.time()
+                solution = checked(d, d.heuristic(self.rotation), self.rotation)
+                spent_time = time.time() - start_time
+                write_solution(self.output_dir, d.num, solution, spent_time)
+            solutions.append((d.num, solution, spent_time))
+        return solutions
@@ -0,0 +1,168 @@
+"""Large neighbourhood search on top of the exact models.
+
+Starting from a packing found by any solver, a neighbourhood of the circuits is freed while the others stay fixed where
+they are, and the freed circuits are packed again by the CP-SAT model of lp/src/cpsat.py within a short timeout. A
+neighbourhood is either a band of circuits below the top of the plate or a window of circuits around a random one, and
+it always includes the circuits touching the top, the only ones which can lower the plate height. The model minimizes
+the plate height and then pushes the freed circuits down, so that a packing of the same height but lower circuits is
+also accepted and opens room for the next neighbourhoods.
+
+Several neighbourhoods of the best packing are solved at the same time, one per worker process, and the best one is
+kept. The size of the neighbourhoods adapts: it grows when a neighbourhood is solved to optimality without improving and
+shrinks when it hits the timeout. Every improving packing is streamed, which reports the plate height over time.
+"""
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ortools.sat.python import cp_model
+
+from anytime import Run, Stream
+from lp.src.cpsat import PlateModel, make_solver
+import profiling
+from search import tighten
+from solvers import build_solver
+from utils import write_solution
+from verify import checked
+
+# Share of the timeout given to the solver of the starting packing
+START_SHARE = 0.2
+
+
+def reoptimise(width, w, h, rotation, solution, free, lower_bound, timeout, seed):
+    """Packs again the free circuits of the solution, the other ones fixed. Returns whether the neighbourhood was solved
+    to optimality and the best packing found, None if none"""
+    (_, plate_height), circuits_pos = solution
+    plate = PlateModel(width, w, h, lower_bound, plate_height, rotation, symmetry_breaking=False)
+    free = set(free)
+    for i, position in enumerate(circuits_pos):
+        if i not in free:
+            plate.fix(i, position)
+    plate.hint(solution)
+    # The plate height first, then the freed circuits as low as possible
+    plate.model.Minimize(plate.plate_height * (len(w) * plate_height + 1) + sum(plate.y[i] for i in free))
+    solver = make_solver(timeout, 1)
+    solver.parameters.random_seed = seed
+    status = solver.Solve(plate.model)
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return status == cp_model.OPTIMAL, plate.solution(solver)
+    return False, None
+
+
+def score(solution):
+    """Lower is better: the plate height, then the sum of the positions of the circuits along y"""
+    (_, plate_height), circuits_pos = solution
+    return plate_height, sum(y for _, _, _, y in circuits_pos)
+
+
+class LNSsolver:
+
+    def __init__(self, data, rotation, output_dir, timeout, start="heuristic", window=10, step=2, workers=None,
+                 threads=None, anytime=False, start_options=None, budget=None):
+        self.data = data
+        self.rotation = rotation
+        if output_dir == "":
+            output_dir = "./lns/out/rot" if rotation else "./lns/out/no_rot"
+        self.output_dir = output_dir
+        self.timeout = timeout
+        # Solver of the starting packing and its further build_solver arguments, e.g. {"lp_engine": "cpsat"}
+        self.start = start
+        self.start_options = start_options or {}
+        # Initial number of circuits of a neighbourhood and timeout in seconds of each one
+        self.window = window
+        self.step = step
+        # Number of neighbourhoods solved at the same time
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.anytime = anytime
+        self.budget = budget
+        self.instance_budget = None
+
+    def solve(self):
+        solutions = []
+        for d in self.data:
+            # The improving packings are always streamed, not only in anytime mode
+            with Run(d, self.rotation, self.timeout, self.budget) as run:
+                self.instance_budget = run.budget
+                solutions.append(self.solve_instance(run))
+        return solutions
+
+    def solve_instance(self, run):
+        start_time = time.time()
+        instance, lower_bound = run.instance, run.lower_bound
+        # The stream prints the height of every improving packing and the time it took
+        stream = Stream(self.output_dir, instance, self.rotation, lower_bound,
+                        self.anytime if callable(self.anytime) else None)
+        with self.instance_budget.span("start"):
+            best = tighten(self.starting_packing(instance))
+        stream(best)
+
+        w, h = instance.w.tolist(), instance.h.tolist()
+        window = min(self.window, instance.n)
+        rng = random.Random(0)
+        with self.instance_budget.span("lns"), ProcessPoolExecutor(max_workers=self.workers) as executor:
+            while best[0][1] > lower_bound:
+                remaining = self.instance_budget.remaining()
+                if remaining < 1:
+                    break
+                neighbourhoods = [self.neighbourhood(best, window, rng) for _ in range(self.workers)]
+                futures = [executor.submit(reoptimise, instance.width, w, h, self.rotation, best, free, lower_bound,
+                                           min(self.step, remaining), rng.randrange(1 << 30))
+                           for free in neighbourhoods]
+                profiling.count("neighbourhoods", len(futures))
+                results = [future.result() for future in futures]
+                found = [solution for _, solution in results if solution is not None]
+                candidate = min(found, key=score, default=None)
+                if candidate is not None and score(candidate) < score(best):
+                    best = candidate
+                    stream(best)
+                elif all(optimal for optimal, _ in results):
+                    # The neighbourhoods are too small to improve
+                    window = min(window + 1, instance.n)
+                else:
+                    window = max(window - 1, 2)
+
+        solution = checked(instance, best, self.rotation)
+        spent_time = time.time() - start_time
+        write_solution(self.output_dir, instance.num, solution, spent_time)
+        return instance.num, solution, spent_time
+
+    def starting_packing(self, instance):
+        """Returns the packing found by the start solver within its share of the timeout, the heuristic one when it
+        does not find any"""
+        if self.start != "heuristic":
+            # The start solver writes its own files elsewhere, only its best packing is kept
+            with tempfile.TemporaryDirectory() as start_dir:
+                try:
+                    solutions = build_solver(self.start, [instance], self.rotation, start_dir,
+                                             max(int(self.timeout * START_SHARE), 1), strategy="descending",
+                                             threads=self.threads, anytime=True, budget=self.instance_budget,
+                                             **self.start_options).solve()
+                    if solutions and solutions[0][1] is not None:
+                        return solutions[0][1]
+                except Exception as e:
+                    print(f'{instance.num}) {self.start} failed:', e)
+        return instance.heuristic(self.rotation)
+
+    def neighbourhood(self, solution, window, rng):
+        """Returns the indices of the circuits freed in a neighbourhood of about window circuits of the solution"""
+        (_, plate_height), circuits_pos = solution
+        top = [i for i, (_, h, _, y) in enumerate(circuits_pos) if y + h == plate_height]
+        if rng.random() < 0.5:
+            # A band: the circuits ending highest
+            size = rng.randint(max(window // 2, 1), window)
+            others = sorted(range(len(circuits_pos)), key=lambda i: -(circuits_pos[i][1] + circuits_pos[i][3]))
+        else:
+            # A window: the circuits closest to a random one
+            size = window
+            _, _, cx, cy = circuits_pos[rng.randrange(len(circuits_pos))]
+            others = sorted(range(len(circuits_pos)),
+                            key=lambda i: abs(circuits_pos[i][2] - cx) + abs(circuits_pos[i][3] - cy))
+        free = set(top)
+        for i in others:
+            if len(free) >= max(size, len(top)):
+                break
+            free.add(i)
+        return sorted(free)
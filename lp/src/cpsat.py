@@ -0,0 +1,133 @@
+"""CP-SAT model of the plate, the alternative engine of the LP solvers.
+
+Instead of the big-M disjunctions of the MIP, each circuit is a pair of interval variables, one along the width and one
+along the height of the plate, which are kept apart by a single NoOverlap2D constraint. Two cumulative constraints are
+redundant but strengthen the propagation: the circuits crossing any vertical line fit in the plate height, the ones
+crossing any horizontal line fit in the plate width.
+"""
+from ortools.sat.python import cp_model
+
+from presolve import identical_groups
+
+ENGINES = ["bop", "cpsat"]
+
+
+class PlateModel:
+
+    def __init__(self, width, w, h, lower_bound, upper_bound, rotation=False, symmetry_breaking=True):
+        self.model = cp_model.CpModel()
+        self.width = width
+        self.w = list(w)
+        n = len(w)
+
+        self.plate_height = self.model.NewIntVar(lower_bound, upper_bound, "h")
+        self.x, self.y, self.widths, self.heights, self.rotated = [], [], [], [], []
+        x_intervals, y_intervals = [], []
+        for i in range(n):
+            # A circuit is rotated only when it is not a square and it fits the plate width once rotated
+            if rotation and w[i] != h[i] and h[i] <= width:
+                r = self.model.NewBoolVar(f"rot_{i}")
+                width_i = self.model.NewIntVar(min(w[i], h[i]), max(w[i], h[i]), f"widths_{i}")
+                height_i = self.model.NewIntVar(min(w[i], h[i]), max(w[i], h[i]), f"heights_{i}")
+                self.model.Add(width_i == w[i] + (h[i] - w[i]) * r)
+                self.model.Add(height_i == h[i] + (w[i] - h[i]) * r)
+                min_width, min_height = min(w[i], h[i]), min(w[i], h[i])
+            else:
+                r, width_i, height_i = 0, w[i], h[i]
+                min_width, min_height = w[i], h[i]
+            x_i = self.model.NewIntVar(0, width - min_width, f"x_{i}")
+            y_i = self.model.NewIntVar(0, upper_bound - min_height, f"y_{i}")
+            x_end = self.model.NewIntVar(min_width, width, f"x_end_{i}")
+            y_end = self.model.NewIntVar(min_height, upper_bound, f"y_end_{i}")
+            x_intervals.append(self.model.NewIntervalVar(x_i, width_i, x_end, f"x_interval_{i}"))
+            y_intervals.append(self.model.NewIntervalVar(y_i, height_i, y_end, f"y_interval_{i}"))
+            self.model.Add(y_end <= self.plate_height)
+            self.x.append(x_i)
+            self.y.append(y_i)
+            self.widths.append(width_i)
+            self.heights.append(height_i)
+            self.rotated.append(r)
+
+        self.model.AddNoOverlap2D(x_intervals, y_intervals)
+        self.model.AddCumulative(x_intervals, self.heights, self.plate_height)
+        self.model.AddCumulative(y_intervals, self.widths, width)
+
+        # Without symmetry breaking any packing is a solution, e.g. when some circuits are fixed where they are
+        if symmetry_breaking:
+            # The circuits with the same shape are ordered by their position
+            for group in identical_groups(w, h):
+                for i, j in zip(group, group[1:]):
+                    self.model.Add(self.x[i] <= self.x[j])
+            # The biggest circuit is placed in the bottom left quarter of the plate
+            biggest = max(range(n), key=lambda i: w[i] * h[i])
+            self.model.Add(2 * self.x[biggest] <= width - self.widths[biggest])
+            self.model.Add(2 * self.y[biggest] <= self.plate_height - self.heights[biggest])
+
+        self.model.Minimize(self.plate_height)
+
+    def hint(self, solution):
+        """Warm starts the search from a solution ((plate_width, plate_height), circuits_pos) whose circuits are in the
+        order of the model"""
+        (_, plate_height), circuits_pos = solution
+        self.model.AddHint(self.plate_height, plate_height)
+        for i, (w, _, x, y) in enumerate(circuits_pos):
+            self.model.AddHint(self.x[i], x)
+            self.model.AddHint(self.y[i], y)
+            if not isinstance(self.rotated[i], int):
+                self.model.AddHint(self.rotated[i], int(w != self.w[i]))
+
+    def fix(self, i, position):
+        """Fixes the circuit i at its position (w, h, x, y) in a solution"""
+        w, _, x, y = position
+        self.model.Add(self.x[i] == x)
+        self.model.Add(self.y[i] == y)
+        if not isinstance(self.rotated[i], int):
+            self.model.Add(self.rotated[i] == int(w != self.w[i]))
+
+    def solution(self, values):
+        """Returns the solution read from values, the solver or the solution callback"""
+        circuits_pos = [(values.Value(w), values.Value(h), values.Value(x), values.Value(y))
+                        for w, h, x, y in zip(self.widths, self.heights, self.x, self.y)]
+        return (self.width, values.Value(self.plate_height)), circuits_pos
+
+    def num_variables(self):
+        return len(self.model.Proto().variables)
+
+    def num_constraints(self):
+        return len(self.model.Proto().constraints)
+
+
+class SolutionStreamer(cp_model.CpSolverSolutionCallback):
+    """Passes every solution found by CP-SAT to the anytime stream"""
+
+    def __init__(self, plate, stream):
+        super().__init__()
+        self.plate = plate
+        self.stream = stream
+
+    def on_solution_callback(self):
+        self.stream(self.plate.solution(self))
+
+
+def make_solver(timeout, threads, parameters=None):
+    """Returns a CP-SAT solver using threads workers. parameters are further search parameters given as a comma separated
+    list of name=value, e.g. "linearization_level=2,search_branching=FIXED_SEARCH" """
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = timeout
+    solver.parameters.num_workers = threads
+    for item in (parameters or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = (part.strip() for part in item.partition("="))
+        if not hasattr(solver.parameters, name):
+            raise ValueError(f"Unknown CP-SAT parameter {name}.")
+        current = getattr(solver.parameters, name)
+        if isinstance(current, bool):
+            value = value.lower() in ("1", "true")
+        elif isinstance(current, (int, float, str)):
+            value = type(current)(value)
+        else:
+            # Enumerations are given by the name of their value
+            value = getattr(type(current), value)
+        setattr(solver.parameters, name, value)
+    return solver
@@ -0,0 +1,89 @@
+"""Big-M MIP model of the plate solved by the BOP engine of the LP solvers.
+
+Each pair of circuits is kept apart by the disjunction of four placements, one circuit left of, right of, below or above
+the other, activated by binaries. The model is kept as small and as tight as the geometry allows:
+- the big-M constant of each disjunct is the largest violation allowed by the domains of the variables it involves, the
+  plate width along x and the upper bound of the height along y, instead of a constant;
+- the disjuncts which are geometrically impossible, e.g. two circuits side by side wider than the plate (the stacked
+  pairs of presolve.py), are dropped.
+  A pair with two disjuncts left uses a single binary, a pair with one has its constraint posted unconditionally;
+- the biggest circuit is fixed in the bottom left quarter of the plate, any packing can be mirrored to get there.
+"""
+from presolve import stacked_pairs
+
+
+class PlateMIP:
+
+    def __init__(self, solver, width, w, h, lower_bound, upper_bound, rotation=False):
+        self.solver = solver
+        self.width = width
+        n = len(w)
+
+        self.plate_height = solver.IntVar(lb=lower_bound, ub=upper_bound, name='h')
+        self.x, self.y, self.widths, self.heights = [], [], [], []
+        # Smallest sizes of the circuits along x and y, the same when a circuit can be rotated
+        min_w, min_h = list(w), list(h)
+        for i in range(n):
+            if rotation and w[i] != h[i] and h[i] <= width:
+                # The domains must allow both the orientations of the circuit
+                r = solver.IntVar(lb=0, ub=1, name=f'rot_{i}')
+                width_i = solver.IntVar(lb=min(w[i], h[i]), ub=max(w[i], h[i]), name=f'widths_{i}')
+                height_i = solver.IntVar(lb=min(w[i], h[i]), ub=max(w[i], h[i]), name=f'heights_{i}')
+                solver.Add(width_i == w[i] + (h[i] - w[i]) * r)
+                solver.Add(height_i == h[i] + (w[i] - h[i]) * r)
+                min_w[i] = min_h[i] = min(w[i], h[i])
+            else:
+                width_i, height_i = w[i], h[i]
+            x_i = solver.IntVar(lb=0, ub=width - min_w[i], name=f'x_{i}')
+            y_i = solver.IntVar(lb=0, ub=upper_bound - min_h[i], name=f'y_{i}')
+            if rotation:
+                solver.Add(x_i + width_i <= width)
+            solver.Add(self.plate_height >= y_i + height_i)
+            self.x.append(x_i)
+            self.y.append(y_i)
+            self.widths.append(width_i)
+            self.heights.append(height_i)
+
+        stacked = set(stacked_pairs(width, w, h, rotation))
+        for i in range(n):
+            for j in range(i + 1, n):
+                # Each disjunct is (lhs, rhs, M) for lhs <= rhs, M bounds lhs - rhs over the domains
+                disjuncts = []
+                if (i, j) not in stacked:
+                    disjuncts.append((self.x[i] + self.widths[i], self.x[j], width))
+                    disjuncts.append((self.x[j] + self.widths[j], self.x[i], width))
+                if min_h[i] + min_h[j] <= upper_bound:
+                    disjuncts.append((self.y[i] + self.heights[i], self.y[j], upper_bound))
+                    disjuncts.append((self.y[j] + self.heights[j], self.y[i], upper_bound))
+                self.separate(i, j, disjuncts)
+
+        # Symmetry breaking: the biggest circuit is placed in the bottom left quarter of the plate
+        biggest = max(range(n), key=lambda i: w[i] * h[i])
+        solver.Add(2 * self.x[biggest] <= width - self.widths[biggest])
+        solver.Add(2 * self.y[biggest] <= self.plate_height - self.heights[biggest])
+
+        solver.Minimize(self.plate_height)
+
+    def separate(self, i, j, disjuncts):
+        """Posts the disjunction keeping the circuits i and j apart"""
+        if len(disjuncts) == 1:
+            lhs, rhs, _ = disjuncts[0]
+            self.solver.Add(lhs <= rhs)
+        elif len(disjuncts) == 2:
+            d = self.solver.IntVar(lb=0, ub=1, name=f'd_{i}_{j}')
+            (lhs_0, rhs_0, m_0), (lhs_1, rhs_1, m_1) = disjuncts
+            self.solver.Add(lhs_0 <= rhs_0 + m_0 * (1 - d))
+            self.solver.Add(lhs_1 <= rhs_1 + m_1 * d)
+        else:
+            d = [self.solver.IntVar(lb=0, ub=1, name=f'd_{i}_{j}_{k}') for k in range(len(disjuncts))]
+            self.solver.Add(sum(d) >= 1)
+            for d_k, (lhs, rhs, m) in zip(d, disjuncts):
+                self.solver.Add(lhs <= rhs + m * (1 - d_k))
+
+    def solution(self):
+        """Returns the solution ((plate_width, plate_height), circuits_pos) of the solved model"""
+        def value(v):
+            return v if isinstance(v, int) else int(round(v.solution_value()))
+        circuits_pos = [(value(w), value(h), value(x), value(y))
+                        for w, h, x, y in zip(self.widths, self.heights, self.x, self.y)]
+        return (self.width, value(self.plate_height)), circuits_pos
@@ -1,74 +1,122 @@
 from ortools.linear_solver import pywraplp
+from ortools.sat.python import cp_model
+
+from anytime import Run
+from lp.src.cpsat import ENGINES, PlateModel, SolutionStreamer, make_solver
+from lp.src.mip import PlateMIP
+import profiling
 from utils import write_solution
 
 
 class LPsolver:
 
-    def __init__(self, data, output_dir, timeout):
+    def __init__(self, data, output_dir, timeout, threads=8, anytime=False, engine="bop", parameters=None,
+                 budget=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Please select a LP engine between {', '.join(ENGINES)}.")
         self.data = data
         if output_dir == "":
             output_dir = "./lp/out/no_rot"
         self.output_dir = output_dir
         self.timeout = timeout
+        self.threads = threads
+        self.anytime = anytime
+        # The BOP engine solves the big-M MIP, the CP-SAT one the interval model of lp/src/cpsat.py
+        self.engine = engine
+        self.parameters = parameters
+        if engine == "cpsat":
+            # Unknown search parameters are reported before solving
+            make_solver(timeout, threads, parameters)
+        self.budget = budget
+        self.instance_budget = None
+        self.rotation = False
         self.ins_num = None
 
     def solve(self):
         solutions = []
         for d in self.data:
             self.ins_num = d[0]
-            solution = self.solve_instance(d)
+            with Run(d, self.rotation, self.timeout, self.budget, self.anytime, self.output_dir) as run:
+                self.instance_budget = run.budget
+                solution = self.solve_instance(run)
             solutions.append(solution)
         return solutions
 
-    def solve_instance(self, instance):
-        _, self.max_width, self.circuits = instance
-        self.circuits_num = len(self.circuits)
-
-        w, h = ([i for i, _ in self.circuits], [j for _, j in self.circuits])
-
-        lower_bound = sum([h[i] * w[i] for i in range(self.circuits_num)]) // self.max_width
-        upper_bound = sum(h) - min(h)
-
-        # creating the model
-        solver = pywraplp.Solver.CreateSolver('BOP')
-        solver.SetTimeLimit(self.timeout * 1000)
-        solver.SetNumThreads(8)
-
-        x = []
-        y = []
-        max_h = sum(h)
-
-        H = solver.IntVar(lb=lower_bound, ub=upper_bound, name='h')
-        for i in range(self.circuits_num):
-            x.append(solver.IntVar(lb=0, ub=self.max_width - w[i], name=f'x_{i}'))
-            y.append(solver.IntVar(lb=0, ub=max_h - h[i], name=f'y_{i}'))
-
-        # disjunction bool variables
-        d = [
-            [[solver.IntVar(lb=0, ub=1, name=f'd_{i}_{j}_{k}') for k in range(4)] for j in range(self.circuits_num)]
-            for i in range(self.circuits_num)]
-        M = 1000
-        for i in range(self.circuits_num):
-            solver.Add(H >= y[i] + h[i])
-            # non overlapping constraints
-            for j in range(i + 1, self.circuits_num):
-                solver.Add(sum(d[i][j]) >= 1)
-                solver.Add(x[i] + w[i] <= x[j] + M * (1 - d[i][j][0]))
-                solver.Add(x[j] + w[j] <= x[i] + M * (1 - d[i][j][1]))
-                solver.Add(y[i] + h[i] <= y[j] + M * (1 - d[i][j][2]))
-                solver.Add(y[j] + h[j] <= y[i] + M * (1 - d[i][j][3]))
-
-        solver.SetHint([H], [lower_bound])
-        solver.Minimize(H)
-        status = solver.Solve()
+    def solve_instance(self, run):
+        if self.engine == "cpsat":
+            return self.solve_instance_cpsat(run)
+        return self.solve_instance_bop(run)
+
+    def solve_instance_cpsat(self, run):
+        instance, lower_bound, stream = run.instance, run.lower_bound, run.stream
+        # The heuristic solution gives the upper bound of the plate height and the first hint of the search
+        incumbent = run.incumbent
+        if stream is not None:
+            stream(incumbent)
+
+        with self.instance_budget.span("encode"):
+            plate = PlateModel(instance.width, instance.w.tolist(), instance.h.tolist(), lower_bound,
+                               incumbent[0][1], self.rotation)
+            plate.hint(incumbent)
+            solver = make_solver(self.instance_budget.remaining(), self.threads, self.parameters)
+        profiling.count("variables", plate.num_variables())
+        profiling.count("constraints", plate.num_constraints())
+
+        if self.instance_budget.expired():
+            return self.result(run, False, None, 0)
+        with self.instance_budget.span("solve"):
+            if stream is None:
+                status = solver.Solve(plate.model)
+            else:
+                status = solver.Solve(plate.model, SolutionStreamer(plate, stream))
+
+        solution = None
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            solution = plate.solution(solver)
+        return self.result(run, status == cp_model.OPTIMAL, solution, solver.WallTime())
+
+    def solve_instance_bop(self, run):
+        instance, lower_bound, stream = run.instance, run.lower_bound, run.stream
+        # The heuristic solution gives the upper bound of the plate height
+        incumbent = run.incumbent
+        if stream is not None:
+            stream(incumbent)
+
+        with self.instance_budget.span("encode"):
+            # creating the model
+            solver = pywraplp.Solver.CreateSolver('BOP')
+            solver.SetNumThreads(self.threads)
+            plate = PlateMIP(solver, instance.width, instance.w.tolist(), instance.h.tolist(), lower_bound,
+                             incumbent[0][1], self.rotation)
+        profiling.count("variables", solver.NumVariables())
+        profiling.count("constraints", solver.NumConstraints())
+
+        if self.instance_budget.expired():
+            return self.result(run, False, None, 0)
+        # Only the time left by the encoding
+        solver.SetTimeLimit(self.instance_budget.milliseconds())
+        with self.instance_budget.span("solve"):
+            status = solver.Solve()
         total_time = solver.WallTime() / 1000
 
-        if status == pywraplp.Solver.OPTIMAL:
-            circuit_pos = [(int(width), int(height), int(x), int(y)) for width, height, x, y in
-                           zip(w, h, [a.solution_value() for a in x], [a.solution_value() for a in y])]
+        solution = None
+        if status in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+            solution = plate.solution()
+        return self.result(run, status == pywraplp.Solver.OPTIMAL, solution, total_time)
+
+    def result(self, run, optimal, solution, total_time):
+        """Writes and returns the solution of the model to report. In anytime mode the solution found within the time
+        limit is streamed, as BOP has no callback for the intermediate solutions, and the best streamed one is
+        reported"""
+        if run.stream is not None:
+            if solution is not None:
+                run.stream(solution)
+            solution = run.stream.best
+        solution = run.result(solution, optimal)
 
-            write_solution(self.output_dir, self.ins_num, ((self.max_width, int(H.solution_value())), circuit_pos), total_time)
-            return self.ins_num, ((self.max_width, int(H.solution_value())), circuit_pos), total_time
+        if solution is not None:
+            write_solution(self.output_dir, self.ins_num, solution, total_time)
+            return self.ins_num, solution, total_time
         else:
             write_solution(self.output_dir, self.ins_num, None, 0)
             return self.ins_num, None, 0
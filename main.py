@@ -1,71 +1,223 @@
 import argparse
+import os
 
-from cp.src.solve import CPsolver
-from lp.src.solve import LPsolver
-from lp.src.solve_rotation import LPsolverRot
-from sat.src.solve import SATsolver
-from smt.src.solve import SMTsolver
-from smt.src.solve_rotation import SMTsolverRot
-from smt.src.solve_smtlib import SMTLIBsolver
-from smt.src.solve_smtlib_rotation import SMTLIBsolverRot
-from utils import load_data, display_solution, plot_times
+from batch import solve_batch
+from benchmark import RESULTS_FILE, load_results, plot_results
+from budget import Budget
+import profiling
+import presolve
+from cache import SolutionCache
+from decomposition.src.solve import DecompositionSolver
+from lns.src.solve import LNSsolver
+from portfolio.src.solve import PortfolioSolver
+from sat.src.symmetry import RULES, parse_rules
+from search import STRATEGIES, OPTIMIZE
+from smt.src.solve import ENCODINGS as SMT_ENCODINGS, OPTIMIZE_MODES
+from solvers import SOLVERS, build_solver
+from utils import load_data, display_solution, write_solution
+from verify import checked
 
 
 def main():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("-s", "--solver", help="Select a solver between cp, sat, smt and lp", default="cp", type=str)
+    parser.add_argument("-s", "--solver",
+                        help="Select a solver between cp, sat, smt, smtlib, lp, heuristic, portfolio, decomposition "
+                             "and lns",
+                        default="cp", type=str)
     parser.add_argument("-n", "--num_instance",
                         help="Select the number of the instance you want to solve, default = 0 solve all",
                         default=0, type=int)
     parser.add_argument("-i", "--input_dir",
                         help="Directory where the instance txt files can be found",
                         default="./input", type=str)
+    parser.add_argument("-pk", "--packed",
+                        help="File caching the parsed instances of the input directory, reused while the instances "
+                             "are not modified", default=None, type=str)
     parser.add_argument("-o", "--output_dir",
                         help="Directory where the output will be saved", default="")
     parser.add_argument("-r", "--rotation", help="Flag to decide whether it is possible use rotated circuits",
                         default=False, action='store_true')
     parser.add_argument("-v", "--visualize", help="Enable solution visualization", default=False, action='store_true')
     parser.add_argument("-t", "--timeout", help="Timeout in seconds", default=300)
-    parser.add_argument("-p", "--plot", help="Plot of solving times", default=False, action='store_true')
+    parser.add_argument("-tt", "--total_timeout",
+                        help="Timeout in seconds of the whole run, the instances not solved by then are given up",
+                        default=None, type=float)
+    parser.add_argument("-p", "--plot", help="Plot of solving times recorded by the benchmark", default=False,
+                        action='store_true')
     parser.add_argument("-sol", "--solsmtlib", help="Solver used for SMTLib", default="z3", type=str)
+    parser.add_argument("-inc", "--incremental",
+                        help="Encode the SAT model once and tighten the plate height with assumptions",
+                        default=False, action='store_true')
+    parser.add_argument("-enc", "--encoding",
+                        help="How the SAT model is built between z3 expressions and cnf integer clauses",
+                        default="z3", choices=["z3", "cnf"], type=str)
+    parser.add_argument("-ext", "--external",
+                        help="Command of an external SAT solver run on the DIMACS file of the cnf encoding",
+                        default=None, type=str)
+    parser.add_argument("-smte", "--smt_encoding",
+                        help="Theory of the positions of the smt solver between lia integers and bv bit-vectors",
+                        default="lia", choices=SMT_ENCODINGS, type=str)
+    parser.add_argument("-sy", "--symmetry",
+                        help="Comma separated symmetry breaking rules of the SAT solver between domain, large and "
+                             "same, or none", default=",".join(RULES), type=str)
+    parser.add_argument("-lpe", "--lp_engine",
+                        help="Engine of the lp solver between the bop MIP and the cpsat interval model", default="bop",
+                        choices=["bop", "cpsat"], type=str)
+    parser.add_argument("-lpp", "--lp_parameters",
+                        help="Comma separated name=value search parameters of the cpsat engine", default=None, type=str)
+    parser.add_argument("-sc", "--search",
+                        help="Plate height search used by sat, smt and smtlib between linear, binary and descending, "
+                             "or optimize for the z3 optimizer of smt and smtlib", default="linear",
+                        choices=list(STRATEGIES) + [OPTIMIZE], type=str)
+    parser.add_argument("-om", "--optimize_mode",
+                        help="Strategy of the z3 optimizer with the optimize search: minimize the plate height as "
+                             "the single objective, or core to solve each lower height as a soft constraint",
+                        default="minimize", choices=OPTIMIZE_MODES, type=str)
+    parser.add_argument("-w", "--workers", help="Number of instances solved in parallel, default = 1 solve in sequence",
+                        default=1, type=int)
+    parser.add_argument("-th", "--threads", help="Number of threads each solver can use, default depends on the solver",
+                        default=None, type=int)
+    parser.add_argument("-b", "--backends", help="Comma separated solvers raced by the portfolio solver",
+                        default="cp,sat,smt,lp", type=str)
+    parser.add_argument("-sb", "--strip_backend", help="Solver of the strips of the decomposition solver",
+                        default="sat", type=str)
+    parser.add_argument("-ss", "--strip_size", help="Number of circuits of each strip of the decomposition solver",
+                        default=30, type=int)
+    parser.add_argument("-ls", "--lns_start", help="Solver of the starting packing of the lns solver",
+                        default="heuristic", type=str)
+    parser.add_argument("-lw", "--lns_window", help="Initial number of circuits freed by each neighbourhood of the lns "
+                                                    "solver", default=10, type=int)
+    parser.add_argument("-c", "--cache",
+                        help="Directory of the cache of the optimal solutions, disabled by default", default=None,
+                        type=str)
+    parser.add_argument("-cs", "--cache_size", help="Maximum number of solutions kept in the cache", default=1000,
+                        type=int)
+    parser.add_argument("-a", "--anytime",
+                        help="Stream every improving solution and keep the best one found when the timeout expires",
+                        default=False, action='store_true')
+    parser.add_argument("-ps", "--presolve",
+                        help="Stack the circuits which cannot have any other beside them at the bottom of the plate and "
+                             "solve the remaining ones", default=False, action='store_true')
+    parser.add_argument("-pr", "--profile",
+                        help="Print the time spent in each phase of every instance and the size of the models, "
+                             "optionally with the cprofile or tracemalloc report", nargs="?", const="spans",
+                        default=None, choices=profiling.CAPTURES, type=str)
     args = parser.parse_args()
     print(args)
 
-    print("Loading instances")
     if args.plot:
-        data = []
-    else:
-        data = load_data(args.num_instance, args.input_dir)
+        if not os.path.exists(RESULTS_FILE):
+            parser.error(f"No benchmark results in {RESULTS_FILE}, run benchmark.py first.")
+        plot_results([row for row in load_results(RESULTS_FILE) if row["solver"] == args.solver])
+        return
+
+    if args.anytime and args.solver == "portfolio":
+        parser.error("The anytime mode is not supported by the portfolio solver.")
+    if args.search == OPTIMIZE and args.solver not in ("smt", "smtlib"):
+        parser.error("The optimize search is only supported by the smt and smtlib solvers.")
+    if args.solver == "decomposition" and args.strip_backend not in SOLVERS:
+        parser.error(f"Please select a strip backend between {', '.join(SOLVERS)}.")
+    if args.solver == "lns" and args.lns_start not in SOLVERS:
+        parser.error(f"Please select a lns start solver between {', '.join(SOLVERS)}.")
+
+    try:
+        symmetry = parse_rules(args.symmetry)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.profile is not None:
+        profiling.enable(args.profile)
+
+    # The deadline of the run starts before loading the instances
+    budget = None if args.total_timeout is None else Budget(args.total_timeout)
+
+    print("Loading instances")
+    data = load_data(args.num_instance, args.input_dir, args.packed)
     print(data)
-    if args.solver == "cp":
-        solver = CPsolver(data=data, rotation=args.rotation, output_dir=args.output_dir, timeout=int(args.timeout))
-    elif args.solver == "sat":
-        solver = SATsolver(data=data, rotation=args.rotation, output_dir=args.output_dir, timeout=int(args.timeout))
-    elif args.solver == "smt":
-        if args.rotation:
-            solver = SMTsolverRot(data=data, output_dir=args.output_dir, timeout=int(args.timeout))
+    if args.solver == "portfolio":
+        solver = PortfolioSolver(data=data, rotation=args.rotation, output_dir=args.output_dir,
+                                 timeout=int(args.timeout), backends=args.backends.split(","), threads=args.threads,
+                                 budget=budget)
+    elif args.solver in ("decomposition", "lns"):
+        # The options of the solvers used by the decomposition and lns ones
+        backend_options = {"incremental": args.incremental, "smtlib_solver": args.solsmtlib, "encoding": args.encoding,
+                           "external": args.external, "lp_engine": args.lp_engine, "lp_parameters": args.lp_parameters,
+                           "symmetry": symmetry, "smt_encoding": args.smt_encoding}
+        if args.solver == "decomposition":
+            solver = DecompositionSolver(data=data, rotation=args.rotation, output_dir=args.output_dir,
+                                         timeout=int(args.timeout), backend=args.strip_backend,
+                                         strip_size=args.strip_size, threads=args.threads, anytime=args.anytime,
+                                         backend_options=backend_options, budget=budget)
         else:
-            solver = SMTsolver(data=data, output_dir=args.output_dir, timeout=int(args.timeout))
-    elif args.solver == "smtlib":
-        if args.solsmtlib != 'z3' and args.solsmtlib != 'cvc5':
-            raise argparse.ArgumentError(None, "Please select a smtlib solver between z3 and cvc5.")
-        if args.rotation:
-            solver = SMTLIBsolverRot(data=data, output_dir=args.output_dir, timeout=int(args.timeout),
-                                     solver=args.solsmtlib)
-        else:
-            solver = SMTLIBsolver(data=data, output_dir=args.output_dir, timeout=int(args.timeout),
-                                  solver=args.solsmtlib)
-    elif args.solver == "lp":
-        if args.rotation:
-            solver = LPsolverRot(data=data, output_dir=args.output_dir, timeout=int(args.timeout))
-        else:
-            solver = LPsolver(data=data, output_dir=args.output_dir, timeout=int(args.timeout))
+            solver = LNSsolver(data=data, rotation=args.rotation, output_dir=args.output_dir, timeout=int(args.timeout),
+                               start=args.lns_start, window=args.lns_window, threads=args.threads,
+                               anytime=args.anytime, start_options=backend_options, budget=budget)
     else:
-        raise argparse.ArgumentError(None, "Please select a solver between cp, sat, smt and lp.")
+        try:
+            solver = build_solver(args.solver, data=data, rotation=args.rotation, output_dir=args.output_dir,
+                                  timeout=int(args.timeout), incremental=args.incremental, strategy=args.search,
+                                  smtlib_solver=args.solsmtlib, threads=args.threads, encoding=args.encoding,
+                                  external=args.external, anytime=args.anytime, lp_engine=args.lp_engine,
+                                  lp_parameters=args.lp_parameters, budget=budget, symmetry=symmetry,
+                                  smt_encoding=args.smt_encoding, optimize_mode=args.optimize_mode)
+        except ValueError as e:
+            raise argparse.ArgumentError(None, str(e))
+
+    # The solvers check their solutions before writing them, the ones which do not come from a solver are checked here
+    instances = {str(d[0]): d for d in solver.data}
+
+    def checked_solutions(solutions):
+        return [(num, checked(instances[str(num)], solution, args.rotation), spent_time)
+                for num, solution, spent_time in solutions]
+
+    cache = None
+    cached = []
+    if args.cache is not None:
+        # The cached instances are not solved again, the bounds of the others are seeded by similar cached ones
+        cache = SolutionCache(args.cache, args.cache_size)
+        cached, solver.data = cache.split(solver.data, args.rotation)
+        cached = checked_solutions(cached)
+        for num, solution, spent_time in cached:
+            write_solution(solver.output_dir, num, solution, spent_time)
+
+    solved = []
+    presolved = {}
+    if args.presolve:
+        # The solvers get the reduced instances, their solutions are lifted back once solved
+        solved, solver.data, presolved = presolve.split(solver.data, args.rotation)
+        solved = checked_solutions(solved)
+        for num, solution, spent_time in solved:
+            write_solution(solver.output_dir, num, solution, spent_time)
+        if args.anytime:
+            solver.anytime = presolve.Lifter(presolved, solver.output_dir, args.rotation)
 
     print("Solving with", args.solver, "rotation", args.rotation)
-    solutions = solver.solve()
+    if args.workers > 1:
+        solutions = solve_batch(solver, args.workers)
+    else:
+        solutions = solver.solve()
+
+    if presolved:
+        lifted = []
+        for num, solution, spent_time in solutions:
+            if str(num) in presolved and presolved[str(num)].bands:
+                solution = checked(instances[str(num)], presolved[str(num)].lift(solution), args.rotation)
+                write_solution(solver.output_dir, num, solution, spent_time)
+            lifted.append((num, solution, spent_time))
+        solutions = lifted
+    solutions = solved + solutions
+
+    # The heuristic, decomposition and lns solutions and the ones returned in anytime mode are not proven to be optimal
+    if cache is not None and args.solver not in ("heuristic", "decomposition", "lns") and not args.anytime:
+        encoding = {"sat": args.encoding, "smt": args.smt_encoding, "smtlib": args.solsmtlib, "lp": args.lp_engine,
+                    "portfolio": args.backends}.get(args.solver, "")
+        for num, solution, _ in solutions:
+            if solution is not None:
+                cache.put(instances[str(num)], args.rotation, solution, args.solver, encoding)
+    solutions = cached + solutions
+    if args.profile is not None:
+        print("\n".join(profiling.profiler.summary()))
 
     if args.visualize:
         for sol in solutions:
@@ -73,8 +225,6 @@ def main():
                 circuits = [(w, h) for (w, h, _, _) in sol[1][1]]
                 circuits_pos = [(x, y) for (_, _, x, y) in sol[1][1]]
                 display_solution(f'ins-{sol[0]}', (sol[1][0][0], sol[1][0][1]), len(sol[1][1]), circuits, circuits_pos)
-    if args.plot:
-        plot_times(solver.output_dir)
 
 
 if __name__ == '__main__':
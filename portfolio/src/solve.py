@@ -0,0 +1,143 @@
+import csv
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+
+from anytime import Run
+from search import tighten
+from solvers import build_solver
+from utils import write_solution
+from verify import checked
+
+# Kinds of the messages of the backends: the height of a packing found, and the proven optimal solution at the end
+FOUND = "found"
+DONE = "done"
+
+
+class Heights:
+    """Anytime callback of a backend sending back (FOUND, name, height, elapsed) for each improving packing, the
+    backend still returns only a solution proven to be optimal"""
+    proven_only = True
+
+    def __init__(self, name, results):
+        self.name = name
+        self.results = results
+
+    def __call__(self, ins_num, solution, gap, elapsed):
+        self.results.put((FOUND, self.name, solution[0][1], elapsed))
+
+
+def run_backend(name, instance, rotation, output_dir, timeout, threads, budget, results):
+    """Solves the instance with a single backend within the budget, sends back the heights it finds and at the end
+    (DONE, name, solution, time)"""
+    if hasattr(os, "setpgrp"):
+        # Own process group, so that the external processes started by the backend are killed together with it
+        os.setpgrp()
+    try:
+        solutions = build_solver(name, [instance], rotation, output_dir, timeout, threads=threads,
+                                 anytime=Heights(name, results), budget=budget).solve()
+        solution = next((s for s in solutions if s is not None and s[1] is not None), None)
+        if solution is None:
+            results.put((DONE, name, None, 0))
+        else:
+            results.put((DONE, name, solution[1], solution[2]))
+    except Exception as e:
+        print(f'{name} failed:', e)
+        results.put((DONE, name, None, 0))
+
+
+def kill(process):
+    if not process.is_alive():
+        return
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        process.terminate()
+    process.join()
+
+
+class PortfolioSolver:
+
+    def __init__(self, data, rotation, output_dir, timeout, backends=("cp", "sat", "smt", "lp"), threads=None,
+                 budget=None):
+        self.data = data
+        self.rotation = rotation
+        if output_dir == "":
+            output_dir = "./portfolio/out/rot" if rotation else "./portfolio/out/no_rot"
+        self.output_dir = output_dir
+        self.timeout = timeout
+        self.backends = backends
+        self.threads = threads
+        self.budget = budget
+        self.instance_budget = None
+
+    def solve(self):
+        solutions = []
+        for d in self.data:
+            with Run(d, self.rotation, self.timeout, self.budget) as run:
+                self.instance_budget = run.budget
+                solutions.append(self.solve_instance(d, run))
+        return solutions
+
+    def solve_instance(self, instance, run):
+        """Races all the backends on the instance, the first one proving an optimal solution wins. A claimed optimum
+        higher than a packing found by another backend, or than the heuristic one, is wrong and does not win"""
+        ins_num, plate_width, circuits = instance
+        budget = run.budget
+        results = multiprocessing.Queue()
+        winner, solution, spent_time = None, None, 0
+        lowest, lowest_by = tighten(run.incumbent)[0][1], "heuristic"
+
+        # The backends only return proven optimal solutions, their own output files are thrown away
+        with tempfile.TemporaryDirectory() as backends_dir:
+            processes = [multiprocessing.Process(target=run_backend,
+                                                 args=(name, instance, self.rotation, os.path.join(backends_dir, name),
+                                                       self.timeout, self.threads, budget, results))
+                         for name in self.backends]
+            for process in processes:
+                process.start()
+
+            pending = len(processes)
+            with budget.span("race"):
+                while pending > 0 and solution is None:
+                    try:
+                        kind, name, found, found_time = results.get(timeout=budget.remaining() + 1)
+                    except queue.Empty:
+                        break
+                    if kind == FOUND:
+                        if found < lowest:
+                            lowest, lowest_by = found, name
+                        continue
+                    pending -= 1
+                    if checked(instance, found, self.rotation) is None:
+                        continue
+                    height = tighten(found)[0][1]
+                    if height > lowest:
+                        print(f'{ins_num}) {name} claims the optimum {height}, {lowest_by} found {lowest}: ignored')
+                        continue
+                    winner, solution, spent_time = name, found, found_time
+
+            with budget.span("kill"):
+                for process in processes:
+                    kill(process)
+
+        write_solution(self.output_dir, ins_num, solution, spent_time)
+        if solution is not None:
+            self.record_winner(ins_num, plate_width, circuits, winner, spent_time)
+        return ins_num, solution, spent_time
+
+    def record_winner(self, ins_num, plate_width, circuits, winner, spent_time):
+        """Appends the winning backend to winners.csv together with some features of the instance"""
+        print(f'{ins_num}) won by {winner}')
+        filename = os.path.join(self.output_dir, "winners.csv")
+        new_file = not os.path.exists(filename)
+        with open(filename, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["instance", "circuits", "width", "rotation", "winner", "time"])
+            writer.writerow([ins_num, len(circuits), plate_width, self.rotation, winner, spent_time])
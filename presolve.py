@@ -0,0 +1,122 @@
+"""Geometric presolve shared by all the solvers: full width bands are cut out of the instances before encoding"""
+import time
+from collections import defaultdict
+
+from bounds import orientations
+from utils import Instance, save_solution
+from verify import checked
+
+
+class Presolved:
+    """The reduced instance of an instance and the bands removed from it, at the bottom of the plate"""
+
+    def __init__(self, instance, reduced, kept, bands):
+        self.instance = instance
+        # None when every circuit is a band
+        self.reduced = reduced
+        # Index in the instance of each circuit of the reduced instance
+        self.kept = kept
+        # Each band is (index, w, h) with the orientation of the circuit
+        self.bands = bands
+        self.offset = sum(h for _, _, h in bands)
+
+    def lift(self, solution):
+        """Returns the solution of the instance given the one of the reduced instance"""
+        circuits_pos = [None] * self.instance.n
+        y = 0
+        for i, w, h in self.bands:
+            circuits_pos[i] = (w, h, 0, y)
+            y += h
+        if self.reduced is None:
+            return (self.instance.width, self.offset), circuits_pos
+        if solution is None:
+            return None
+        (_, plate_height), reduced_pos = solution
+        for i, (w, h, x, y) in zip(self.kept, reduced_pos):
+            circuits_pos[i] = (w, h, x, y + self.offset)
+        return (self.instance.width, plate_height + self.offset), circuits_pos
+
+
+def presolve(instance, rotation=False):
+    """Removes the bands of the instance, returns its Presolved. A band is a circuit too wide to leave room beside it even
+    for the narrowest other circuit, so nothing crosses its rows and it can be stacked at the bottom of any packing"""
+    instance = Instance.of(instance)
+    width = instance.width
+    circuits = instance.circuits
+    remaining = list(range(len(circuits)))
+    bands = []
+    found = True
+    # Removing a band can turn other circuits into bands
+    while found and remaining:
+        found = False
+        # The narrowest width each circuit can take
+        narrow = sorted((min(cw for cw, _ in orientations(width, circuits[i], rotation)), i) for i in remaining)
+        for i in remaining:
+            others = [cw for cw, j in narrow[:2] if j != i]
+            narrowest = others[0] if others else width + 1
+            shapes = orientations(width, circuits[i], rotation)
+            if all(cw + narrowest > width for cw, _ in shapes):
+                # The band is as low as possible
+                cw, ch = min(shapes, key=lambda s: s[1])
+                bands.append((i, cw, ch))
+                remaining.remove(i)
+                found = True
+                break
+
+    reduced = None
+    if remaining:
+        reduced = Instance(instance.num, width, [instance.w[i] for i in remaining], [instance.h[i] for i in remaining])
+        # The bounds known for the instance, e.g. seeded by the cache, still hold without the bands
+        offset = sum(h for _, _, h in bands)
+        reduced.seed(rotation, lower_bound=instance.lower_bound(rotation) - offset)
+    return Presolved(instance, reduced, remaining, bands)
+
+
+def split(data, rotation):
+    """Returns the solutions of the instances made only of bands, as returned by the solvers, the reduced instances to
+    solve and the Presolved of each of them by instance number"""
+    solutions = []
+    remaining = []
+    presolved = {}
+    for instance in data:
+        start_time = time.time()
+        result = presolve(instance, rotation)
+        if result.reduced is None:
+            solutions.append((result.instance.num, result.lift(None), time.time() - start_time))
+        else:
+            if result.bands:
+                print(f'{result.instance.num}) presolve removed {len(result.bands)} full width circuits')
+            remaining.append(result.reduced)
+            presolved[str(result.instance.num)] = result
+    return solutions, remaining, presolved
+
+
+class Lifter:
+    """Anytime callback rewriting the solution file of each streamed solution of a reduced instance with its lifted
+    solution. It is a class so that it can be sent to the batch workers"""
+
+    def __init__(self, presolved, output_dir, rotation=False):
+        self.presolved = presolved
+        self.output_dir = output_dir
+        self.rotation = rotation
+
+    def __call__(self, ins_num, solution, gap, elapsed):
+        presolved = self.presolved[str(ins_num)]
+        lifted = checked(presolved.instance, presolved.lift(solution), self.rotation)
+        if lifted is not None:
+            save_solution(self.output_dir, ins_num, lifted)
+
+
+def identical_groups(w, h, rotation=False):
+    """Returns the groups, with more than one circuit, of the indices of identical circuits"""
+    groups = defaultdict(list)
+    for i, (cw, ch) in enumerate(zip(w, h)):
+        groups[(min(cw, ch), max(cw, ch)) if rotation else (cw, ch)].append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def stacked_pairs(width, w, h, rotation=False):
+    """Returns the pairs (i, j), i < j, of circuits which cannot be side by side in any orientation"""
+    narrow = [min(cw for cw, _ in orientations(width, c, rotation)) for c in zip(w, h)]
+    return [(i, j) for i in range(len(w)) for j in range(i + 1, len(w)) if narrow[i] + narrow[j] > width]
+
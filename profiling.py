@@ -0,0 +1,150 @@
+"""Instrumentation shared by all the solvers.
+
+The solvers mark their phases with spans and count what they create:
+
+    with profiling.span("encode"):
+        ...
+    profiling.count("clauses", n)
+
+Everything is recorded per instance, inside profiling.instance(num), by the active profiler. The default profiler is
+disabled and costs a function call per span, main.py --profile enables one which prints the breakdown of each instance
+and, optionally, the functions taking most time (cProfile) or the lines allocating most memory (tracemalloc).
+"""
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+CAPTURES = ["spans", "cprofile", "tracemalloc"]
+# Rows of the cProfile and tracemalloc reports
+TOP = 15
+
+
+class Profiler:
+
+    def __init__(self, enabled=False, capture="spans"):
+        if capture not in CAPTURES:
+            raise ValueError(f"Please select a profile capture between {', '.join(CAPTURES)}.")
+        self.enabled = enabled
+        self.capture = capture
+        # Each record is (instance, {phase: seconds}, {counter: amount})
+        self.records = []
+        self.times = None
+        self.counters = None
+        self.open_spans = []
+
+    @contextmanager
+    def instance(self, num):
+        if not self.enabled:
+            yield
+            return
+        self.times, self.counters = defaultdict(float), defaultdict(int)
+        profile = cProfile.Profile() if self.capture == "cprofile" else None
+        if profile is not None:
+            profile.enable()
+        if self.capture == "tracemalloc":
+            tracemalloc.start()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times["total"] = time.perf_counter() - start_time
+            lines = []
+            if profile is not None:
+                profile.disable()
+                lines = self.cprofile_report(profile)
+            if self.capture == "tracemalloc":
+                lines = self.tracemalloc_report()
+                tracemalloc.stop()
+            self.records.append((str(num), dict(self.times), dict(self.counters)))
+            self.times, self.counters = None, None
+            print("\n".join(self.instance_report(self.records[-1]) + lines))
+
+    @contextmanager
+    def span(self, name):
+        """Adds the time spent inside to the phase name. Nested spans are not counted twice: the time of a span
+        excludes the one of the spans inside it"""
+        if not self.enabled or self.times is None:
+            yield
+            return
+        self.open_spans.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            inner = self.open_spans.pop()
+            self.times[name] += elapsed - inner
+            if self.open_spans:
+                self.open_spans[-1] += elapsed
+
+    def count(self, name, amount=1):
+        if self.enabled and self.counters is not None:
+            self.counters[name] += amount
+
+    @staticmethod
+    def instance_report(record, title=None):
+        num, times, counters = record
+        total = times.get("total", 0)
+        lines = [f'{title or f"{num})"} profile, total {total:.3f}s']
+        phases = {name: t for name, t in times.items() if name != "total"}
+        phases["other"] = max(0.0, total - sum(phases.values()))
+        for name, t in sorted(phases.items(), key=lambda item: -item[1]):
+            lines.append(f'    {name:<16}{t:>10.3f}s{100 * t / total if total else 0:>8.1f}%')
+        for name, amount in sorted(counters.items()):
+            lines.append(f'    {name:<16}{amount:>11}')
+        return lines
+
+    def summary(self):
+        """Returns the lines of the breakdown summed over all the instances recorded, also by the batch workers"""
+        times, counters = defaultdict(float), defaultdict(int)
+        for _, instance_times, instance_counters in self.records:
+            for name, t in instance_times.items():
+                times[name] += t
+            for name, amount in instance_counters.items():
+                counters[name] += amount
+        return self.instance_report((None, times, counters), f"All {len(self.records)} instances,")
+
+    @staticmethod
+    def cprofile_report(profile):
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(TOP)
+        return [text.getvalue()]
+
+    @staticmethod
+    def tracemalloc_report():
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f'    memory peak {peak / 2 ** 20:.1f}MB, still allocated {current / 2 ** 20:.1f}MB']
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:TOP]:
+            lines.append(f'    {stat}')
+        return lines
+
+
+profiler = Profiler()
+
+
+def enable(capture="spans"):
+    """Replaces the active profiler with an enabled one"""
+    global profiler
+    profiler = Profiler(enabled=True, capture=capture)
+    return profiler
+
+
+def active():
+    """Whether spans and counters are recorded, to skip computing counters which are not free"""
+    return profiler.enabled
+
+
+def instance(num):
+    return profiler.instance(num)
+
+
+def span(name):
+    return profiler.span(name)
+
+
+def count(name, amount=1):
+    profiler.count(name, amount)
@@ -0,0 +1,260 @@
+import os
+import shlex
+import subprocess
+import tempfile
+
+import numpy as np
+from z3 import Bool, Not, Solver, is_true
+
+from sat.src.symmetry import breaking_clauses
+from search import SAT, UNSAT, UNKNOWN
+
+
+class CNF:
+    """A CNF formula whose literals are integers as in DIMACS: variables are numbered from 1 and a negative literal is
+    the negation of the variable. The clauses are stored as blocks of clauses with the same number of literals, so that
+    whole families of clauses can be generated with numpy"""
+
+    def __init__(self):
+        self.num_vars = 0
+        self.blocks = []
+
+    def new_vars(self, *shape):
+        """Returns an array with the given shape of new variables"""
+        size = int(np.prod(shape))
+        variables = np.arange(self.num_vars + 1, self.num_vars + 1 + size, dtype=np.int64).reshape(shape)
+        self.num_vars += size
+        return variables
+
+    def add(self, clauses):
+        """Adds a 2D array of clauses, one per row. A 1D array is added as unit clauses"""
+        clauses = np.asarray(clauses, dtype=np.int64)
+        if clauses.ndim == 1:
+            clauses = clauses[:, None]
+        if clauses.size > 0:
+            self.blocks.append(clauses)
+
+    def add_lists(self, clauses):
+        """Adds clauses given as lists of literals of any length, grouped in blocks by length"""
+        by_length = {}
+        for clause in clauses:
+            by_length.setdefault(len(clause), []).append(clause)
+        for block in by_length.values():
+            self.add(np.array(block, dtype=np.int64).reshape(len(block), -1))
+
+    @property
+    def num_clauses(self):
+        return sum(len(block) for block in self.blocks)
+
+    def to_dimacs(self, units=()):
+        """Returns the formula in DIMACS format, with the given literals added as unit clauses"""
+        lines = [f"p cnf {self.num_vars} {self.num_clauses + len(units)}\n"]
+        for block in self.blocks + [np.array(units, dtype=np.int64).reshape(-1, 1)]:
+            # Formatting a whole block at once is much faster than formatting clause by clause
+            clause = " ".join(["%d"] * block.shape[1]) + " 0\n"
+            lines.append((clause * len(block)) % tuple(block.ravel().tolist()))
+        return "".join(lines)
+
+    def to_smtlib(self):
+        """Returns the formula as SMT-LIB declarations and assertions, where the variable v is named v<v>"""
+        n = self.num_vars
+        # names[n + lit] is the SMT-LIB term of the literal lit
+        names = [f"(not v{n - k})" for k in range(n)] + ["false"] + [f"v{k}" for k in range(1, n + 1)]
+        lines = [f"(declare-fun v{k} () Bool)\n" for k in range(1, n + 1)]
+        for block in self.blocks:
+            clause = "(assert (or" + " %s" * block.shape[1] + "))\n"
+            lines.append((clause * len(block)) % tuple(names[k] for k in (block + n).ravel().tolist()))
+        return "".join(lines)
+
+
+class Z3Backend:
+    """Solves a CNF with z3, which parses the whole formula natively. SMT-LIB is used instead of DIMACS because the
+    variables z3 creates while reading DIMACS cannot be referred to, e.g. in the assumptions"""
+
+    def __init__(self, cnf, timeout, threads=1):
+        self.num_vars = cnf.num_vars
+        self.sol = Solver()
+        self.sol.set(timeout=int(timeout * 1000))
+        self.sol.set(threads=threads)
+        self.sol.from_string(cnf.to_smtlib())
+
+    @staticmethod
+    def literal(lit):
+        return Bool(f"v{lit}") if lit > 0 else Not(Bool(f"v{-lit}"))
+
+    def set_timeout(self, timeout):
+        """Sets the timeout in seconds of the next checks"""
+        self.sol.set(timeout=int(timeout * 1000))
+
+    def check(self, assumptions=()):
+        """Returns the status and, when satisfiable, a boolean array with the value of each variable (index 0 unused)"""
+        result = self.sol.check(*[self.literal(lit) for lit in assumptions])
+        if str(result) != SAT:
+            return str(result), None
+        values = np.zeros(self.num_vars + 1, dtype=bool)
+        model = self.sol.model()
+        for decl in model.decls():
+            if is_true(model[decl]):
+                values[int(decl.name()[1:])] = True
+        return SAT, values
+
+
+class ExternalBackend:
+    """Solves a CNF running an external SAT solver on a DIMACS file. The solver must follow the SAT competition output
+    format (a line "s SATISFIABLE" and the model in lines starting with "v"), as kissat, cadical or glucose -model do"""
+
+    def __init__(self, cnf, timeout, command):
+        self.cnf = cnf
+        self.timeout = timeout
+        self.command = shlex.split(command)
+
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+
+    def check(self, assumptions=()):
+        # Assumptions are not supported by the command line, they are added as unit clauses
+        with tempfile.NamedTemporaryFile("w", suffix=".cnf", delete=False) as f:
+            f.write(self.cnf.to_dimacs(assumptions))
+        try:
+            process = subprocess.run(self.command + [f.name], stdout=subprocess.PIPE, timeout=self.timeout,
+                                     universal_newlines=True)
+        except subprocess.TimeoutExpired:
+            return UNKNOWN, None
+        finally:
+            os.remove(f.name)
+
+        lines = process.stdout.splitlines()
+        if "s UNSATISFIABLE" in lines:
+            return UNSAT, None
+        if "s SATISFIABLE" not in lines:
+            return UNKNOWN, None
+        values = np.zeros(self.cnf.num_vars + 1, dtype=bool)
+        literals = np.array([int(lit) for line in lines if line.startswith("v") for lit in line[1:].split()],
+                            dtype=np.int64)
+        values[literals[literals > 0]] = True
+        return SAT, values
+
+
+def order_encoding(cnf, p, sizes, length):
+    """p[i, v] means that the coordinate of circuit i is at most v: p[i, v] -> p[i, v + 1] and the circuit must end
+    inside the plate, so p[i, v] holds for v >= length - size"""
+    for i, size in enumerate(sizes):
+        v = np.arange(length - size)
+        cnf.add(np.stack([-p[i, v], p[i, v + 1]], axis=1))
+        cnf.add(p[i, length - size:])
+
+
+def non_overlapping(cnf, rel, p, sizes, length):
+    """rel[i, j] means that circuit i is before circuit j along the axis of p: the coordinate of j is at least the one
+    of i plus its size, encoded by the 3-literals clauses rel[i, j] and not p[i, v] -> not p[j, v + size_i]"""
+    n = len(sizes)
+    for i, size in enumerate(sizes):
+        others = np.delete(np.arange(n), i)[:, None]
+        v = np.arange(length - size)[None, :]
+        lits = np.broadcast_arrays(-rel[i, others], p[i, v], -p[others, v + size])
+        cnf.add(np.stack(lits, axis=-1).reshape(-1, 3))
+
+        # rel[i, j] -> the coordinate of j is at least size_i
+        cnf.add(np.stack([-rel[i, others[:, 0]], -p[others[:, 0], size - 1]], axis=1))
+
+
+def encode(cnf, w, h, max_width, plate_height, symmetry=(), fixed_height=True):
+    """Encodes the model of SATsolver.set_constraints with the given symmetry breaking rules, returns the arrays of
+    order variables px and py"""
+    n = len(w)
+    px = cnf.new_vars(n, max_width)
+    py = cnf.new_vars(n, plate_height)
+    # The diagonals are not used
+    lr = cnf.new_vars(n, n)
+    ud = cnf.new_vars(n, n)
+
+    # Each pair of circuits cannot overlap
+    i, j = np.triu_indices(n, 1)
+    cnf.add(np.stack([lr[i, j], lr[j, i], ud[i, j], ud[j, i]], axis=1))
+
+    order_encoding(cnf, px, w, max_width)
+    order_encoding(cnf, py, h, plate_height)
+    non_overlapping(cnf, lr, px, w, max_width)
+    non_overlapping(cnf, ud, py, h, plate_height)
+    cnf.add_lists(breaking_clauses(symmetry, np.negative, w, h, max_width, plate_height, px, py, lr, ud, None,
+                                   fixed_height))
+    return px, py
+
+
+def edge_clauses(cnf, p, e, r, sizes, rotated_sizes, length):
+    """Same as SATsolver.edge_clauses for all the circuits at once"""
+    cnf.add(np.stack([-p[:, :-1], p[:, 1:]], axis=-1).reshape(-1, 2))
+    cnf.add(np.stack([-e[:, :-1], e[:, 1:]], axis=-1).reshape(-1, 2))
+    cnf.add(e[:, length])
+
+    v = np.arange(length + 1)
+    for i in range(len(sizes)):
+        for orientation, size in ((r[i], sizes[i]), (-r[i], rotated_sizes[i])):
+            low, high = v[v < size], v[v >= size]
+            cnf.add(np.stack([np.full(len(low), orientation), -e[i, low]], axis=1))
+            guard = np.full(len(high), orientation)
+            cnf.add(np.stack([guard, -e[i, high], p[i, high - size]], axis=1))
+            cnf.add(np.stack([guard, e[i, high], -p[i, high - size]], axis=1))
+
+
+def encode_rotation(cnf, w, h, max_width, plate_height, symmetry=(), fixed_height=True):
+    """Encodes the model of SATsolver.set_constraints_rotation with the given symmetry breaking rules, returns the
+    arrays of order variables px and py and the rotation variables r"""
+    n = len(w)
+    w, h = np.asarray(w), np.asarray(h)
+    px = cnf.new_vars(n, max_width)
+    py = cnf.new_vars(n, plate_height)
+    lr = cnf.new_vars(n, n)
+    ud = cnf.new_vars(n, n)
+    r = cnf.new_vars(n)
+    rx = cnf.new_vars(n, max_width + 1)
+    ry = cnf.new_vars(n, plate_height + 1)
+
+    i, j = np.triu_indices(n, 1)
+    cnf.add(np.stack([lr[i, j], lr[j, i], ud[i, j], ud[j, i]], axis=1))
+
+    edge_clauses(cnf, px, rx, r, w, h, max_width)
+    edge_clauses(cnf, py, ry, r, h, w, plate_height)
+    # A square circuit does not change when rotated
+    cnf.add(-r[w == h])
+
+    # rel[i, j] and p[j, v] -> edge[i, v] for every pair of distinct circuits
+    i, j = np.nonzero(~np.eye(n, dtype=bool))
+    i, j = i[:, None], j[:, None]
+    for rel, p, edge, length in ((lr, px, rx, max_width), (ud, py, ry, plate_height)):
+        v = np.arange(length)[None, :]
+        lits = np.broadcast_arrays(-rel[i, j], -p[j, v], edge[i, v])
+        cnf.add(np.stack(lits, axis=-1).reshape(-1, 3))
+    cnf.add_lists(breaking_clauses(symmetry, np.negative, w.tolist(), h.tolist(), max_width, plate_height, px, py, lr,
+                                   ud, r, fixed_height))
+    return px, py, r
+
+
+def encode_height_literals(cnf, py, h, lower_bound, upper_bound, r=None, w=None):
+    """Adds the literals ph_k of SATsolver.set_height_literals for the model encoded at upper_bound. With rotation the
+    height of each circuit is h or w depending on r"""
+    ph = cnf.new_vars(upper_bound - lower_bound + 1)
+    cnf.add(np.stack([-ph[:-1], ph[1:]], axis=1))
+    if r is None:
+        orientations = [(None, np.asarray(h))]
+    else:
+        orientations = [(r, np.asarray(h)), (-r, np.asarray(w))]
+
+    for k in range(lower_bound, upper_bound + 1):
+        lit = -ph[k - lower_bound]
+        for guard, heights in orientations:
+            # ph_k -> y <= k - height, which is false when the circuit does not fit in the plate
+            max_y = k - heights
+            out = np.nonzero(max_y < 0)[0]
+            inside = np.nonzero((max_y >= 0) & (max_y < upper_bound))[0]
+            for rows, lits in ((out, []), (inside, [py[inside, max_y[inside]]])):
+                columns = [np.full(len(rows), lit)] + lits + ([] if guard is None else [guard[rows]])
+                cnf.add(np.stack(columns, axis=1))
+    return ph
+
+
+def decode(values, px, py, r=None):
+    """Returns the coordinates of the circuits, the first true order variable of each one, and whether they are
+    rotated"""
+    rotated = [False] * len(px) if r is None else values[r].tolist()
+    return np.argmax(values[px], axis=1).tolist(), np.argmax(values[py], axis=1).tolist(), rotated
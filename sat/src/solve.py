@@ -1,14 +1,27 @@
-import itertools
 import time
 
-import numpy as np
-from z3 import And, Or, Bool, sat, Not, Solver
+from z3 import Or, Bool, sat, Not, Solver
+from anytime import Run
+import profiling
+from sat.src import cnf
+from sat.src.symmetry import RULES, breaking_clauses
+from search import search, SAT, UNKNOWN
 from utils import write_solution
 
+ENCODINGS = ["z3", "cnf"]
+
 
 class SATsolver:
 
-    def __init__(self, data, rotation, output_dir, timeout):
+    def __init__(self, data, rotation, output_dir, timeout, incremental=False, strategy="linear",
+                 threads=1, encoding="z3", external=None, anytime=False, budget=None, symmetry=tuple(RULES)):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Please select a SAT encoding between {', '.join(ENCODINGS)}.")
+        for rule in symmetry:
+            if rule not in RULES:
+                raise ValueError(f"Please select symmetry breaking rules between {', '.join(RULES)}.")
+        if external is not None and encoding != "cnf":
+            raise ValueError("An external SAT solver requires the cnf encoding.")
         self.data = data
         self.rotation = rotation
         if output_dir == "":
@@ -18,49 +31,243 @@ class SATsolver:
                 output_dir = "./sat/out/no_rot"
         self.output_dir = output_dir
         self.timeout = timeout
+        self.incremental = incremental
+        self.strategy = strategy
+        self.threads = threads
+        # With the cnf encoding the clauses are generated as integer arrays and solved by z3 or by an external solver
+        self.encoding = encoding
+        self.external = external
+        # Symmetry breaking rules of both the encodings, see symmetry.py
+        self.symmetry = list(symmetry)
+        self.anytime = anytime
+        self.budget = budget
+        self.instance_budget = None
+        self.height_stats = []
 
     def solve(self):
         solutions = []
         for d in self.data:
-            solution = self.solve_instance(d)
             ins_num = d[0]
-            if solution[0]:
-                write_solution(self.output_dir, ins_num, solution[0], solution[1])
-            else:
-                print(print(f'{ins_num})', (None, 0), 0))
+            with Run(d, self.rotation, self.timeout, self.budget, self.anytime, self.output_dir) as run:
+                self.instance_budget = run.budget
+                solution = self.solve_instance(run)
+                self.print_height_stats(ins_num)
+                if solution[0]:
+                    write_solution(self.output_dir, ins_num, solution[0], solution[1])
+                else:
+                    print(print(f'{ins_num})', (None, 0), 0))
             solutions.append((ins_num, solution[0], solution[1]))
         return solutions
 
-    def solve_instance(self, instance):
+    def solve_instance(self, run):
+        instance = run.instance
         _, self.max_width, self.circuits = instance
         self.circuits_num = len(self.circuits)
 
-        self.w, self.h = ([i for i, _ in self.circuits], [j for _, j in self.circuits])
-
-        lower_bound = int(round(sum([self.h[i] * self.w[i] for i in range(self.circuits_num)]) / self.max_width))
-        upper_bound = sum(self.h) - min(self.h)
+        self.w, self.h = instance.w.tolist(), instance.h.tolist()
+        lower_bound, incumbent = run.lower_bound, run.incumbent
+
+        # Each entry is (plate_height, encode_time, solve_time, result) for one tried height
+        self.height_stats = []
+        self.start_time = time.time()
+
+        # The incremental models are encoded up to the height of the incumbent, which confirms the optimality proofs
+        if self.encoding == "cnf":
+            check = self.encode_cnf_incremental(lower_bound, incumbent[0][1]) if self.incremental \
+                else self.check_height_cnf
+        elif self.incremental:
+            check = self.encode_incremental(lower_bound, incumbent[0][1])
+        else:
+            check = self.check_height
+
+        solution = run.result(*search(self.strategy, lower_bound, run.upper_bound, check, incumbent, run.stream))
+        if solution is None:
+            return None, 0
+        return solution, time.time() - self.start_time
+
+    def check_height(self, plate_height):
+        """Encodes the model from scratch for the given plate height and solves it"""
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+
+        encode_time = time.time()
+        try:
+            with self.instance_budget.span("encode"):
+                self.sol = Solver()
+                self.sol.set(threads=self.threads)
+                if not self.rotation:
+                    px, py = self.set_constraints(plate_height)
+                    r = None
+                else:
+                    px, py, r = self.set_constraints_rotation(plate_height)
+        except TimeoutError:
+            return UNKNOWN, None
+        self.count_assertions()
+        encode_time = time.time() - encode_time
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        # Only the time left by the previous heights and the encoding
+        self.sol.set(timeout=self.instance_budget.milliseconds())
+
+        solve_time = time.time()
+        with self.instance_budget.span("solve"):
+            result = self.sol.check()
+        self.height_stats.append((plate_height, encode_time, time.time() - solve_time, result))
+        if result == sat:
+            return SAT, ((self.max_width, plate_height), self.evaluate(px, py, r))
+        return str(result), None
+
+    def encode_incremental(self, lower_bound, upper_bound):
+        """Returns a check function which encodes the model once at the upper bound, on its first call, and then
+        tightens the plate height through assumption literals, so that the clauses learned while refuting a height are
+        kept for the next ones"""
+        model = []
+
+        def encode():
+            encode_time = time.time()
+            with self.instance_budget.span("encode"):
+                self.sol = Solver()
+                self.sol.set(threads=self.threads)
+                # The symmetry breaking must hold for all the heights tried with the assumptions
+                if not self.rotation:
+                    px, py = self.set_constraints(upper_bound, fixed_height=False)
+                    r = None
+                else:
+                    px, py, r = self.set_constraints_rotation(upper_bound, fixed_height=False)
+                ph = self.set_height_literals(py, r, lower_bound, upper_bound)
+            self.count_assertions()
+            model.extend([px, py, r, ph])
+            # The whole encoding is paid only by the first height
+            return time.time() - encode_time
+
+        def check(plate_height):
+            try:
+                encode_time = 0 if model else encode()
+            except TimeoutError:
+                return UNKNOWN, None
+            px, py, r, ph = model
+
+            if self.instance_budget.expired():
+                return UNKNOWN, None
+            self.sol.set(timeout=self.instance_budget.milliseconds())
 
-        start_time = time.time()
-        for plate_height in range(lower_bound, upper_bound + 1):
-            self.sol = Solver()
-            self.sol.set(timeout=self.timeout * 1000)
-            if not self.rotation:
-                px, py = self.set_constraints(plate_height)
-                r = None
-            else:
-                px, py, r = self.set_constraints_rotation(plate_height)
+            solve_time = time.time()
+            with self.instance_budget.span("solve"):
+                result = self.sol.check(ph[plate_height - lower_bound])
+            self.height_stats.append((plate_height, encode_time, time.time() - solve_time, result))
+            if result == sat:
+                return SAT, ((self.max_width, plate_height), self.evaluate(px, py, r))
+            return str(result), None
+
+        return check
+
+    def count_assertions(self):
+        if profiling.active():
+            profiling.count("assertions", len(self.sol.assertions()))
+
+    def cnf_backend(self, formula):
+        profiling.count("variables", formula.num_vars)
+        profiling.count("clauses", formula.num_clauses)
+        with self.instance_budget.span("load"):
+            if self.external is not None:
+                return cnf.ExternalBackend(formula, self.instance_budget.remaining(), self.external)
+            return cnf.Z3Backend(formula, self.instance_budget.remaining(), self.threads)
+
+    def encode_cnf(self, formula, plate_height, fixed_height=True):
+        if not self.rotation:
+            px, py = cnf.encode(formula, self.w, self.h, self.max_width, plate_height, self.symmetry, fixed_height)
+            return px, py, None
+        return cnf.encode_rotation(formula, self.w, self.h, self.max_width, plate_height, self.symmetry, fixed_height)
+
+    def check_height_cnf(self, plate_height):
+        """Same as check_height, with the clauses generated directly as integers"""
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+
+        encode_time = time.time()
+        formula = cnf.CNF()
+        with self.instance_budget.span("encode"):
+            px, py, r = self.encode_cnf(formula, plate_height)
+        backend = self.cnf_backend(formula)
+        encode_time = time.time() - encode_time
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        backend.set_timeout(self.instance_budget.remaining())
+
+        solve_time = time.time()
+        with self.instance_budget.span("solve"):
+            result, values = backend.check()
+        self.height_stats.append((plate_height, encode_time, time.time() - solve_time, result))
+        if result == SAT:
+            return SAT, ((self.max_width, plate_height), self.evaluate_cnf(values, px, py, r))
+        return result, None
+
+    def encode_cnf_incremental(self, lower_bound, upper_bound):
+        """Same as encode_incremental, with the clauses generated directly as integers. An external solver is run
+        again for each height, with the height literal added as a unit clause"""
+        model = []
+
+        def encode():
+            encode_time = time.time()
+            formula = cnf.CNF()
+            with self.instance_budget.span("encode"):
+                px, py, r = self.encode_cnf(formula, upper_bound, fixed_height=False)
+                ph = cnf.encode_height_literals(formula, py, self.h, lower_bound, upper_bound, r, self.w)
+            model.extend([self.cnf_backend(formula), px, py, r, ph])
+            return time.time() - encode_time
+
+        def check(plate_height):
+            encode_time = 0 if model else encode()
+            backend, px, py, r, ph = model
+
+            if self.instance_budget.expired():
+                return UNKNOWN, None
+            backend.set_timeout(self.instance_budget.remaining())
 
             solve_time = time.time()
-            if self.sol.check() == sat:
-                circuits_pos = self.evaluate(px, py, r)
-                return ((self.max_width, plate_height), circuits_pos), (time.time() - solve_time)
-            else:
-                try_timeout = round((self.timeout - (time.time() - start_time)))
-                if try_timeout < 0:
-                    return None, 0
-        return None, 0
+            with self.instance_budget.span("solve"):
+                result, values = backend.check([ph[plate_height - lower_bound]])
+            self.height_stats.append((plate_height, encode_time, time.time() - solve_time, result))
+            if result == SAT:
+                return SAT, ((self.max_width, plate_height), self.evaluate_cnf(values, px, py, r))
+            return result, None
+
+        return check
+
+    def set_height_literals(self, py, r, lower_bound, upper_bound):
+        """Adds a literal ph_k for each height k in [lower_bound, upper_bound] meaning that the plate height is at
+        most k, i.e. every circuit has y <= k - h. Assuming ph_k restricts the model encoded at upper_bound to k."""
+        ph = [Bool(f"ph_{k}") for k in range(lower_bound, upper_bound + 1)]
+
+        for k in range(lower_bound, upper_bound + 1):
+            lit = ph[k - lower_bound]
+            # ph_k -> ph_{k+1}
+            if k < upper_bound:
+                self.sol.add(Or(Not(lit), ph[k + 1 - lower_bound]))
 
-    def set_constraints(self, plate_height, symmetry_breaking=False):
+            for i in range(self.circuits_num):
+                if r is None:
+                    self.sol.add(self.height_clause(lit, py[i], k - self.h[i], upper_bound))
+                else:
+                    # The height of the circuit depends on its rotation
+                    self.sol.add(Or(r[i], self.height_clause(lit, py[i], k - self.h[i], upper_bound)))
+                    self.sol.add(Or(Not(r[i]), self.height_clause(lit, py[i], k - self.w[i], upper_bound)))
+        return ph
+
+    @staticmethod
+    def height_clause(lit, py, max_y, upper_bound):
+        # lit -> y <= max_y, which is false when the circuit does not fit in the plate
+        if max_y < 0:
+            return Not(lit)
+        if max_y >= upper_bound:
+            return True
+        return Or(Not(lit), py[max_y])
+
+    def print_height_stats(self, ins_num):
+        for plate_height, encode_time, solve_time, result in self.height_stats:
+            print(f'{ins_num}) height {plate_height}: encode {encode_time:.3f}s, solve {solve_time:.3f}s, {result}')
+
+    def set_constraints(self, plate_height, fixed_height=True):
 
         # Variables
         px = [[Bool(f"px{i + 1}_{x}") for x in range(self.max_width)] for i in range(self.circuits_num)]
@@ -94,6 +301,8 @@ class SATsolver:
                 self.sol.add(py[i][f])
 
         for i in range(self.circuits_num):
+            # The encoding is stopped at the deadline of the instance
+            self.instance_budget.check()
             for j in range(self.circuits_num):
                 if i != j:
                     # lr_{i,j} -> xj > wi, lower bound for xj
@@ -112,45 +321,10 @@ class SATsolver:
                     for f in range(plate_height - self.h[j]):
                         self.sol.add(Or(Not(ud[j][i]), py[j][f], Not(py[i][f + self.h[j]])))
 
-        if symmetry_breaking:
-            # domain reduction constraint
-            # find maximum rectangle by area:
-            m = 0
-            for i in range(1, self.circuits_num):
-                if self.w[i] * self.h[i] > self.w[m] * self.h[m]:
-                    m = i
-
-            for i in range(int(np.floor((self.max_width - self.w[m]) / 2))):
-                self.sol.add(Not(px[m][i]))
-
-            for j in range(int(np.floor((plate_height - self.h[m]) / 2))):
-                self.sol.add(Not(py[m][j]))
-
-            for i in range(self.circuits_num):
-                if i != m:
-                    if self.w[i] > np.ceil((self.max_width - self.w[m]) / 2):
-                        self.sol.add(Not(lr[m][i]))
-                    if self.h[i] > np.ceil((plate_height - self.h[m]) / 2):
-                        self.sol.add(Not(ud[m][i]))
-
-            # Large rectangle constraints
-            for (i, j) in itertools.combinations(range(self.circuits_num), 2):
-                if self.w[i] + self.w[j] > self.max_width:
-                    self.sol.add(Not(lr[i][j]))
-                    self.sol.add(Not(lr[j][i]))
-                if self.h[i] + self.h[j] > plate_height:
-                    self.sol.add(Not(ud[i][j]))
-                    self.sol.add(Not(ud[j][i]))
-
-            # Same size rectangles
-            for (i, j) in itertools.combinations(range(self.circuits_num), 2):
-                if self.w[i] == self.w[j] and self.h[i] == self.h[j]:
-                    self.sol.add(Not(lr[j][i]))
-                    self.sol.add(Or(Not(ud[j][i]), lr[i][j]))
+        self.break_symmetries(plate_height, px, py, lr, ud, None, fixed_height)
         return px, py
 
-    def set_constraints_rotation(self, plate_height, symmetry_breaking=False):
-        # print(self.max_width)
+    def set_constraints_rotation(self, plate_height, fixed_height=True):
         # Variables
         px = [[Bool(f"px{i + 1}_{x}") for x in range(self.max_width)] for i in range(self.circuits_num)]
         py = [[Bool(f"py{i + 1}_{y}") for y in range(plate_height)] for i in range(self.circuits_num)]
@@ -164,139 +338,92 @@ class SATsolver:
 
         r = [Bool(f"r_{i + 1}") for i in range(self.circuits_num)]
 
+        # Order encoding of the right and top edges: rx_i_v means x_i + width_i <= v, where the width depends on the
+        # rotation. Only the clauses linking them to px and py depend on r, the non overlapping ones are shared.
+        rx = [[Bool(f"rx{i + 1}_{x}") for x in range(self.max_width + 1)] for i in range(self.circuits_num)]
+        ry = [[Bool(f"ry{i + 1}_{y}") for y in range(plate_height + 1)] for i in range(self.circuits_num)]
+
         # Each pair of block cannot overlap
         for i in range(self.circuits_num):
             for j in range(i + 1, self.circuits_num):
                 self.sol.add(Or(lr[i][j], lr[j][i], ud[i][j], ud[j][i]))
 
-        # Clauses due to order encoding
         for i in range(self.circuits_num):
-            if self.h[i] <= self.max_width:
-                self.sol.add(
-                    Or(And(Not(r[i]), *[Or(Not(px[i][e]), px[i][e + 1]) for e in range(self.max_width - self.w[i])]),
-                       And(r[i], *[Or(Not(px[i][e]), px[i][e + 1]) for e in range(self.max_width - self.h[i])])))
-
-                self.sol.add(
-                    Or(And(Not(r[i]), *[Or(Not(py[i][f]), py[i][f + 1]) for f in range(plate_height - self.h[i])]),
-                       And(r[i], *[Or(Not(py[i][f]), py[i][f + 1]) for f in range(plate_height - self.w[i])])))
+            self.edge_clauses(px[i], rx[i], r[i], self.w[i], self.h[i], self.max_width)
+            self.edge_clauses(py[i], ry[i], r[i], self.h[i], self.w[i], plate_height)
 
-                # Implicit clauses also due to order encoding
-                self.sol.add(Or(And(Not(r[i]), *[px[i][e] for e in range(self.max_width - self.w[i], self.max_width)]),
-                                And(r[i], *[px[i][e] for e in range(self.max_width - self.h[i], self.max_width)])))
-
-                self.sol.add(Or(And(Not(r[i]), *[py[i][f] for f in range(plate_height - self.h[i], plate_height)]),
-                                And(r[i], *[py[i][f] for f in range(plate_height - self.w[i], plate_height)])))
-            else:
-                self.sol.add(Not(r[i]))
-                self.sol.add(*[Or(Not(px[i][e]), px[i][e + 1]) for e in range(self.max_width - self.w[i])])
-                self.sol.add(*[Or(Not(py[i][f]), py[i][f + 1]) for f in range(self.max_width - self.h[i])])
-                # Implicit clauses also due to order encoding
-                self.sol.add(*[px[i][e] for e in range(self.max_width - self.w[i], self.max_width)])
-                self.sol.add(*[py[i][f] for f in range(self.max_width - self.h[i], plate_height)])
-
-        # Some cases in which rotation is not possible or useful.
         # If the circuit is a square then it's useless to consider also its rotation.
         self.sol.add([Not(r[i]) for i in range(self.circuits_num) if self.w[i] == self.h[i]])
-        # If the height of a circuit is higher than the plate's width ==> Rotation is not possible
-        self.sol.add([Not(r[i]) for i in range(self.circuits_num) if self.h[i] > self.max_width])
-        # If the width of a circuit is higher than the plate's height ==> Rotation is not possible
-        self.sol.add([Not(r[i]) for i in range(self.circuits_num) if self.w[i] > plate_height])
 
         for i in range(self.circuits_num):
+            self.instance_budget.check()
             for j in range(self.circuits_num):
                 if i != j:
-                    if self.h[i] <= self.max_width:
-                        self.sol.add(Or(And(Not(r[i]), Or(Not(lr[i][j]), Not(px[j][self.w[i] - 1]))),
-                                        And(r[i], Or(Not(lr[i][j]), Not(px[j][self.h[i] - 1])))))
-
-                        # under(ri,rj)-> yj > hi, lower bound for yj
-                        self.sol.add(Or(And(Not(r[i]), Or(Not(ud[i][j]), Not(py[j][self.h[i] - 1]))),
-                                        And(r[i], Or(Not(ud[i][j]), Not(py[j][self.w[i] - 1])))))
-
-                        # 3-literals clauses for non overlapping, shown in the paper
-                        self.sol.add(Or(And(Not(r[i]), *[Or(Not(lr[i][j]), px[i][e], Not(px[j][e + self.w[i]])) for e in
-                                                         range(self.max_width - self.w[i])]),
-                                        And(r[i], *[Or(Not(lr[i][j]), px[i][e], Not(px[j][e + self.h[i]])) for e in
-                                                    range(self.max_width - self.h[i])])))
-
-                        self.sol.add(Or(And(Not(r[j]), *[Or(Not(lr[j][i]), px[j][e], Not(px[i][e + self.w[j]])) for e in
-                                                         range(self.max_width - self.w[j])]),
-                                        And(r[j], *[Or(Not(lr[j][i]), px[j][e], Not(px[i][e + self.h[j]])) for e in
-                                                    range(self.max_width - self.h[j])])))
-
-                        self.sol.add(Or(And(Not(r[i]),
-                                            *[Or(Not(ud[i][j]), py[i][f], Not(py[j][f + self.h[i]])) for f in
-                                              range(plate_height - self.h[i])]),
-                                        And(r[i], *[Or(Not(ud[i][j]), py[i][f], Not(py[j][f + self.w[i]])) for f in
-                                                    range(plate_height - self.w[i])])))
-
-                        self.sol.add(Or(And(Not(r[j]),
-                                            *[Or(Not(ud[j][i]), py[j][f], Not(py[i][f + self.h[j]])) for f in
-                                              range(plate_height - self.h[j])]),
-                                        And(r[j], *[Or(Not(ud[j][i]), py[j][f], Not(py[i][f + self.w[j]])) for f in
-                                                    range(plate_height - self.w[j])])))
-
-                    else:
-                        # lr(i,j) -> xj > wi, lower bound for xj
-                        self.sol.add(Or(Not(lr[i][j]), Not(px[j][self.w[i] - 1])))
-                        # ud(ri,rj)-> yj > hi, lower bound for yj
-                        self.sol.add(Or(Not(ud[i][j]), Not(py[j][self.h[i] - 1])))
-                        # 3-literals clauses for non overlapping, shown in the paper
-                        self.sol.add(*[Or(Not(lr[i][j]), px[i][e], Not(px[j][e + self.w[i]])) for e in
-                                       range(self.max_width - self.w[i])])
-
-                        self.sol.add(*[Or(Not(lr[j][i]), px[j][e], Not(px[i][e + self.w[j]])) for e in
-                                       range(self.max_width - self.w[j])])
-
-                        self.sol.add(*[Or(Not(ud[i][j]), py[i][f], Not(py[j][f + self.h[i]])) for f in
-                                       range(plate_height - self.h[i])])
-
-                        self.sol.add(*[Or(Not(ud[j][i]), py[j][f], Not(py[i][f + self.h[j]])) for f in
-                                       range(plate_height - self.h[j])])
-
-        if symmetry_breaking:
-            # domain reduction constraint
-            # find maximum rectangle by area:
-            m = 0
-            for i in range(1, self.circuits_num):
-                if self.w[i] * self.h[i] > self.w[m] * self.h[m]:
-                    m = i
-
-            if self.h[m] <= self.max_width:
-                self.sol.add(
-                    Or(And(r[m], *[Not(px[m][i]) for i in range(int(np.floor((self.max_width - self.h[m]) / 2)))]),
-                       And(Not(r[m]),
-                           *[Not(px[m][i]) for i in range(int(np.floor((self.max_width - self.w[m]) / 2)))])))
-
-                self.sol.add(
-                    Or(And(r[m], *[Not(py[m][j]) for j in range(int(np.floor((plate_height - self.w[m]) / 2)))]),
-                       And(Not(r[m]), *[Not(py[m][j]) for j in range(int(np.floor((plate_height - self.h[m]) / 2)))])))
-            else:
-                self.sol.add(And(*[Not(px[m][i]) for i in range(int(np.floor((self.max_width - self.w[m]) / 2)))]))
-                self.sol.add(And(*[Not(py[m][j]) for j in range(int(np.floor((plate_height - self.h[m]) / 2)))]))
+                    # lr_{i,j} and xj <= e -> xi + width_i <= e, which also gives the lower bound of xj
+                    for e in range(self.max_width):
+                        self.sol.add(Or(Not(lr[i][j]), Not(px[j][e]), rx[i][e]))
+                    for f in range(plate_height):
+                        self.sol.add(Or(Not(ud[i][j]), Not(py[j][f]), ry[i][f]))
+
+        self.break_symmetries(plate_height, px, py, lr, ud, r, fixed_height)
         return px, py, r
 
+    def break_symmetries(self, plate_height, px, py, lr, ud, r, fixed_height):
+        """Adds the clauses of the selected symmetry breaking rules, see symmetry.py. fixed_height is false when the
+        model is encoded at an upper bound of the plate height"""
+        self.sol.add([Or(clause) for clause in breaking_clauses(self.symmetry, Not, self.w, self.h, self.max_width,
+                                                                plate_height, px, py, lr, ud, r, fixed_height)])
+
+    def edge_clauses(self, p, e, r, size, rotated_size, length):
+        """Links the order literals p of a coordinate to the ones e of the edge at coordinate + size, where size is the
+        one of the orientation given by r. The edge must be inside the plate."""
+        for v in range(length - 1):
+            self.sol.add(Or(Not(p[v]), p[v + 1]))
+        # Implied by the order of p, but they help the propagation
+        for v in range(length):
+            self.sol.add(Or(Not(e[v]), e[v + 1]))
+        self.sol.add(e[length])
+
+        for orientation, s in ((r, size), (Not(r), rotated_size)):
+            # orientation is false when the circuit is placed with size s
+            for v in range(length + 1):
+                if v < s:
+                    self.sol.add(Or(orientation, Not(e[v])))
+                else:
+                    self.sol.add(Or(orientation, Not(e[v]), p[v - s]))
+                    self.sol.add(Or(orientation, e[v], Not(p[v - s])))
+
     def evaluate(self, px, py, r):
+        with self.instance_budget.span("decode"):
+            return self.evaluate_model(px, py, r)
+
+    def evaluate_model(self, px, py, r):
         m = self.sol.model()
         circuits_pos = []
         xs = []
         ys = []
         for i in range(self.circuits_num):
             for e in range(len(px[i])):
-                if m.evaluate(px[i][e]):
+                if m.evaluate(px[i][e], model_completion=True):
                     xs.append(e)
                     break
             for f in range(len(py[i])):
-                if m.evaluate(py[i][f]):
+                if m.evaluate(py[i][f], model_completion=True):
                     ys.append(f)
                     break
 
         for i, (x, y) in enumerate(zip(xs, ys)):
-            if r and not m.evaluate(r[i]):
+            if r and not m.evaluate(r[i], model_completion=True):
                 circuits_pos.append((self.w[i], self.h[i], x, y))
-            elif r and m.evaluate(r[i]):
+            elif r and m.evaluate(r[i], model_completion=True):
                 circuits_pos.append((self.h[i], self.w[i], x, y))
             else:
                 circuits_pos.append((self.w[i], self.h[i], x, y))
 
         return circuits_pos
+
+    def evaluate_cnf(self, values, px, py, r):
+        with self.instance_budget.span("decode"):
+            xs, ys, rotated = cnf.decode(values, px, py, r)
+        return [(self.h[i], self.w[i], x, y) if rotated[i] else (self.w[i], self.h[i], x, y)
+                for i, (x, y) in enumerate(zip(xs, ys))]
@@ -0,0 +1,78 @@
+"""Symmetry breaking clauses shared by the z3 and the cnf encodings of the SAT solver.
+
+The clauses are lists of literals built on the variables of the encodings: the order variables px[i][v] (x_i <= v) and
+py[i][v], the relations lr[i][j] (i at the left of j) and ud[i][j] (i below j) and, with rotation, r[i] (i rotated).
+neg returns the negation of a literal, Not for z3 and - for the integers of cnf.py. With rotation every clause which
+depends on the shape of a circuit is guarded by its orientation. The rules, from Soh et al., can be selected one by one:
+- domain: the largest circuit without identical ones is placed in the top right quarter of the plate, any packing can
+  be mirrored to get there, so the circuits too wide to fit at its right, or too high to fit above it, are not there;
+- large: two circuits which are too wide to be side by side, or too high to be one above the other, cannot be in
+  that relation;
+- same: the identical circuits, with rotation the ones identical up to rotation, are ordered so that each one is at the
+  left of or below the next ones. Any packing can be relabeled so, following the order of its circuits in the second
+  sequence of its sequence pair, so the rule orders the whole multiset of identical circuits at once.
+The domain rule along y depends on the plate height, it is skipped when the model is encoded at an upper bound and then
+tightened, see SATsolver.encode_incremental. The large rule is still valid there, with the upper bound.
+"""
+from presolve import identical_groups
+
+RULES = ["domain", "large", "same"]
+
+
+def parse_rules(text):
+    """Parses a comma separated list of rules, none selects no rule. Raises ValueError for unknown rules"""
+    rules = [] if text == "none" else text.split(",")
+    for rule in rules:
+        if rule not in RULES:
+            raise ValueError(f"Please select symmetry breaking rules between {', '.join(RULES)} or none.")
+    return rules
+
+
+def orientations(i, w, h, r, neg):
+    """Returns the (guard, width, height) of each orientation of the circuit i, where guard are the literals of a clause
+    satisfied when the circuit has another orientation"""
+    if r is None or w[i] == h[i]:
+        return [([], w[i], h[i])]
+    return [([r[i]], w[i], h[i]), ([neg(r[i])], h[i], w[i])]
+
+
+def breaking_clauses(rules, neg, w, h, width, height, px, py, lr, ud, r=None, fixed_height=True):
+    """Returns the symmetry breaking clauses of the rules for a model encoded with the given plate height"""
+    n = len(w)
+    groups = identical_groups(w, h, r is not None) if "same" in rules else []
+    result = []
+
+    if "domain" in rules:
+        grouped = {i for group in groups for i in group}
+        candidates = [i for i in range(n) if i not in grouped]
+        if candidates:
+            m = max(candidates, key=lambda i: w[i] * h[i])
+            for guard_m, wm, hm in orientations(m, w, h, r, neg):
+                result += [guard_m + [neg(px[m][v])] for v in range((width - wm) // 2)]
+                if fixed_height:
+                    result += [guard_m + [neg(py[m][v])] for v in range((height - hm) // 2)]
+                for i in range(n):
+                    if i == m:
+                        continue
+                    for guard_i, wi, hi in orientations(i, w, h, r, neg):
+                        if wi > -(-(width - wm) // 2):
+                            result.append(guard_m + guard_i + [neg(lr[m][i])])
+                        if fixed_height and hi > -(-(height - hm) // 2):
+                            result.append(guard_m + guard_i + [neg(ud[m][i])])
+
+    if "large" in rules:
+        for i in range(n):
+            for j in range(i + 1, n):
+                for guard_i, wi, hi in orientations(i, w, h, r, neg):
+                    for guard_j, wj, hj in orientations(j, w, h, r, neg):
+                        if wi + wj > width:
+                            result += [guard_i + guard_j + [neg(lr[i][j])], guard_i + guard_j + [neg(lr[j][i])]]
+                        if hi + hj > height:
+                            result += [guard_i + guard_j + [neg(ud[i][j])], guard_i + guard_j + [neg(ud[j][i])]]
+
+    for group in groups:
+        for a, i in enumerate(group):
+            for j in group[a + 1:]:
+                # j is not at the left of i, and when j is below i, i is also at its left
+                result += [[neg(lr[j][i])], [neg(ud[j][i]), lr[i][j]]]
+    return result
@@ -0,0 +1,124 @@
+"""Plate height search strategies shared by the decision based solvers (SAT, SMT and SMT-LIB)"""
+
+SAT = "sat"
+UNSAT = "unsat"
+UNKNOWN = "unknown"
+
+
+def solution_height(solution):
+    """Returns the height actually used by the circuits of a solution"""
+    _, circuits_pos = solution
+    return max(y + h for _, h, _, y in circuits_pos)
+
+
+def tighten(solution):
+    """Returns the solution with the plate height set to the height actually used by its circuits"""
+    (plate_width, _), circuits_pos = solution
+    return (plate_width, solution_height(solution)), circuits_pos
+
+
+def linear_search(lower_bound, upper_bound, check):
+    """Tries every height from the lower bound upwards, the first satisfiable one is the optimum"""
+    for plate_height in range(lower_bound, upper_bound + 1):
+        status, solution = check(plate_height)
+        if status == SAT:
+            return solution, True
+        if status == UNKNOWN:
+            return None, False
+    return None, True
+
+
+def binary_search(lower_bound, upper_bound, check):
+    """Bisects the interval of heights, so that only logarithmically many checks are needed"""
+    best = None
+    while lower_bound <= upper_bound:
+        plate_height = (lower_bound + upper_bound) // 2
+        status, solution = check(plate_height)
+        if status == SAT:
+            best = tighten(solution)
+            upper_bound = best[0][1] - 1
+        elif status == UNSAT:
+            lower_bound = plate_height + 1
+        else:
+            return best, False
+    return best, True
+
+
+def descending_search(lower_bound, upper_bound, check):
+    """Solves once at the upper bound, then keeps asking for a plate lower than the best solution found"""
+    best = None
+    plate_height = upper_bound
+    while plate_height >= lower_bound:
+        status, solution = check(plate_height)
+        if status == SAT:
+            best = tighten(solution)
+            plate_height = best[0][1] - 1
+        elif status == UNSAT:
+            return best, True
+        else:
+            return best, False
+    return best, True
+
+
+OPTIMIZE = "optimize"
+
+STRATEGIES = {
+    "linear": linear_search,
+    "binary": binary_search,
+    "descending": descending_search,
+}
+
+
+def improving(check, on_improve):
+    """Returns the check function calling on_improve with each solution found"""
+    def check_and_report(plate_height):
+        status, solution = check(plate_height)
+        if status == SAT:
+            on_improve(tighten(solution))
+        return status, solution
+    return check_and_report
+
+
+def search(strategy, lower_bound, upper_bound, check, incumbent=None, on_improve=None):
+    """Searches the minimum plate height using the strategy with the given name. check(plate_height) returns a pair
+    (status, solution), the search returns the best solution and whether it is proven optimal. Only the heights below
+    the incumbent are tried, and on_improve is called with each solution found"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown search strategy {strategy}, select one between {', '.join(STRATEGIES)}.")
+    if incumbent is not None:
+        incumbent = tighten(incumbent)
+        upper_bound = min(upper_bound, incumbent[0][1] - 1)
+    confirm = check
+    if on_improve is not None:
+        if incumbent is not None:
+            on_improve(incumbent)
+        check = improving(check, on_improve)
+    solution, optimal = STRATEGIES[strategy](lower_bound, upper_bound, check)
+    if solution is None:
+        if optimal and incumbent is not None and lower_bound <= upper_bound:
+            # A model unsatisfiable at every height, e.g. with wrong symmetry breaking, must not prove the incumbent
+            optimal = confirm(incumbent[0][1])[0] == SAT
+        return incumbent, optimal
+    return solution, optimal
+
+
+def optimize(lower_bound, upper_bound, minimize, incumbent=None, on_improve=None):
+    """Same as search, for a function minimize(lower_bound, upper_bound) which minimizes the plate height within the
+    bounds in a single call. It returns a pair (status, solution) where SAT means that the solution is optimal, UNSAT
+    that no height within the bounds fits and UNKNOWN (e.g. timeout) may come with the best solution found"""
+    if incumbent is not None:
+        incumbent = tighten(incumbent)
+        upper_bound = min(upper_bound, incumbent[0][1] - 1)
+        if on_improve is not None:
+            on_improve(incumbent)
+    status, solution = minimize(lower_bound, upper_bound) if lower_bound <= upper_bound else (UNSAT, None)
+    if solution is None:
+        if status == UNSAT and incumbent is not None and lower_bound <= upper_bound:
+            # As in search, the model must accept the height of the incumbent
+            height = incumbent[0][1]
+            status = SAT if minimize(height, height)[0] == SAT else UNKNOWN
+        return incumbent, status in (SAT, UNSAT)
+    solution = tighten(solution)
+    if on_improve is not None:
+        on_improve(solution)
+    return solution, status == SAT
@@ -1,19 +1,54 @@
 import time
 
-import numpy as np
-from z3 import And, Or, sat, Sum, IntVector, Tactic, Implies, If
+from z3 import And, Or, sat, unknown, Sum, IntVector, Tactic, Implies, If, BitVec, BitVecVal, ULE, ULT, Optimize, \
+    Z3Exception
 
+from anytime import Run
+from presolve import identical_groups
+import profiling
+from search import search, optimize, OPTIMIZE, SAT, UNKNOWN
 from utils import write_solution
 
+# Theories of the positions: unbounded integers solved by the auflia tactic, or fixed width bit-vectors bit-blasted to
+# SAT by the qfbv tactic
+ENCODINGS = ["lia", "bv"]
+# Strategies of the optimize mode: minimize makes the plate height the objective, which z3 tightens from above, core
+# makes each height below the upper bound a soft constraint, solved as MaxSAT by the core-guided maxres engine
+OPTIMIZE_MODES = ["minimize", "core"]
+
+
+def biggest_pair(widths, heights, rotation=False):
+    """Returns the two biggest circuits which have no identical ones, the biggest first, None when there are not two.
+    Ordering them is sound together with the ordering of the identical circuits: a packing is mirrored to order the
+    pair, then its identical circuits are relabeled without moving the pair"""
+    grouped = {i for group in identical_groups(widths, heights, rotation) for i in group}
+    candidates = sorted((i for i in range(len(widths)) if i not in grouped), key=lambda i: -widths[i] * heights[i])
+    return tuple(candidates[:2]) if len(candidates) > 1 else None
+
 
 class SMTsolver:
 
-    def __init__(self, data, output_dir, timeout):
+    def __init__(self, data, output_dir, timeout, strategy="linear", threads=4, anytime=False, budget=None,
+                 encoding="lia", optimize_mode="minimize"):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Please select a SMT encoding between {', '.join(ENCODINGS)}.")
+        if optimize_mode not in OPTIMIZE_MODES:
+            raise ValueError(f"Please select an optimize mode between {', '.join(OPTIMIZE_MODES)}.")
         self.data = data
         if output_dir == "":
             output_dir = "./smt/out/no_rot"
         self.output_dir = output_dir
         self.timeout = timeout
+        self.strategy = strategy
+        self.optimize_mode = optimize_mode
+        self.threads = threads
+        self.rotation = False
+        self.anytime = anytime
+        self.budget = budget
+        self.instance_budget = None
+        self.encoding = encoding
+        # Width of the bit-vectors of the bv encoding, enough for every sum of the model
+        self.bits = None
 
         self.circuits_num = None
         self.circuits = None
@@ -27,85 +62,167 @@ class SMTsolver:
     def solve(self):
         solutions = []
         for d in self.data:
-            ins_num = d[0]
-            solutions.append(self.solve_instance(d, ins_num))
+            with Run(d, self.rotation, self.timeout, self.budget, self.anytime, self.output_dir) as run:
+                self.instance_budget = run.budget
+                solutions.append(self.solve_instance(run))
         return solutions
 
-    def solve_instance(self, instance, ins_num):
-        _, self.max_width, self.circuits = instance
+    def solve_instance(self, run):
+        ins_num = run.instance.num
+        _, self.max_width, self.circuits = run.instance
         self.circuits_num = len(self.circuits)
-        self.w = IntVector('widths', self.circuits_num)
-        self.h = IntVector('heights', self.circuits_num)
-
-        for i in range(self.circuits_num):
-            self.w[i], _ = self.circuits[i]
-            _, self.h[i] = self.circuits[i]
-
-        lower_bound = sum([self.h[i] * self.w[i] for i in range(self.circuits_num)]) // self.max_width
-        upper_bound = sum(self.h) - min(self.h)
-
-        for plate_height in range(lower_bound, upper_bound + 1):
-            self.sol = Tactic('auflia').solver()
-            self.sol.set(timeout=self.timeout * 1000)
-            self.sol.set(threads=4)
-
-            self.set_constraints(plate_height, self.w, self.h)
-
-            solve_time = time.time()
-            if self.sol.check() == sat:
-                spent_time = time.time() - solve_time
-                circuits_pos = self.evaluate()
-                write_solution(self.output_dir, ins_num, ((self.max_width, plate_height), circuits_pos),
-                               spent_time)
-                return ins_num, ((self.max_width, plate_height), circuits_pos), spent_time
+        widths, heights = run.instance.w.tolist(), run.instance.h.tolist()
+        # With rotation the sizes are replaced by the ones of the circuits in their orientation, see SMTsolverRot
+        self.w, self.h = list(widths), list(heights)
+
+        solve_time = time.time()
+        solution = run.result(*self.search(run.lower_bound, run.upper_bound, widths, heights, run.incumbent,
+                                           run.stream))
+        if solution is None:
+            write_solution(self.output_dir, ins_num, None, 0)
+            return ins_num, None, 0
+        spent_time = time.time() - solve_time
+        write_solution(self.output_dir, ins_num, solution, spent_time)
+        return ins_num, solution, spent_time
+
+    def search(self, lower_bound, upper_bound, widths, heights, incumbent, stream):
+        """Searches the minimum plate height with the strategy, or with a single call in optimize mode"""
+        if self.strategy == OPTIMIZE:
+            return optimize(lower_bound, upper_bound,
+                            lambda lower, upper: self.minimize_height(lower, upper, widths, heights), incumbent, stream)
+        return search(self.strategy, lower_bound, upper_bound,
+                      lambda plate_height: self.check_height(plate_height, widths, heights), incumbent, stream)
+
+    def minimize_height(self, lower_bound, upper_bound, widths, heights):
+        """Builds the model with the plate height as a variable within the bounds and minimizes it with the optimizer
+        of z3, which keeps its state across the bound improvements"""
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        with self.instance_budget.span("encode"):
+            self.sol = Optimize()
+            self.set_bits(upper_bound, widths, heights)
+            plate_height = self.vector('plate_height', 1)[0]
+            self.sol.add(self.le(lower_bound, plate_height), self.le(plate_height, upper_bound))
+            self.set_constraints(plate_height, widths, heights, upper_bound)
+            if self.optimize_mode == "core":
+                self.sol.set(maxsat_engine='maxres')
+                for k in range(lower_bound, upper_bound):
+                    self.sol.add_soft(self.le(plate_height, k))
             else:
-                try_timeout = round((self.timeout - (time.time() - solve_time)))
-                if try_timeout <= 0:
-                    write_solution(self.output_dir, ins_num, None, 0)
-                    return ins_num, None, 0
-        return ins_num, None, 0
-
-    def set_constraints(self, plate_height, widths, heights):
-
-        self.x_positions = IntVector('x_pos', self.circuits_num)
-        self.y_positions = IntVector('y_pos', self.circuits_num)
-
-        areas_index = np.argsort([self.h[i] * self.w[i] for i in range(self.circuits_num)])
-        areas_index = areas_index[::-1]
-        biggests = areas_index[0], areas_index[1]
+                self.sol.minimize(plate_height)
+        if profiling.active():
+            profiling.count("assertions", len(self.sol.assertions()))
+
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        self.sol.set(timeout=self.instance_budget.milliseconds())
+        with self.instance_budget.span("solve"):
+            result = self.sol.check()
+        if result == sat:
+            with self.instance_budget.span("decode"):
+                return SAT, ((self.max_width, upper_bound), self.evaluate())
+        if result == unknown:
+            # The best packing found before the timeout, if any
+            try:
+                with self.instance_budget.span("decode"):
+                    return UNKNOWN, ((self.max_width, upper_bound), self.evaluate())
+            except Z3Exception:
+                pass
+        return str(result), None
+
+    def check_height(self, plate_height, widths, heights):
+        """Builds the model for the given plate height and solves it within the time left to the instance"""
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        with self.instance_budget.span("encode"):
+            self.sol = Tactic('qfbv' if self.encoding == "bv" else 'auflia').solver()
+            self.sol.set(threads=self.threads)
+
+            self.set_constraints(plate_height, widths, heights)
+        if profiling.active():
+            profiling.count("assertions", len(self.sol.assertions()))
+
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        self.sol.set(timeout=self.instance_budget.milliseconds())
+        with self.instance_budget.span("solve"):
+            result = self.sol.check()
+        if result == sat:
+            with self.instance_budget.span("decode"):
+                return SAT, ((self.max_width, plate_height), self.evaluate())
+        return str(result), None
+
+    def set_bits(self, plate_height, widths, heights):
+        """Sizes the bit-vectors for the given plate height: a coordinate plus a size, and the sum of the sizes of all
+        the circuits in a row or a column, must not overflow"""
+        sizes = [max(w, h) for w, h in zip(widths, heights)]
+        self.bits = max(sum(sizes), max(self.max_width, plate_height) + max(sizes)).bit_length()
+
+    def vector(self, name, length):
+        if self.encoding == "bv":
+            return [BitVec(f"{name}__{i}", self.bits) for i in range(length)]
+        return IntVector(name, length)
+
+    def value(self, v):
+        """A constant of the encoding, e.g. for the branches of an If"""
+        return BitVecVal(v, self.bits) if self.encoding == "bv" else v
+
+    def le(self, a, b):
+        # The bit-vectors are compared as unsigned
+        return ULE(a, b) if self.encoding == "bv" else a <= b
+
+    def lt(self, a, b):
+        return ULT(a, b) if self.encoding == "bv" else a < b
+
+    def inside(self, position, size, length):
+        """The circuit of the given size at position is inside the segment [0, length]"""
+        if self.encoding == "bv":
+            # length - size wraps around when the size is larger than the length
+            return And(ULE(position, length), ULE(position + size, length))
+        return And(0 <= position, position <= length - size)
+
+    def set_constraints(self, plate_height, widths, heights, upper_bound=None):
+        """Adds the model for the given plate height, a variable bounded by upper_bound in optimize mode"""
+        upper_bound = plate_height if upper_bound is None else upper_bound
+        self.set_bits(upper_bound, widths, heights)
+        self.x_positions = self.vector('x_pos', self.circuits_num)
+        self.y_positions = self.vector('y_pos', self.circuits_num)
+
+        biggests = biggest_pair(self.w, self.h)
 
         # Constraints
 
         # Domains
-        self.sol.add([And(0 <= self.x_positions[i], self.x_positions[i] <= self.max_width - self.w[i])
-                      for i in range(self.circuits_num)])
+        self.sol.add([self.inside(self.x_positions[i], self.w[i], self.max_width) for i in range(self.circuits_num)])
 
-        self.sol.add([And(0 <= self.y_positions[i], self.y_positions[i] <= plate_height - self.h[i])
-                      for i in range(self.circuits_num)])
+        self.sol.add([self.inside(self.y_positions[i], self.h[i], plate_height) for i in range(self.circuits_num)])
 
         for i in range(1, self.circuits_num):
             for j in range(0, i):
                 # No Overlapping
-                self.sol.add(Or(Sum(self.y_positions[i], self.h[i]) <= self.y_positions[j],
-                                Sum(self.y_positions[j], self.h[j]) <= self.y_positions[i],
-                                Sum(self.x_positions[i], self.w[i]) <= self.x_positions[j],
-                                Sum(self.x_positions[j], self.w[j]) <= self.x_positions[i]))
+                self.sol.add(Or(self.le(Sum(self.y_positions[i], self.h[i]), self.y_positions[j]),
+                                self.le(Sum(self.y_positions[j], self.h[j]), self.y_positions[i]),
+                                self.le(Sum(self.x_positions[i], self.w[i]), self.x_positions[j]),
+                                self.le(Sum(self.x_positions[j], self.w[j]), self.x_positions[i])))
 
                 # Symmetry breaking: two rectangles with same dimensions
                 self.sol.add(Implies(And(self.w[i] == self.w[j], self.h[i] == self.h[j]),
-                                     Or(self.x_positions[j] > self.x_positions[i],
+                                     Or(self.lt(self.x_positions[i], self.x_positions[j]),
                                         And(self.x_positions[j] == self.x_positions[i],
-                                            self.y_positions[j] >= self.y_positions[i]))))
+                                            self.le(self.y_positions[i], self.y_positions[j])))))
 
         # Symmetry breaking : fix relative position of the two biggest rectangles
-        self.sol.add(Or(self.x_positions[biggests[1]] > self.x_positions[biggests[0]],
-                        And(self.x_positions[biggests[1]] == self.x_positions[biggests[0]],
-                            self.y_positions[biggests[1]] >= self.y_positions[biggests[0]])))
+        if biggests is not None:
+            self.sol.add(Or(self.lt(self.x_positions[biggests[0]], self.x_positions[biggests[1]]),
+                            And(self.x_positions[biggests[1]] == self.x_positions[biggests[0]],
+                                self.le(self.y_positions[biggests[0]], self.y_positions[biggests[1]]))))
 
         # Cumulative over columns
         for u in range(self.max_width):
-            self.sol.add(plate_height >= Sum([If(And(self.x_positions[i] <= u, u < Sum(self.x_positions[i], self.w[i])),
-                                                 self.h[i], 0) for i in range(self.circuits_num)]))
+            self.sol.add(self.le(Sum([If(And(self.le(self.x_positions[i], u),
+                                             self.lt(u, Sum(self.x_positions[i], self.w[i]))),
+                                         self.value(self.h[i]), self.value(0)) for i in range(self.circuits_num)]),
+                                 plate_height))
 
     def evaluate(self):
         x = [int(self.sol.model().evaluate(self.x_positions[i]).as_string()) for i in range(self.circuits_num)]
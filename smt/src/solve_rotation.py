@@ -1,62 +1,28 @@
-import time
+from z3 import BoolVector, If, And, Not, Or, Sum
 
-import numpy as np
-from z3 import IntVector, Tactic, sat, BoolVector, If, And, Not, Or, Sum
-
-from smt.src.solve import SMTsolver
-from utils import write_solution
+from smt.src.solve import SMTsolver, biggest_pair
 
 
 class SMTsolverRot(SMTsolver):
 
-    def __init__(self, data, output_dir, timeout):
-        super().__init__(data, output_dir, timeout)
+    def __init__(self, data, output_dir, timeout, strategy="linear", threads=4, anytime=False, budget=None,
+                 encoding="lia", optimize_mode="minimize"):
+        super().__init__(data, output_dir, timeout, strategy, threads, anytime, budget, encoding, optimize_mode)
+        self.rotation = True
         if output_dir == "":
             output_dir = "./smt/out/rot"
         self.output_dir = output_dir
 
-    def solve_instance(self, instance, ins_num):
-        _, self.max_width, self.circuits = instance
-        self.circuits_num = len(self.circuits)
-        self.w = IntVector('widths', self.circuits_num)
-        self.h = IntVector('heights', self.circuits_num)
-
-        widths, heights = ([i for i, _ in self.circuits], [j for _, j in self.circuits])
-
-        lower_bound = sum([heights[i] * widths[i] for i in range(self.circuits_num)]) // self.max_width
-        upper_bound = sum(heights) - min(heights)
-
-        for plate_height in range(lower_bound, upper_bound + 1):
-            self.sol = Tactic('auflia').solver()
-            self.sol.set(timeout=self.timeout * 1000)
-            self.sol.set(threads=4)
-
-            self.set_constraints(plate_height, widths, heights)
+    def set_constraints(self, plate_height, widths, heights, upper_bound=None):
+        upper_bound = plate_height if upper_bound is None else upper_bound
+        self.set_bits(upper_bound, widths, heights)
+        # The sizes of the circuits in their orientation
+        self.w = self.vector('widths', self.circuits_num)
+        self.h = self.vector('heights', self.circuits_num)
+        self.x_positions = self.vector('x_pos', self.circuits_num)
+        self.y_positions = self.vector('y_pos', self.circuits_num)
 
-            solve_time = time.time()
-            if self.sol.check() == sat:
-                spent_time = time.time() - solve_time
-                circuits_pos = self.evaluate()
-                write_solution(self.output_dir, ins_num, ((self.max_width, plate_height), circuits_pos),
-                               spent_time)
-                return ins_num, ((self.max_width, plate_height), circuits_pos), spent_time
-            else:
-                try_timeout = round((self.timeout - (time.time() - solve_time)))
-                if try_timeout <= 0:
-                    write_solution(self.output_dir, ins_num, None, 0)
-                    return ins_num, None, 0
-        return ins_num, None, 0
-
-    def set_constraints(self, plate_height, widths, heights):
-
-        self.x_positions = IntVector('x_pos', self.circuits_num)
-        self.y_positions = IntVector('y_pos', self.circuits_num)
-
-        areas_index = np.argsort([heights[i] * widths[i] for i in range(self.circuits_num)])
-        areas_index = areas_index[::-1]
-        biggests = areas_index[0], areas_index[1]
-        widths = [widths[areas_index[i]] for i in range(self.circuits_num)]
-        heights = [heights[areas_index[i]] for i in range(self.circuits_num)]
+        biggests = biggest_pair(widths, heights, rotation=True)
 
         # Handling rotation
         rotations = BoolVector('rotations', self.circuits_num)
@@ -68,30 +34,30 @@ class SMTsolverRot(SMTsolver):
         # Constraints
 
         # Domains
-        self.sol.add([And(0 <= self.x_positions[i], self.x_positions[i] <= self.max_width - self.w[i])
-                      for i in range(self.circuits_num)])
+        self.sol.add([self.inside(self.x_positions[i], self.w[i], self.max_width) for i in range(self.circuits_num)])
 
-        self.sol.add([And(0 <= self.y_positions[i], self.y_positions[i] <= plate_height - self.h[i])
-                      for i in range(self.circuits_num)])
+        self.sol.add([self.inside(self.y_positions[i], self.h[i], plate_height) for i in range(self.circuits_num)])
 
         for i in range(1, self.circuits_num):
             for j in range(0, i):
                 # No Overlapping
-                self.sol.add(Or(Sum(self.y_positions[i], self.h[i]) <= self.y_positions[j],
-                                Sum(self.y_positions[j], self.h[j]) <= self.y_positions[i],
-                                Sum(self.x_positions[i], self.w[i]) <= self.x_positions[j],
-                                Sum(self.x_positions[j], self.w[j]) <= self.x_positions[i]))
+                self.sol.add(Or(self.le(Sum(self.y_positions[i], self.h[i]), self.y_positions[j]),
+                                self.le(Sum(self.y_positions[j], self.h[j]), self.y_positions[i]),
+                                self.le(Sum(self.x_positions[i], self.w[i]), self.x_positions[j]),
+                                self.le(Sum(self.x_positions[j], self.w[j]), self.x_positions[i])))
 
         # Symmetry breaking : fix relative position of the two biggest rectangles
-        self.sol.add(Or(self.x_positions[biggests[1]] > self.x_positions[biggests[0]],
-                        And(self.x_positions[biggests[1]] == self.x_positions[biggests[0]],
-                            self.y_positions[biggests[1]] >= self.y_positions[biggests[0]])))
-
-        # Cumulative over rows
-        for u in range(plate_height):
-            self.sol.add(
-                self.max_width >= Sum([If(And(self.y_positions[i] <= u, u < Sum(self.y_positions[i], self.h[i])),
-                                          self.w[i], 0) for i in range(self.circuits_num)]))
+        if biggests is not None:
+            self.sol.add(Or(self.lt(self.x_positions[biggests[0]], self.x_positions[biggests[1]]),
+                            And(self.x_positions[biggests[1]] == self.x_positions[biggests[0]],
+                                self.le(self.y_positions[biggests[0]], self.y_positions[biggests[1]]))))
+
+        # Cumulative over rows, the ones above the plate are empty
+        for u in range(upper_bound):
+            self.sol.add(self.le(Sum([If(And(self.le(self.y_positions[i], u),
+                                             self.lt(u, Sum(self.y_positions[i], self.h[i]))),
+                                         self.w[i], self.value(0)) for i in range(self.circuits_num)]),
+                                 self.max_width))
 
     def evaluate(self):
         widths = [int(self.sol.model().evaluate(self.w[i]).as_string()) for i in range(self.circuits_num)]
@@ -1,16 +1,72 @@
 import os
 import re
 import subprocess
+import threading
 import time
 
-import numpy as np
-
+from anytime import Run
+import profiling
+from search import search, optimize, OPTIMIZE, SAT, UNSAT, UNKNOWN
+from smt.src.solve import OPTIMIZE_MODES, biggest_pair
 from utils import write_solution
 
 
+class SMTLIBProcess:
+    """An external solver reading SMT-LIB commands from its standard input, kept open so that the model is declared
+    once and each plate height is checked inside a push/pop scope. The commands are also written to script_file."""
+
+    def __init__(self, command, script_file):
+        self.process = subprocess.Popen(command.split(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True)
+        self.script = open(script_file, "w")
+
+    def send(self, *lines):
+        for line in lines:
+            self.process.stdin.write(line + "\n")
+            self.script.write(line + "\n")
+        self.process.stdin.flush()
+
+    def read(self, timeout=None):
+        """Reads one response, which spans several lines when it is a parenthesized list. The solver is killed when it
+        does not answer within timeout seconds, the response is then empty"""
+        watchdog = None
+        if timeout is not None:
+            watchdog = threading.Timer(timeout, self.process.kill)
+            watchdog.start()
+        try:
+            response = ""
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    # The solver exited
+                    return response.strip()
+                response += line
+                if response.strip() and response.count("(") <= response.count(")"):
+                    return response.strip()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def close(self):
+        try:
+            self.send("(exit)")
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.script.close()
+
+
 class SMTLIBsolver:
 
-    def __init__(self, data, output_dir, timeout, solver):
+    def __init__(self, data, output_dir, timeout, solver, strategy="linear", threads=4, anytime=False, budget=None,
+                 optimize_mode="minimize"):
+        if strategy == OPTIMIZE and solver != 'z3':
+            raise ValueError("The optimize strategy needs the optimizer of z3.")
+        if optimize_mode not in OPTIMIZE_MODES:
+            raise ValueError(f"Please select an optimize mode between {', '.join(OPTIMIZE_MODES)}.")
         self.data = data
         if output_dir == "":
             output_dir = "./smt/out/no_rot"
@@ -29,20 +85,34 @@ class SMTLIBsolver:
         self.w = None
         self.plate_height = None
         self.file = None
+        self.process = None
+        self.upper_bound = None
         self.solver = solver
+        self.strategy = strategy
+        self.optimize_mode = optimize_mode
+        self.rotation = False
+        self.threads = threads
+        self.anytime = anytime
+        self.budget = budget
+        self.instance_budget = None
 
     def solve(self):
         solutions = []
         for d in self.data:
-            ins_num = d[0]
-            solutions.append(self.solve_instance(d, ins_num))
+            # The output directory is resolved before moving into the directory of cvc5
+            with Run(d, self.rotation, self.timeout, self.budget, self.anytime,
+                     os.path.abspath(self.output_dir)) as run:
+                self.instance_budget = run.budget
+                solutions.append(self.solve_instance(run))
         return solutions
 
-    def solve_instance(self, instance, ins_num):
-        _, self.max_width, self.circuits = instance
+    def solve_instance(self, run):
+        ins_num = run.instance.num
+        _, self.max_width, self.circuits = run.instance
         self.circuits_num = len(self.circuits)
 
-        self.w, self.h = ([i for i, _ in self.circuits], [j for _, j in self.circuits])
+        widths, heights = run.instance.w.tolist(), run.instance.h.tolist()
+        self.w, self.h = widths, heights
 
         cwd = os.getcwd()
         if self.solver == 'z3':
@@ -51,136 +121,187 @@ class SMTLIBsolver:
             os.chdir(cwd + "/smt")
             self.file = "instances_smtlib/" + "ins-" + str(ins_num) + ".smt2"
 
-        solution, spent_time = self.set_constraints(self.w, self.h)
+        lower_bound, upper_bound, incumbent, stream = run.lower_bound, run.upper_bound, run.incumbent, run.stream
+        # The model is declared once, for every height up to the one of the incumbent, which confirms the optimality
+        # proofs
+        self.upper_bound = incumbent[0][1]
+
+        self.start_time = time.time()
+        try:
+            if self.strategy == OPTIMIZE:
+                solution, optimal = optimize(lower_bound, upper_bound,
+                                             lambda lower, upper: self.minimize_height(lower, upper, widths, heights),
+                                             incumbent, stream)
+            else:
+                solution, optimal = search(self.strategy, lower_bound, upper_bound,
+                                           lambda plate_height: self.check_height(plate_height, widths, heights),
+                                           incumbent, stream)
+        finally:
+            if self.process is not None:
+                self.process.close()
+                self.process = None
+        spent_time = time.time() - self.start_time
 
         if self.solver == 'cvc5':
             os.chdir(cwd)
 
+        solution = run.result(solution, optimal)
         if solution is not None:
-            self.parse_solution(solution)
-            circuits_pos = self.evaluate()
-            write_solution(self.output_dir, ins_num, ((self.max_width, self.plate_height), circuits_pos),
-                           spent_time)
-            return ins_num, ((self.max_width, self.plate_height), circuits_pos), spent_time
+            write_solution(self.output_dir, ins_num, solution, spent_time)
+            return ins_num, solution, spent_time
         else:
             write_solution(self.output_dir, ins_num, None, 0)
             return ins_num, None, 0
 
-    def set_constraints(self, widths, heights):
-
-        lower_bound = sum([self.h[i] * self.w[i] for i in range(self.circuits_num)]) // self.max_width
-        upper_bound = sum(self.h) - min(self.h)
-
-        areas_index = np.argsort([self.h[i] * self.w[i] for i in range(self.circuits_num)])
-        areas_index = areas_index[::-1]
-        biggests = areas_index[0], areas_index[1]
-
-        for self.plate_height in range(lower_bound, upper_bound):
-            lines = []
+    def check_height(self, plate_height, widths, heights):
+        """Checks the given plate height on the solver process, which is started and given the model on the first
+        call. The process is killed when it is still running at the deadline of the instance"""
+        if self.instance_budget.expired():
+            return UNKNOWN, None
 
+        if self.process is None:
             if self.solver == 'z3':
-                lines.append(f"(set-option :timeout {self.timeout * 1000})")
-                lines.append("(set-option :smt.threads 4)")
+                command = "z3 -in -smt2"
             elif self.solver == 'cvc5':
-                lines.append(f"(set-option :produce-models true)")
-
-            lines.append("(set-logic AUFLIA)")
-
-            # Decision Variables
-            for i in range(self.circuits_num):
-                lines.append(f"(declare-const x_{i} Int)")
-                lines.append(f"(declare-const y_{i} Int)")
-
-            # Domain
-            lines += [f"(assert (and (>= x_{i} 0) (<= x_{i} (- {self.max_width} {self.w[i]}))))" for i
-                      in
-                      range(self.circuits_num)]
-            lines += [f"(assert (and (>= y_{i} 0) (<= y_{i} (- {self.plate_height} {self.h[i]}))))"
-                      for i in
-                      range(self.circuits_num)]
-
-            # Constraints
-
-            # No Overlapping
-            for i in range(self.circuits_num):
-                for j in range(0, i):
-                    lines.append(f"(assert (or "
-                                 f"(<= (+ x_{i} {self.w[i]}) x_{j}) "
-                                 f"(<= (+ x_{j} {self.w[j]}) x_{i}) "
-                                 f"(<= (+ y_{i} {self.h[i]}) y_{j}) "
-                                 f"(<= (+ y_{j} {self.h[j]}) y_{i})))")
-
-                    # Symmetry breaking: two rectangles with same dimensions
-                    lines.append(f"(assert (=> (and (= {self.w[i]} {self.w[j]}) (= {self.h[i]} {self.h[j]}))"
-                                 f" (or "
-                                 f"(> x_{j} x_{i}) "
-                                 f"(and (= x_{j} x_{i}) (>= y_{j} y_{i})))))")
-
-            # Symmetry breaking : fix relative position of the two biggest rectangles
+                command = ("cvc5 --lang smt2 --incremental --produce-models "
+                           f"--tlimit-per {self.instance_budget.milliseconds()}")
+            else:
+                return UNKNOWN, None
+            with self.instance_budget.span("start"):
+                self.process = SMTLIBProcess(command, self.file)
+            with self.instance_budget.span("encode"):
+                lines = self.set_constraints(self.upper_bound, widths, heights)
+            profiling.count("commands", len(lines))
+            with self.instance_budget.span("send"):
+                self.process.send(*lines)
+
+        if self.solver == 'z3':
+            self.process.send(f"(set-option :timeout {self.instance_budget.milliseconds()})")
+        self.process.send("(push 1)", f"(assert (<= plate_height {plate_height}))", "(check-sat)")
+        # The solver parses the model only when the first check-sat is read
+        with self.instance_budget.span("solve"):
+            status = self.process.read(self.instance_budget.remaining())
+        if not self.process.alive():
+            return UNKNOWN, None
+
+        solution = None
+        if status == SAT:
+            with self.instance_budget.span("decode"):
+                self.process.send(f"(get-value ({self.model_values()}))")
+                # The model is read even if the deadline has just passed
+                values = self.process.read(self.instance_budget.remaining() + 1)
+                if not self.process.alive():
+                    return UNKNOWN, None
+                self.parse_solution(values)
+                solution = ((self.max_width, plate_height), self.evaluate())
+        self.process.send("(pop 1)")
+
+        if status == SAT:
+            return SAT, solution
+        if status == UNSAT:
+            return UNSAT, None
+        return UNKNOWN, None
+
+    def minimize_height(self, lower_bound, upper_bound, widths, heights):
+        """Minimizes plate_height within the bounds with a single check-sat on the optimizer of z3"""
+        if self.instance_budget.expired():
+            return UNKNOWN, None
+        if self.process is not None:
+            self.process.close()
+        with self.instance_budget.span("start"):
+            self.process = SMTLIBProcess("z3 -in -smt2", self.file)
+        with self.instance_budget.span("encode"):
+            lines = self.set_constraints(upper_bound, widths, heights)
+            lines.append(f"(assert (>= plate_height {lower_bound}))")
+            if self.optimize_mode == "core":
+                lines.append("(set-option :opt.maxsat_engine maxres)")
+                lines += [f"(assert-soft (<= plate_height {k}))" for k in range(lower_bound, upper_bound)]
+            else:
+                lines.append("(minimize plate_height)")
+        profiling.count("commands", len(lines))
+        with self.instance_budget.span("send"):
+            self.process.send(*lines)
+
+        self.process.send(f"(set-option :timeout {self.instance_budget.milliseconds()})", "(check-sat)")
+        with self.instance_budget.span("solve"):
+            status = self.process.read(self.instance_budget.remaining())
+        if not self.process.alive() or status not in (SAT, UNKNOWN):
+            return UNSAT if status == UNSAT else UNKNOWN, None
+
+        # On a timeout the optimizer may still hold the best packing found
+        with self.instance_budget.span("decode"):
+            self.process.send(f"(get-value ({self.model_values()}))")
+            values = self.process.read(self.instance_budget.remaining() + 1)
+            if not self.process.alive() or values.startswith("(error"):
+                return UNKNOWN, None
+            self.parse_solution(values)
+        return status, ((self.max_width, upper_bound), self.evaluate())
+
+    def set_constraints(self, upper_bound, widths, heights):
+        """Returns the lines of the SMT-LIB script declaring the model, where the plate height is the variable
+        plate_height bounded by upper_bound"""
+        biggests = biggest_pair(widths, heights)
+
+        lines = []
+
+        if self.solver == 'z3':
+            lines.append(f"(set-option :smt.threads {self.threads})")
+
+        lines.append("(set-logic AUFLIA)")
+
+        # Decision Variables
+        lines.append("(declare-const plate_height Int)")
+        lines.append(f"(assert (<= plate_height {upper_bound}))")
+        for i in range(self.circuits_num):
+            lines.append(f"(declare-const x_{i} Int)")
+            lines.append(f"(declare-const y_{i} Int)")
+
+        # Domain
+        lines += [f"(assert (and (>= x_{i} 0) (<= x_{i} (- {self.max_width} {self.w[i]}))))" for i
+                  in
+                  range(self.circuits_num)]
+        lines += [f"(assert (and (>= y_{i} 0) (<= y_{i} (- plate_height {self.h[i]}))))"
+                  for i in
+                  range(self.circuits_num)]
+
+        # Constraints
+
+        # No Overlapping
+        for i in range(self.circuits_num):
+            for j in range(0, i):
+                lines.append(f"(assert (or "
+                             f"(<= (+ x_{i} {self.w[i]}) x_{j}) "
+                             f"(<= (+ x_{j} {self.w[j]}) x_{i}) "
+                             f"(<= (+ y_{i} {self.h[i]}) y_{j}) "
+                             f"(<= (+ y_{j} {self.h[j]}) y_{i})))")
+
+                # Symmetry breaking: two rectangles with same dimensions
+                lines.append(f"(assert (=> (and (= {self.w[i]} {self.w[j]}) (= {self.h[i]} {self.h[j]}))"
+                             f" (or "
+                             f"(> x_{j} x_{i}) "
+                             f"(and (= x_{j} x_{i}) (>= y_{j} y_{i})))))")
+
+        # Symmetry breaking : fix relative position of the two biggest rectangles
+        if biggests is not None:
             lines.append(f'(assert (or '
                          f'(> x_{biggests[1]} x_{biggests[0]}) '
                          f'(and (= x_{biggests[1]} x_{biggests[0]}) (>= y_{biggests[1]} y_{biggests[0]}))))')
 
-            # Cumulative over columns
-            for u in range(self.max_width):
-                lines.append(
-                    f"(assert (>= {self.plate_height} (+ {' '.join([f'(ite (and (<= x_{i} {u}) (< {u} (+ x_{i} {self.w[i]}))) {self.h[i]} 0)' for i in range(self.circuits_num)])})))")
-
-            # Result
-            lines.append("(check-sat)")
+        # Cumulative over columns
+        for u in range(self.max_width):
             lines.append(
-                f"(get-value ({' '.join([f'x_{i} y_{i}' for i in range(self.circuits_num)])}))")
-            lines.append("(exit)")
-
-            with open(self.file, "w") as f:
-                for line in lines:
-                    f.write(line + "\n")
+                f"(assert (>= plate_height (+ {' '.join([f'(ite (and (<= x_{i} {u}) (< {u} (+ x_{i} {self.w[i]}))) {self.h[i]} 0)' for i in range(self.circuits_num)])})))")
+        return lines
 
-            if self.solver == 'z3':
-                bashCommand = f"z3 -smt2 {self.file}"
-            elif self.solver == 'cvc5':
-                bashCommand = f"cvc5 {self.file} --tlimit-per {self.timeout * 1000}"
-            else:
-                return None, 0
-            process = subprocess.Popen(bashCommand.split(), stdout=subprocess.PIPE)
-            start_time = time.time()
-            output, _ = process.communicate()
-            time_spent = time.time() - start_time
-
-            solution = output.decode('ascii')
-
-            if solution.split("\r")[0] == 'sat':
-                return solution, time_spent
-
-            if solution.split("\r")[0] != 'sat' or time_spent >= 300:
-                return None, time_spent
+    def model_values(self):
+        """Returns the names of the values read from the model of a satisfiable height"""
+        return ' '.join([f'x_{i} y_{i}' for i in range(self.circuits_num)])
 
     def parse_solution(self, solution):
-        if self.solver == 'z3':
-            text = solution.split("\r")
-            sat = re.compile(r'sat')
-            text = [i for i in text if not sat.match(i)]
-            text = [re.sub("\n", '', text[i]) for i in range(len(text))]
-            text = [i for i in text if i != '']
-            for i in range(len(text)):
-                text[i] = re.sub("\(|\)", '', text[i])
-                text[i] = text[i].split(" ")
-                text[i] = [j for j in text[i] if j != '']
-
-            self.x_positions = [int(text[i][1]) for i in range(self.circuits_num * 2) if i % 2 == 0]
-            self.y_positions = [int(text[i][1]) for i in range(self.circuits_num * 2) if i % 2 == 1]
-        elif self.solver == 'cvc5':
-            text = solution.split("\n")
-            text = [i for i in text if i != '']
-            text = text[1:]
-            for i in range(len(text)):
-                text[i] = re.sub("\r", "", text[i])
-                text[i] = re.sub("\(|\)", '', text[i])
-                text[i] = text[i].split(" ")
-            text = text[0]
-
-            self.x_positions = [int(text[i]) for i in range(self.circuits_num * 4) if i % 4 == 1]
-            self.y_positions = [int(text[i]) for i in range(self.circuits_num * 4) if i % 4 == 3]
+        # The model is printed by get-value as a list of (name value) pairs
+        values = {name: int(value) for name, value in re.findall(r"\((\w+)\s+(\d+)\)", solution)}
+        self.x_positions = [values[f"x_{i}"] for i in range(self.circuits_num)]
+        self.y_positions = [values[f"y_{i}"] for i in range(self.circuits_num)]
 
     def evaluate(self):
         return [(self.w[i], self.h[i], self.x_positions[i], self.y_positions[i]) for i in range(self.circuits_num)]
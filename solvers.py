@@ -0,0 +1,57 @@
+from cp.src.solve import CPsolver
+from heuristic.src.solve import HeuristicSolver
+from lp.src.solve import LPsolver
+from lp.src.solve_rotation import LPsolverRot
+from sat.src.solve import SATsolver
+from sat.src.symmetry import RULES
+from smt.src.solve import SMTsolver
+from smt.src.solve_rotation import SMTsolverRot
+from smt.src.solve_smtlib import SMTLIBsolver
+from smt.src.solve_smtlib_rotation import SMTLIBsolverRot
+
+SOLVERS = ["cp", "sat", "smt", "smtlib", "lp", "heuristic"]
+
+
+def build_solver(name, data, rotation, output_dir, timeout, incremental=False, strategy="linear",
+                 smtlib_solver="z3", threads=None, encoding="z3", external=None, anytime=False,
+                 lp_engine="bop", lp_parameters=None, budget=None, symmetry=tuple(RULES),
+                 smt_encoding="lia", optimize_mode="minimize"):
+    """Returns the solver with the given name configured to solve the instances in data. With anytime the solvers stream
+    their improving solutions, see anytime.py, the heuristic solver already returns its only one. budget is the Budget
+    of the whole run, see budget.py, each instance gets at most timeout seconds of it. symmetry are the symmetry
+    breaking rules of the sat solver, see sat/src/symmetry.py. smt_encoding selects the integers or the bit-vectors of
+    the smt solver, optimize_mode the strategy of the z3 optimizer of the smt and smtlib solvers with the optimize
+    strategy"""
+    # Keep the default number of threads of each solver unless a number is given
+    options = {"anytime": anytime, "budget": budget}
+    if threads is not None:
+        options["threads"] = threads
+    if name == "cp":
+        return CPsolver(data=data, rotation=rotation, output_dir=output_dir, timeout=timeout, **options)
+    elif name == "sat":
+        return SATsolver(data=data, rotation=rotation, output_dir=output_dir, timeout=timeout,
+                         incremental=incremental, strategy=strategy, encoding=encoding, external=external,
+                         symmetry=symmetry, **options)
+    elif name == "smt":
+        if rotation:
+            return SMTsolverRot(data=data, output_dir=output_dir, timeout=timeout, strategy=strategy,
+                                encoding=smt_encoding, optimize_mode=optimize_mode, **options)
+        return SMTsolver(data=data, output_dir=output_dir, timeout=timeout, strategy=strategy, encoding=smt_encoding,
+                         optimize_mode=optimize_mode, **options)
+    elif name == "smtlib":
+        if smtlib_solver != 'z3' and smtlib_solver != 'cvc5':
+            raise ValueError("Please select a smtlib solver between z3 and cvc5.")
+        if rotation:
+            return SMTLIBsolverRot(data=data, output_dir=output_dir, timeout=timeout, solver=smtlib_solver,
+                                   strategy=strategy, optimize_mode=optimize_mode, **options)
+        return SMTLIBsolver(data=data, output_dir=output_dir, timeout=timeout, solver=smtlib_solver,
+                            strategy=strategy, optimize_mode=optimize_mode, **options)
+    elif name == "lp":
+        if rotation:
+            return LPsolverRot(data=data, output_dir=output_dir, timeout=timeout, engine=lp_engine,
+                               parameters=lp_parameters, **options)
+        return LPsolver(data=data, output_dir=output_dir, timeout=timeout, engine=lp_engine, parameters=lp_parameters,
+                        **options)
+    elif name == "heuristic":
+        return HeuristicSolver(data=data, rotation=rotation, output_dir=output_dir, timeout=timeout)
+    raise ValueError(f"Please select a solver between {', '.join(SOLVERS)}.")
@@ -0,0 +1,25 @@
+from batch import solve_batch
+
+
+class FailingSolver:
+    """Packs each circuit of the instance in its own row, fails on the instance 2"""
+
+    def __init__(self, data, output_dir):
+        self.data = data
+        self.output_dir = output_dir
+
+    def solve(self):
+        solutions = []
+        for num, width, circuits in self.data:
+            if num == 2:
+                raise RuntimeError("no solution")
+            rows = [(w, h, 0, sum(c[1] for c in circuits[:k])) for k, (w, h) in enumerate(circuits)]
+            solutions.append((num, ((width, sum(h for _, h in circuits)), rows), 0))
+        return solutions
+
+
+def test_failed_instance_reported_unsolved(tmp_path):
+    data = [(1, 5, [(2, 2), (3, 1)]), (2, 5, [(1, 1)]), (3, 5, [(4, 4)])]
+    solutions = solve_batch(FailingSolver(data, str(tmp_path)), 2)
+    assert [num for num, _, _ in solutions] == [1, 2, 3]
+    assert solutions[1] == (2, None, 0)
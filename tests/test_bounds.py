@@ -0,0 +1,26 @@
+import pytest
+
+from bounds import BOUNDS, area_bound, dff_bound, lower_bound, tallest_bound, wide_bound
+
+# Plate width, circuits, rotation and optimal height proved by the sat solver
+CASES = [
+    (10, [(1, 2), (6, 2), (5, 3)], False, 5),
+    (7, [(6, 4), (4, 4), (2, 3), (1, 1), (2, 4), (2, 3)], False, 11),
+    (7, [(6, 4), (4, 4), (2, 3), (1, 1), (2, 4), (2, 3)], True, 10),
+    (4, [(4, 5), (2, 4), (3, 5), (3, 1), (4, 4)], False, 19),
+]
+
+
+def test_dff_beats_simple_bounds():
+    # With the threshold 5 of f0 the 6 wide circuit takes the whole width and the 1 wide one is dropped
+    max_width, circuits, rotation, _ = CASES[0]
+    simple = max(bound(max_width, circuits, rotation) for bound in (area_bound, tallest_bound, wide_bound))
+    assert simple == 3
+    assert dff_bound(max_width, circuits, rotation) == 4
+
+
+@pytest.mark.parametrize("max_width, circuits, rotation, optimum", CASES)
+def test_bounds_below_optimum(max_width, circuits, rotation, optimum):
+    for bound in BOUNDS:
+        assert bound(max_width, circuits, rotation) <= optimum, bound.__name__
+    assert lower_bound(max_width, circuits, rotation) <= lower_bound(max_width, circuits)
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from cache import SolutionCache, fingerprint
+from solvers import build_solver
+from utils import Instance
+from verify import violations
+
+# The two biggest circuits are identical, so the rules ordering the biggest pair and the identical circuits must agree,
+# otherwise no height is satisfiable and the heuristic height 16 looks optimal
+DUPLICATES = Instance(1, 10, [5, 3, 5, 3, 3, 3, 5, 3, 3, 3], [4, 2, 4, 6, 2, 2, 4, 2, 2, 6])
+OPTIMUM = 14
+
+
+@pytest.mark.parametrize("name, options", [("smt", {"smt_encoding": "lia"}), ("smt", {"smt_encoding": "bv"}),
+                                           ("smtlib", {}), ("sat", {}), ("sat", {"incremental": True})])
+def test_duplicates_cross_check(tmp_path, monkeypatch, name, options):
+    # The smtlib solver writes its scripts in the working directory
+    monkeypatch.chdir(tmp_path)
+    (_, solution, _), = build_solver(name, [DUPLICATES], False, str(tmp_path), 60, **options).solve()
+    assert solution is not None
+    assert solution[0][1] == OPTIMUM
+    assert violations(DUPLICATES, solution) == []
+
+
+def test_cache_records_solver(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    (_, solution, _), = build_solver("sat", [DUPLICATES], False, str(tmp_path), 60).solve()
+    cache.put(DUPLICATES, False, solution, "sat", "z3")
+    with open(cache.entry_file(fingerprint(DUPLICATES, False))) as f:
+        entry = json.load(f)
+    assert (entry["solver"], entry["encoding"]) == ("sat", "z3")
+    assert cache.get(DUPLICATES, False)[0] == (10, OPTIMUM)
+
+
+
+def test_split_seeds_bounds(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    # The optimal height 19 is above the lower bound 17 of the instance and of its superset
+    circuits_pos = [(4, 5, 0, 0), (2, 4, 0, 14), (3, 5, 0, 5), (3, 1, 0, 18), (4, 4, 0, 10)]
+    cached = Instance(1, 4, [w for w, _, _, _ in circuits_pos], [h for _, h, _, _ in circuits_pos])
+    cache.put(cached, False, ((4, 19), circuits_pos), "sat", "z3")
+    superset = Instance(2, 4, list(cached.w) + [1], list(cached.h) + [1])
+    subset = Instance(3, 4, cached.w[:-1], cached.h[:-1])
+    solutions, remaining = cache.split([cached, superset, subset], False)
+    assert [num for num, _, _ in solutions] == [cached.num]
+    assert [instance.num for instance in remaining] == [superset.num, subset.num]
+    assert superset.lower_bound() == 19
+    assert subset.heuristic()[0][1] <= 19
+    assert violations(subset, subset.heuristic()) == []
@@ -0,0 +1,48 @@
+import os
+import shutil
+
+from utils import load_directory
+
+
+def write_instances(directory, instances):
+    os.makedirs(directory, exist_ok=True)
+    for num, (width, circuits) in instances.items():
+        with open(os.path.join(directory, f"ins-{num}.txt"), "w") as f:
+            f.write(f"{width}\n{len(circuits)}\n" + "".join(f"{w} {h}\n" for w, h in circuits))
+
+
+def loaded(instances):
+    return [(int(i.num), i.width, i.circuits) for i in instances]
+
+
+def test_packed_reused_while_unchanged(tmp_path):
+    directory, packed = str(tmp_path / "in"), str(tmp_path / "packed")
+    write_instances(directory, {1: (8, [(3, 3), (5, 5)]), 2: (9, [(4, 4)])})
+    first = loaded(load_directory(directory, packed))
+    instances = load_directory(directory, packed)
+    assert loaded(instances) == first
+    # Views of the read only memory mapped file
+    assert not instances[0].w.flags.writeable
+
+
+def test_packed_rebuilt_when_sources_change(tmp_path):
+    directory, packed = str(tmp_path / "in"), str(tmp_path / "packed")
+    write_instances(directory, {1: (8, [(3, 3), (5, 5)]), 2: (9, [(4, 4)])})
+    load_directory(directory, packed)
+
+    # A removed file is older than the packed file too
+    os.remove(os.path.join(directory, "ins-2.txt"))
+    assert loaded(load_directory(directory, packed)) == [(1, 8, [(3, 3), (5, 5)])]
+
+    # A file replaced by another one with its old modification time
+    filename = os.path.join(directory, "ins-1.txt")
+    stat = os.stat(filename)
+    write_instances(directory, {1: (8, [(3, 3), (5, 5), (1, 1)])})
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert loaded(load_directory(directory, packed)) == [(1, 8, [(3, 3), (5, 5), (1, 1)])]
+
+    # The same packed file used for a copy of the directory with other contents
+    other = str(tmp_path / "other")
+    shutil.copytree(directory, other)
+    write_instances(other, {3: (7, [(2, 2)])})
+    assert [i[0] for i in loaded(load_directory(other, packed))] == [1, 3]
@@ -0,0 +1,26 @@
+import time
+
+from portfolio.src import solve as portfolio
+from solvers import build_solver
+from tests.test_cache import DUPLICATES, OPTIMUM
+
+
+def test_claimed_optimum_above_sibling_height(tmp_path, monkeypatch):
+    (_, optimum, _), = build_solver("sat", [DUPLICATES], False, str(tmp_path), 60).solve()
+    wrong = DUPLICATES.heuristic(False)
+    assert wrong[0][1] > OPTIMUM
+
+    def run_backend(name, instance, rotation, output_dir, timeout, threads, budget, results):
+        # The right backend finds the optimal height first but proves it last
+        if name == "right":
+            results.put((portfolio.FOUND, name, OPTIMUM, 0))
+            time.sleep(1)
+            results.put((portfolio.DONE, name, optimum, 1))
+        else:
+            time.sleep(0.5)
+            results.put((portfolio.DONE, name, wrong, 0.5))
+
+    monkeypatch.setattr(portfolio, "run_backend", run_backend)
+    (_, solution, _), = portfolio.PortfolioSolver([DUPLICATES], False, str(tmp_path), 10,
+                                                  backends=["right", "wrong"]).solve()
+    assert solution[0][1] == OPTIMUM
@@ -0,0 +1,46 @@
+import pytest
+
+import presolve
+from solvers import build_solver
+from utils import Instance, save_solution
+from verify import verify_directory, violations
+
+# The 8 and 9 wide circuits leave no room for the others and are cut out as bands. With rotation the 8x2 circuit is not
+# a band since the 4x2 one fits beside it as 2x4, the 9x11 one is too wide for the plate once rotated
+BANDED = Instance(1, 10, [3, 8, 4, 9, 3], [3, 2, 2, 11, 3])
+
+
+@pytest.mark.parametrize("rotation", [False, True])
+def test_lift_round_trip(tmp_path, rotation):
+    result = presolve.presolve(BANDED, rotation)
+    assert sorted(i for i, _, _ in result.bands) == ([3] if rotation else [1, 3])
+    assert sorted(result.kept + [i for i, _, _ in result.bands]) == list(range(BANDED.n))
+    (_, reduced, _), = build_solver("sat", [result.reduced], rotation, str(tmp_path / "reduced"), 60).solve()
+    lifted = result.lift(reduced)
+    assert violations(BANDED, lifted, rotation) == []
+    assert lifted[0][1] == reduced[0][1] + result.offset
+    # Removing the bands keeps the instance optimum
+    (_, direct, _), = build_solver("sat", [BANDED], rotation, str(tmp_path / "direct"), 60).solve()
+    assert lifted[0][1] == direct[0][1]
+
+
+def test_only_bands_lifted():
+    instance = Instance(2, 5, [4, 5, 3], [1, 2, 2])
+    solutions, remaining, presolved = presolve.split([instance], False)
+    assert remaining == [] and presolved == {}
+    (num, solution, _), = solutions
+    assert num == instance.num
+    assert solution[0] == (5, 5)
+    assert violations(instance, solution) == []
+
+
+def test_lifter_writes_instance_solution(tmp_path):
+    solutions, remaining, presolved = presolve.split([BANDED], False)
+    assert solutions == []
+    reduced, = remaining
+    (_, solution, _), = build_solver("sat", remaining, False, str(tmp_path / "reduced"), 60).solve()
+    output_dir = str(tmp_path / "lifted")
+    # The solver writes the reduced solution, the lifter replaces it with the one of the instance
+    save_solution(output_dir, reduced.num, solution)
+    presolve.Lifter(presolved, output_dir)(reduced.num, solution, 0, 0)
+    assert verify_directory([BANDED], output_dir) == {BANDED.num: []}
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from solvers import build_solver
+from utils import Instance, load_instance
+from verify import violations
+
+# The heights 17 and 18 between the lower bound and the optimum 19 are unsatisfiable, the other instances have a
+# heuristic packing higher than their lower bound so that the encodings are built
+GAP = Instance(0, 4, [4, 2, 3, 3, 4], [5, 4, 5, 1, 4])
+INPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input")
+INSTANCES = [GAP] + [load_instance(os.path.join(INPUT_DIR, f"ins-{num}.txt")) for num in (4, 5, 7, 9)]
+
+
+@pytest.mark.parametrize("rotation", [False, True])
+@pytest.mark.parametrize("incremental", [False, True])
+def test_cnf_matches_z3(tmp_path, rotation, incremental):
+    heights = {}
+    for encoding in ("z3", "cnf"):
+        solutions = build_solver("sat", INSTANCES, rotation, str(tmp_path / encoding), 60, incremental=incremental,
+                                 encoding=encoding).solve()
+        for instance, (_, solution, _) in zip(INSTANCES, solutions):
+            assert solution is not None
+            assert violations(instance, solution, rotation) == []
+        heights[encoding] = [solution[0][1] for _, solution, _ in solutions]
+    assert heights["cnf"] == heights["z3"]
+    if not rotation:
+        assert heights["cnf"][0] == 19
@@ -0,0 +1,26 @@
+import pytest
+
+from smt.src.solve import biggest_pair
+from solvers import build_solver
+from utils import Instance
+from verify import violations
+
+# The circuits are not in area order and the model finds a packing lower than the heuristic one, the rotation model used
+# to list them sorted by area so the verifier rejected its solution
+UNSORTED = Instance(1, 9, [2, 2, 5, 3, 5], [7, 2, 6, 3, 5])
+
+
+@pytest.mark.parametrize("encoding", ["lia", "bv"])
+def test_rotated_solution_verifies(tmp_path, encoding):
+    (_, solution, _), = build_solver("smt", [UNSORTED], True, str(tmp_path), 60, smt_encoding=encoding).solve()
+    assert solution is not None
+    assert violations(UNSORTED, solution, rotation=True) == []
+    assert [sorted(circuit[:2]) for circuit in solution[1]] == [sorted(size) for size in UNSORTED.circuits]
+
+
+
+def test_biggest_pair_rotation():
+    assert biggest_pair([3], [4], rotation=True) is None
+    # 4x2 and 2x4 are identical circuits only with rotation
+    assert biggest_pair([4, 2, 2, 1], [2, 4, 2, 1], rotation=True) == (2, 3)
+    assert biggest_pair([4, 2, 2, 1], [2, 4, 2, 1]) == (0, 1)
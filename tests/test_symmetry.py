@@ -0,0 +1,33 @@
+import os
+from itertools import combinations
+
+import pytest
+
+from sat.src.symmetry import RULES
+from solvers import build_solver
+from utils import Instance, load_instance
+from verify import violations
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "input")
+# Heights to refute between the lower bound and the optimum, identical circuits and a heuristic packing above the bound
+INSTANCES = [Instance(0, 4, [4, 2, 3, 3, 4], [5, 4, 5, 1, 4]),
+             Instance(1, 10, [5, 3, 5, 3, 3, 3, 5, 3, 3, 3], [4, 2, 4, 6, 2, 2, 4, 2, 2, 6]),
+             load_instance(os.path.join(INPUT_DIR, "ins-7.txt"))]
+SUBSETS = [list(rules) for size in range(1, len(RULES) + 1) for rules in combinations(RULES, size)]
+
+
+def heights(tmp_path, rotation, symmetry, **options):
+    solutions = build_solver("sat", INSTANCES, rotation, str(tmp_path), 60, symmetry=symmetry, **options).solve()
+    for instance, (_, solution, _) in zip(INSTANCES, solutions):
+        assert solution is not None
+        assert violations(instance, solution, rotation) == []
+    return [solution[0][1] for _, solution, _ in solutions]
+
+
+@pytest.mark.parametrize("rotation", [False, True])
+@pytest.mark.parametrize("encoding", ["z3", "cnf"])
+def test_rules_keep_optimum(tmp_path, rotation, encoding):
+    optimum = heights(tmp_path / "none", rotation, [], encoding=encoding)
+    for rules in SUBSETS:
+        assert heights(tmp_path / "-".join(rules), rotation, rules, encoding=encoding) == optimum, rules
+        assert heights(tmp_path / "incremental", rotation, rules, encoding=encoding, incremental=True) == optimum, rules
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import verify
+from anytime import Run, Stream
+from utils import Instance
+from verify import violations
+
+INSTANCE = Instance(1, 5, [2, 3, 5], [2, 2, 1])
+VALID = ((5, 3), [(2, 2, 0, 0), (3, 2, 2, 0), (5, 1, 0, 2)])
+OVERLAPPING = ((5, 2), [(2, 2, 0, 0), (3, 2, 1, 0), (5, 1, 0, 1)])
+
+
+def test_invalid_solution_not_reported(tmp_path):
+    with Run(INSTANCE, False, 10, output_dir=str(tmp_path)) as run:
+        assert run.result(OVERLAPPING, True) is None
+        assert run.result(VALID, True) == VALID
+
+
+def test_invalid_solution_not_streamed(tmp_path):
+    stream = Stream(str(tmp_path), INSTANCE, False, 3)
+    assert not stream(OVERLAPPING)
+    assert not os.path.exists(os.path.join(str(tmp_path), "out-1.txt"))
+    assert stream(VALID)
+    assert os.path.exists(os.path.join(str(tmp_path), "out-1.txt"))
+
+
+@pytest.mark.parametrize("grid_cells", [verify.GRID_CELLS, 0])
+def test_overlap_found(monkeypatch, grid_cells):
+    # Without cells the overlaps are found by comparing the circuits block by block
+    monkeypatch.setattr(verify, "GRID_CELLS", grid_cells)
+    assert violations(INSTANCE, VALID) == []
+    assert violations(INSTANCE, OVERLAPPING) == ["circuits 0 at (0, 0) and 1 at (1, 0) overlap"]
+    # Circuits touching at a corner do not overlap
+    corners = Instance(2, 4, [2, 2], [2, 2])
+    assert violations(corners, ((4, 4), [(2, 2, 0, 0), (2, 2, 2, 2)])) == []
+    assert violations(corners, ((4, 4), [(2, 2, 0, 0), (2, 2, 1, 1)])) != []
+
+
+@pytest.mark.parametrize("circuits_pos", [
+    [(2, 2, 0, 0), (3, 2, 3, 0), (5, 1, 0, 2)],
+    [(2, 2, 0, 0), (3, 2, 2, 0), (5, 1, 0, 3)],
+    [(2, 2, -1, 0), (3, 2, 2, 0), (5, 1, 0, 2)],
+    [(2, 2, 0, -1), (3, 2, 2, 0), (5, 1, 0, 2)],
+])
+def test_out_of_bounds_found(circuits_pos):
+    problems = violations(INSTANCE, ((5, 3), circuits_pos))
+    assert len(problems) == 1 and "outside the plate 5x3" in problems[0]
+
+
+def test_shapes_and_counts_checked():
+    rotated = ((5, 5), [(2, 2, 0, 0), (2, 3, 2, 0), (5, 1, 0, 3)])
+    assert violations(INSTANCE, rotated) == ["circuit 1 is 2x3 instead of 3x2"]
+    assert violations(INSTANCE, rotated, rotation=True) == []
+    assert violations(INSTANCE, ((5, 3), VALID[1][:2])) == ["2 circuits placed instead of 3"]
+    assert violations(INSTANCE, ((6, 3), VALID[1])) == ["plate width 6 instead of 5"]
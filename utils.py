@@ -1,55 +1,214 @@
+import json
 import os
+import re
 from glob import glob
 
 import matplotlib.pyplot as plt
 import numpy as np
 
+import bounds
+import profiling
+from heuristic.src.packer import pack
+
 
 def write_solution(output_dir, n, solution, stat):
     """Prints the solution to console and write it in a txt file"""
     print(f'{n})', solution, "\nSolving time:", stat)
     if solution is not None:
-        os.makedirs(output_dir, exist_ok=True)
-        filename = os.path.join(output_dir, f"out-{n}.txt")
-        with open(filename, 'w') as sol:
-            (plate_width, plate_height), circuits_pos = solution
-            sol.write("{0} {1}\n".format(plate_width, plate_height))
-            sol.write("{0}\n".format(len(circuits_pos)))
-            for c in circuits_pos:
-                w, h, x, y = c
-                sol.write("{0} {1} {2} {3}\n".format(w, h, x, y))
+        save_solution(output_dir, n, solution)
+
+
+def save_solution(output_dir, n, solution):
+    """Writes the solution in the file out-n.txt of the output directory"""
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, f"out-{n}.txt")
+    with profiling.span("output"), open(filename, 'w') as sol:
+        (plate_width, plate_height), circuits_pos = solution
+        sol.write("{0} {1}\n".format(plate_width, plate_height))
+        sol.write("{0}\n".format(len(circuits_pos)))
+        for c in circuits_pos:
+            w, h, x, y = c
+            sol.write("{0} {1} {2} {3}\n".format(w, h, x, y))
+
+        # Write also the time at the end of the solution file.
+        # sol.write("{0}\n".format(stat))
+
+
+class Instance:
+    """A single instance, the shapes of the circuits are stored in int32 arrays together with some precomputed data
+    shared by the solvers. It can be unpacked as the tuple (num_ins, width, circuits) returned by load_instance"""
+
+    __slots__ = ("num", "width", "w", "h", "areas", "_circuits", "_bounds")
+
+    def __init__(self, num, width, w, h):
+        self.num = str(num)
+        self.width = int(width)
+        self.w = np.asarray(w, dtype=np.int32)
+        self.h = np.asarray(h, dtype=np.int32)
+        self.areas = self.w * self.h
+        self._circuits = None
+        self._bounds = {}
+
+    @classmethod
+    def of(cls, instance):
+        """Returns the instance itself or converts a tuple (num_ins, width, circuits)"""
+        if isinstance(instance, cls):
+            return instance
+        num, width, circuits = instance
+        return cls(num, width, [w for w, _ in circuits], [h for _, h in circuits])
+
+    @property
+    def circuits(self):
+        """The list of tuples (w, h) of the circuits, with plain python integers"""
+        if self._circuits is None:
+            self._circuits = list(zip(self.w.tolist(), self.h.tolist()))
+        return self._circuits
+
+    @property
+    def n(self):
+        """The number of circuits"""
+        return len(self.w)
+
+    def __iter__(self):
+        return iter((self.num, self.width, self.circuits))
+
+    def __getitem__(self, item):
+        return (self.num, self.width, self.circuits)[item]
+
+    def __getstate__(self):
+        return self.num, self.width, np.array(self.w), np.array(self.h), self._bounds
+
+    def __setstate__(self, state):
+        num, width, w, h, computed = state
+        self.__init__(num, width, w, h)
+        self._bounds = computed
+
+    def __repr__(self):
+        return f"Instance({self.num}, {self.width}, {self.circuits})"
+
+    def lower_bound(self, rotation=False):
+        """Lower bound of the plate height, computed once"""
+        if ("lower", rotation) not in self._bounds:
+            with profiling.span("bounds"):
+                self._bounds[("lower", rotation)] = bounds.lower_bound(self.width, self.circuits, rotation)
+        return self._bounds[("lower", rotation)]
 
-            # Write also the time at the end of the solution file.
-            # sol.write("{0}\n".format(stat))
+    def heuristic(self, rotation=False):
+        """Solution of the heuristic packer, its height is an upper bound of the plate height. Computed once"""
+        if ("heuristic", rotation) not in self._bounds:
+            with profiling.span("heuristic"):
+                self._bounds[("heuristic", rotation)] = pack(self.width, self.circuits, rotation)
+        return self._bounds[("heuristic", rotation)]
+
+    def seed(self, rotation=False, lower_bound=None, incumbent=None):
+        """Tightens the bounds with ones known from elsewhere, e.g. the solution cache: a lower bound of the plate height
+        and a solution replacing the heuristic one when it is lower"""
+        if lower_bound is not None and lower_bound > self.lower_bound(rotation):
+            self._bounds[("lower", rotation)] = lower_bound
+        if incumbent is not None and incumbent[0][1] < self.heuristic(rotation)[0][1]:
+            self._bounds[("heuristic", rotation)] = incumbent
+
+
+def instance_number(filename):
+    """Returns the number of the instance stored in a file named ins-N.txt, None for other files"""
+    match = re.fullmatch(r"ins-(\d+)\.txt", os.path.basename(filename))
+    return int(match.group(1)) if match else None
+
+
+def parse_instance(num_ins, text):
+    """Parses the text of an instance file: the width, the number of circuits and then a line w h for each circuit"""
+    values = np.array(text.split(), dtype=np.int32)
+    width, circuit_num = values[0], values[1]
+    return Instance(num_ins, width, values[2:2 + 2 * circuit_num:2], values[3:3 + 2 * circuit_num:2])
 
 
 def load_instance(filename):
     """Loads a single instance from txt file
-        :returns num_ins : instance number
+        :returns Instance which can be unpacked as
+                 num_ins : instance number
                  width : max width allowed
                  circuits : array of tuples (w , h) for each circuit
     """
     with open(filename, 'r') as instance:
         num_ins = filename[filename.find("ins-") + 4:filename.find(".txt")]
-        width = int(instance.readline().strip())
-        circuit_num = int(instance.readline().strip())
-        circuits = []
-        for i in range(circuit_num):
-            circuits.append(tuple(int(el) for el in instance.readline().strip().split(" ")))
-        return num_ins, width, circuits
+        return parse_instance(num_ins, instance.read())
+
+
+def load_directory(input_dir, packed_file=None):
+    """Loads all the instances of a directory sorted by instance number.
+    If packed_file is given the parsed instances are stored in it as a single int32 array, which is memory mapped by the
+    next loads as long as the instance files it was built from are unchanged"""
+    filenames = {instance_number(f): f for f in glob(os.path.join(input_dir, "*"))}
+    filenames.pop(None, None)
+
+    sources = packed_sources(input_dir, filenames.values())
+    if packed_file is not None and os.path.exists(packed_file):
+        instances = load_packed(packed_file, sources)
+        if instances is not None:
+            return instances
+
+    instances = [load_instance(filenames[num]) for num in sorted(filenames)]
+    if packed_file is not None:
+        save_packed(packed_file, instances, sources)
+    return instances
 
 
-def load_data(num_instance, input_dir):
+def packed_sources(input_dir, filenames):
+    """Returns what a packed file is built from: the resolved directory, and the name, size and modification time of
+    each instance file sorted by name"""
+    files = []
+    for filename in sorted(filenames):
+        stat = os.stat(filename)
+        files.append([os.path.basename(filename), stat.st_size, stat.st_mtime_ns])
+    return {"directory": os.path.realpath(input_dir), "files": files}
+
+
+def save_packed(packed_file, instances, sources=None):
+    """Stores the sources as a json line followed by the instances in a single int32 array: the number of instances, a
+    row (num, width, circuits) for each instance and then the widths and the heights of all the circuits"""
+    header = [[len(instances), 0, 0]] + [[int(i.num), i.width, i.n] for i in instances]
+    shapes = [np.concatenate([i.w, i.h]) for i in instances]
+    with open(packed_file, 'wb') as f:
+        f.write(json.dumps(sources).encode() + b"\n")
+        np.save(f, np.concatenate([np.array(header, dtype=np.int32).ravel()] + shapes).astype(np.int32))
+
+
+def load_packed(packed_file, sources=None):
+    """Loads the instances stored by save_packed, their arrays are views of the memory mapped file. Returns None when
+    the file was built from other sources than the given ones"""
+    with open(packed_file, 'rb') as f:
+        try:
+            stored = json.loads(f.readline())
+        except ValueError:
+            return None
+        if sources is not None and stored != sources:
+            return None
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    packed = np.memmap(packed_file, dtype=dtype, mode='r', offset=offset, shape=shape)
+    count = int(packed[0])
+    header = np.array(packed[:3 * (count + 1)]).reshape(-1, 3)[1:]
+    instances = []
+    offset = 3 * (count + 1)
+    for num, width, circuit_num in header:
+        instances.append(Instance(num, width, packed[offset:offset + circuit_num],
+                                  packed[offset + circuit_num:offset + 2 * circuit_num]))
+        offset += 2 * circuit_num
+    return instances
+
+
+def load_data(num_instance, input_dir, packed_file=None):
     """Return an array containing the instances with the relative instance number
     e.g. [1, plate_width, circuits] where circuits is the array of shapes and 1 indicates the first instance"""
-    all_instances = glob(os.path.join(input_dir, "*"))
     if num_instance == 0:
-        istances = [load_instance(filename=instance_filename) for instance_filename in all_instances]
-        istances.sort(key=lambda x: int(x[0]))
-        return istances
+        return load_directory(input_dir, packed_file)
     else:
-        return [load_instance(filename=filename) for filename in all_instances if
-                int(filename[filename.find("ins-") + 4:filename.find(".txt")]) == num_instance]
+        return [load_instance(filename=filename) for filename in glob(os.path.join(input_dir, "*"))
+                if instance_number(filename) == num_instance]
 
 
 def display_solution(title, sizes_plate, n_circuits, sizes_circuits, pos_circuits):
@@ -73,33 +232,3 @@ def display_solution(title, sizes_plate, n_circuits, sizes_circuits, pos_circuit
     plt.grid()
     plt.show()
 
-
-def plot_times(output_dir):
-    """Plot the barplot of the solving times taken from the solved instance results in output_dir"""
-    solutions_paths_no_rot = glob(
-        os.path.join(output_dir + "/../no_rot", "*.txt"))
-    solutions_paths_rot = glob(
-        os.path.join(output_dir + "/../rot", "*.txt"))
-    times_no_rot = np.zeros(40)
-    times_rot = np.zeros(40)
-    for i in range(1, 41):
-        for path in solutions_paths_no_rot:
-            if int(path[path.find("out-") + 4:path.find(".txt")]) == i:
-                with open(path, 'r') as f:
-                    times_no_rot[i - 1] = float(f.readlines()[-1])
-        for path in solutions_paths_rot:
-            if int(path[path.find("out-") + 4:path.find(".txt")]) == i:
-                with open(path, 'r') as f:
-                    times_rot[i - 1] = float(f.readlines()[-1])
-    x_axis = np.arange(1, len(times_no_rot) + 1)
-    plt.figure(figsize=(12, 6))
-    plt.bar(x=x_axis - 0.2, height=times_no_rot, width=0.4, label='no_rotation')
-    plt.bar(x=x_axis + 0.2, height=times_rot, width=0.4, label='rotation')
-    plt.xlabel('Instance')
-    plt.ylabel('Time (s)')
-    plt.yscale("log")
-    plt.xticks(x_axis)
-    plt.legend()
-    plt.ylim(1e-2, 300)
-    plt.savefig(os.path.join(output_dir, "times_plot.png"))
-    plt.show()
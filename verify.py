@@ -0,0 +1,135 @@
+"""Verifier of the solutions written by the solvers, shared by main.py, the benchmark and the command line"""
+import argparse
+import os
+import sys
+from glob import glob
+
+import numpy as np
+
+from utils import Instance, load_data
+
+# Largest plate, in cells, whose overlaps are found on an occupancy grid
+GRID_CELLS = 1 << 22
+# Number of pairs compared at a time without the grid
+BLOCK_PAIRS = 1 << 22
+
+
+def overlapping_pair(width, height, x, y, w, h):
+    """Returns the indices (i, j) of two overlapping circuits, None if there are none. The circuits must be inside the
+    plate width x height. They are found on an occupancy grid of the plate or, when it is too large, block by block"""
+    n = len(x)
+    if (width + 1) * (height + 1) <= GRID_CELLS:
+        # +1 at the bottom left corner of each circuit, -1 at the corners beside and above it, +1 at the opposite one:
+        # the prefix sums along both axes count the circuits covering each cell
+        rows, columns = np.concatenate([y, y, y + h, y + h]), np.concatenate([x, x + w, x, x + w])
+        signs = np.repeat(np.array([1, -1, -1, 1], dtype=np.int32), n)
+        grid = np.bincount(rows * (width + 1) + columns, weights=signs, minlength=(height + 1) * (width + 1))
+        covered = grid.reshape(height + 1, width + 1).cumsum(axis=0).cumsum(axis=1)
+        if covered.max(initial=0) <= 1:
+            return None
+        cy, cx = np.unravel_index(np.argmax(covered > 1), covered.shape)
+        i, j = np.flatnonzero((x <= cx) & (cx < x + w) & (y <= cy) & (cy < y + h))[:2]
+        return int(i), int(j)
+
+    block = max(BLOCK_PAIRS // max(n, 1), 1)
+    for start in range(0, n, block):
+        rows = slice(start, min(start + block, n))
+        overlap = (x[rows, None] < x + w) & (x < (x + w)[rows, None]) & \
+                  (y[rows, None] < y + h) & (y < (y + h)[rows, None])
+        # Each pair once, a circuit always overlaps itself
+        overlap &= np.arange(start, rows.stop)[:, None] < np.arange(n)
+        if overlap.any():
+            i, j = np.unravel_index(np.argmax(overlap), overlap.shape)
+            return int(start + i), int(j)
+    return None
+
+
+def checked(instance, solution, rotation=False):
+    """Returns the solution when it is a valid packing of the instance, otherwise prints why it is not and returns None,
+    so that it is neither written nor reported"""
+    problems = [] if solution is None else violations(instance, solution, rotation)
+    if problems:
+        print(f'{Instance.of(instance).num}) invalid solution:', "; ".join(problems))
+        return None
+    return solution
+
+
+def violations(instance, solution, rotation=False):
+    """Returns the reasons why the solution is not a valid packing of the instance, empty when it is valid"""
+    instance = Instance.of(instance)
+    (plate_width, plate_height), circuits_pos = solution
+    if plate_width != instance.width:
+        return [f"plate width {plate_width} instead of {instance.width}"]
+    if len(circuits_pos) != instance.n:
+        return [f"{len(circuits_pos)} circuits placed instead of {instance.n}"]
+    placed = np.asarray(circuits_pos, dtype=np.int64).reshape(-1, 4)
+    w, h, x, y = placed.T
+    iw, ih = instance.w.astype(np.int64), instance.h.astype(np.int64)
+
+    problems = []
+    shaped = (w == iw) & (h == ih)
+    if rotation:
+        shaped |= (w == ih) & (h == iw)
+    for i in np.flatnonzero(~shaped)[:3]:
+        problems.append(f"circuit {i} is {w[i]}x{h[i]} instead of {iw[i]}x{ih[i]}")
+    inside = (x >= 0) & (y >= 0) & (x + w <= plate_width) & (y + h <= plate_height)
+    for i in np.flatnonzero(~inside)[:3]:
+        problems.append(f"circuit {i} at ({x[i]}, {y[i]}) is outside the plate {plate_width}x{plate_height}")
+    if problems:
+        return problems
+
+    pair = overlapping_pair(int(plate_width), int(plate_height), x, y, w, h)
+    if pair is not None:
+        i, j = pair
+        problems.append(f"circuits {i} at ({x[i]}, {y[i]}) and {j} at ({x[j]}, {y[j]}) overlap")
+    return problems
+
+
+def load_solution(filename):
+    """Loads a solution file out-N.txt written by utils.save_solution"""
+    with open(filename) as f:
+        values = np.array(f.read().split(), dtype=np.int64)
+    plate_width, plate_height, circuit_num = values[:3].tolist()
+    return (plate_width, plate_height), [tuple(c) for c in values[3:3 + 4 * circuit_num].reshape(-1, 4).tolist()]
+
+
+def verify_directory(instances, output_dir, rotation=False):
+    """Verifies the solution files of the output directory. Returns the reasons why each solution is not valid by
+    instance number, an empty list for the valid ones"""
+    instances = {str(instance[0]): instance for instance in instances}
+    results = {}
+    for filename in sorted(glob(os.path.join(output_dir, "out-*.txt"))):
+        num = os.path.basename(filename)[len("out-"):-len(".txt")]
+        if num not in instances:
+            results[num] = ["no instance"]
+            continue
+        try:
+            results[num] = violations(instances[num], load_solution(filename), rotation)
+        except ValueError as e:
+            results[num] = [f"unreadable: {e}"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input_dir", help="Directory where the instance txt files can be found",
+                        default="./input", type=str)
+    parser.add_argument("-o", "--output_dirs", help="Directories of the solution files to verify", nargs="+",
+                        required=True, type=str)
+    parser.add_argument("-r", "--rotation", help="The circuits can be rotated", default=False, action='store_true')
+    args = parser.parse_args()
+
+    instances = load_data(0, args.input_dir)
+    invalid = 0
+    for output_dir in args.output_dirs:
+        results = verify_directory(instances, output_dir, args.rotation)
+        for num, problems in sorted(results.items(), key=lambda item: int(item[0]) if item[0].isdigit() else 0):
+            if problems:
+                invalid += 1
+                print(f"{output_dir} {num}) invalid:", "; ".join(problems))
+        print(f"{output_dir}: {sum(not p for p in results.values())}/{len(results)} valid")
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == '__main__':
+    main()